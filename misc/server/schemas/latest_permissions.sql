@@ -11,6 +11,8 @@ GRANT INSERT, UPDATE, SELECT ON calendar                  TO ADMIN_GROUP;
 GRANT INSERT, UPDATE, SELECT ON diaries                   TO ADMIN_GROUP;
 GRANT INSERT, UPDATE, SELECT ON diary_entries             TO ADMIN_GROUP;
 GRANT INSERT, UPDATE, SELECT ON diary_in_office           TO ADMIN_GROUP;
+GRANT INSERT, SELECT, DELETE ON diary_changes             TO ADMIN_GROUP;
+GRANT INSERT, SELECT, DELETE ON patient_changes           TO ADMIN_GROUP;
 GRANT INSERT, UPDATE, SELECT, DELETE ON appointments      TO ADMIN_GROUP;
 GRANT INSERT, UPDATE, SELECT ON fees                      TO ADMIN_GROUP;
 GRANT INSERT, UPDATE, SELECT ON invoice_status            TO ADMIN_GROUP;
@@ -75,6 +77,8 @@ GRANT USAGE ON contracted_practitioners_ix_seq TO ADMIN_GROUP;
 GRANT USAGE ON diaries_ix_seq                  TO ADMIN_GROUP;
 GRANT USAGE ON diary_entries_ix_seq            TO ADMIN_GROUP;
 GRANT USAGE ON diary_in_office_ix_seq          TO ADMIN_GROUP;
+GRANT USAGE ON diary_changes_ix_seq            TO ADMIN_GROUP;
+GRANT USAGE ON patient_changes_ix_seq          TO ADMIN_GROUP;
 GRANT USAGE ON appointments_ix_seq             TO ADMIN_GROUP;
 GRANT USAGE ON fees_ix_seq                     TO ADMIN_GROUP;
 GRANT USAGE ON invoice_status_ix_seq           TO ADMIN_GROUP;
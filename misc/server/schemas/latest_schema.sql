@@ -679,6 +679,26 @@ create table diary_in_office (
 	CONSTRAINT ck_sessions CHECK (start<=finish)
 	);
 
+-- the patients changed (see record_patient_change)
+
+create table patient_changes (
+	ix serial,
+	patient_id integer,
+	changed timestamp with time zone NOT NULL default now(),
+	CONSTRAINT pk_patient_changes PRIMARY KEY (ix)
+	);
+
+-- the days changed in each diary (see record_diary_change)
+
+create table diary_changes (
+	ix serial,
+	diary_id integer NOT NULL,
+	first_date DATE,
+	last_date DATE,
+	changed timestamp with time zone NOT NULL default now(),
+	CONSTRAINT pk_diary_changes PRIMARY KEY (ix)
+	);
+
 create table appointments (
 	ix serial,
 	patient_id integer NOT NULL REFERENCES patients(ix),
@@ -906,6 +926,18 @@ CREATE or REPLACE VIEW diary_adjacent_in_office_entries as
 CREATE or REPLACE VIEW diary_multi_day_entries as
 	SELECT * from diary_entries where date(start) != date(finish);
 
+/*-- INDEXES --*/
+
+-- the diary is loaded a date range at a time (where start >= ? and start < ?)
+
+CREATE INDEX ix_diary_entries_start ON diary_entries (start);
+CREATE INDEX ix_diary_entries_diary_start ON diary_entries (diary_id, start);
+CREATE INDEX ix_diary_in_office_start ON diary_in_office (start);
+CREATE INDEX ix_diary_in_office_diary_start ON diary_in_office (diary_id, start);
+CREATE INDEX ix_appointments_diary_entry ON appointments (diary_entry_id);
+CREATE INDEX ix_patient_changes_changed ON patient_changes (changed);
+CREATE INDEX ix_diary_changes_changed ON diary_changes (changed);
+
 /*-- FUNCTIONS --*/
 
 CREATE FUNCTION generate_dates(dt1 date, dt2 date, n integer) 
@@ -934,6 +966,43 @@ CREATE FUNCTION get_available_in_office_slots(t1 timestamp, t2 timestamp, id int
 	LANGUAGE SQL
 	;
 
+-- the free time (in office, with no entries) between t1 and t2 in the diaries ids
+-- of at least min_length minutes, excluding days of the week (isodow, monday = 1)
+-- in excluded_days. emergency entries are free if emergencies_free.
+-- each session's entries (and the session's ends, as zero length entries) are
+-- ordered by start, the gaps are where the next start is after the latest finish
+-- so far. length is in minutes.
+
+CREATE FUNCTION get_free_slots(t1 timestamp with time zone, t2 timestamp with time zone,
+	ids integer[], min_length integer, excluded_days integer[], emergencies_free boolean)
+	RETURNS TABLE (diary_id integer, start timestamp with time zone, length integer) AS $$
+	WITH sessions AS (
+		SELECT ix, diary_id, greatest(start, $1) AS start, least(finish, $2) AS finish
+		FROM diary_in_office WHERE start < $2 AND finish > $1 AND diary_id = ANY($3)
+		AND NOT CAST(extract(isodow FROM start) AS integer) = ANY($5)
+	), busy AS (
+		SELECT ix, diary_id, start AS b_start, start AS b_finish FROM sessions
+		UNION ALL
+		SELECT ix, diary_id, finish, finish FROM sessions
+		UNION ALL
+		SELECT sessions.ix, sessions.diary_id, greatest(diary_entries.start, sessions.start),
+		least(diary_entries.finish, sessions.finish)
+		FROM sessions JOIN diary_entries ON diary_entries.diary_id = sessions.diary_id
+		AND diary_entries.start < sessions.finish AND diary_entries.finish > sessions.start
+		WHERE diary_entries.etype != 'free' AND NOT ($6 AND diary_entries.etype = 'emergency')
+	), gaps AS (
+		SELECT diary_id,
+		max(b_finish) OVER (PARTITION BY ix ORDER BY b_start, b_finish
+			ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS gap_start,
+		lead(b_start) OVER (PARTITION BY ix ORDER BY b_start, b_finish) AS gap_finish
+		FROM busy
+	)
+	SELECT diary_id, gap_start, CAST(extract(epoch FROM gap_finish - gap_start) / 60 AS integer)
+	FROM gaps WHERE gap_finish > gap_start
+	AND gap_finish - gap_start >= $4 * interval '1 minute'
+	$$ LANGUAGE SQL
+	;
+
 
 /*-- TRIGGERS --*/
 CREATE OR REPLACE FUNCTION notify_appointment() RETURNS trigger AS $$
@@ -961,6 +1030,176 @@ AFTER UPDATE ON appointments FOR EACH ROW EXECUTE PROCEDURE notify_appointment()
 CREATE TRIGGER delete_appointment_trigger 
 AFTER DELETE ON appointments FOR EACH ROW EXECUTE PROCEDURE notify_appointment_deleted();
 
+-- each change to a patient's record is recorded in patient_changes
+-- (patient_id is null if the change may affect several patients),
+-- then patient_changed is notified.
+-- clients read, and remove old, rows (see client.db_orm.change_feed).
+
+CREATE OR REPLACE FUNCTION record_patient_change(id integer) RETURNS void AS $$
+BEGIN
+  INSERT INTO patient_changes (patient_id) VALUES (id);
+  PERFORM pg_notify('patient_changed', '');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_patient_changed() RETURNS trigger AS $$
+DECLARE
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM record_patient_change(OLD.patient_id);
+  ELSE
+    PERFORM record_patient_change(NEW.patient_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_patient_details_changed() RETURNS trigger AS $$
+DECLARE
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM record_patient_change(OLD.ix);
+  ELSE
+    PERFORM record_patient_change(NEW.ix);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_patients_changed() RETURNS trigger AS $$
+DECLARE
+BEGIN
+  PERFORM record_patient_change(NULL);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER patient_changed_trigger
+AFTER UPDATE OR DELETE ON patients
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_details_changed();
+
+CREATE TRIGGER addresses_changed_trigger
+AFTER UPDATE OR DELETE ON addresses
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_patients_changed();
+
+CREATE TRIGGER telephone_changed_trigger
+AFTER UPDATE OR DELETE ON telephone
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_patients_changed();
+
+CREATE TRIGGER address_link_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON address_link
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER telephone_link_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON telephone_link
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER teeth_present_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON teeth_present
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER static_fills_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON static_fills
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER static_crowns_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON static_crowns
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER static_roots_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON static_roots
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER static_comments_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON static_comments
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER clinical_memos_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON clinical_memos
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER clerical_memos_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON clerical_memos
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER treatments_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON treatments
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER notes_clinical_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON notes_clinical
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER notes_clerical_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON notes_clerical
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER perio_bpe_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON perio_bpe
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+CREATE TRIGGER perio_pocketing_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON perio_pocketing
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
+-- each change to the diary is recorded in diary_changes
+-- (the dates of the rows changed, an update records both the old and new
+-- positions of the row), then diary_changed is notified,
+-- as for patient_changes.
+
+CREATE OR REPLACE FUNCTION record_diary_change(id integer,
+	t1 timestamp with time zone, t2 timestamp with time zone) RETURNS void AS $$
+BEGIN
+  INSERT INTO diary_changes (diary_id, first_date, last_date)
+    VALUES (id, date(t1), date(t2));
+  PERFORM pg_notify('diary_changed', '');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_diary_changed() RETURNS trigger AS $$
+DECLARE
+BEGIN
+  IF TG_OP != 'INSERT' THEN
+    PERFORM record_diary_change(OLD.diary_id, OLD.start, OLD.finish);
+  END IF;
+  IF TG_OP != 'DELETE' THEN
+    PERFORM record_diary_change(NEW.diary_id, NEW.start, NEW.finish);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_appointment_diary_changed() RETURNS trigger AS $$
+DECLARE
+BEGIN
+  IF TG_OP != 'INSERT' THEN
+    PERFORM record_diary_change(diary_id, start, finish)
+      FROM diary_entries WHERE ix = OLD.diary_entry_id;
+  END IF;
+  IF TG_OP != 'DELETE' THEN
+    PERFORM record_diary_change(diary_id, start, finish)
+      FROM diary_entries WHERE ix = NEW.diary_entry_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER diary_entries_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON diary_entries
+FOR EACH ROW EXECUTE PROCEDURE notify_diary_changed();
+
+CREATE TRIGGER diary_in_office_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON diary_in_office
+FOR EACH ROW EXECUTE PROCEDURE notify_diary_changed();
+
+CREATE TRIGGER appointments_diary_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON appointments
+FOR EACH ROW EXECUTE PROCEDURE notify_appointment_diary_changed();
+
+CREATE TRIGGER contracted_practitioners_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON contracted_practitioners
+FOR EACH ROW EXECUTE PROCEDURE notify_patient_changed();
+
 
 /*-- DATA --*/
 
@@ -88,6 +88,15 @@ class ProxyManager(object):
         '''
         self.advise(message, 1)
 
+    def job_progress(self, status):
+        '''
+        called periodically whilst a server job (see ProxyClient.run_job)
+        is running. passes new lines from the server log to the local log.
+        can be overwritten.
+        '''
+        for line in status["log"]:
+            LOGGER.info("server job %s: %s"% (status["id"], line))
+
     def display_proxy_message(self):
         '''
         display the proxy message.
@@ -221,7 +230,8 @@ class ProxyManager(object):
             _("This may take some time")))
         self.wait()
 
-        payload = self.selected_client.call("create_db",dbname)
+        payload = self.selected_client.run_job("create_db", dbname,
+            callback=self.job_progress)
         if payload.payload:
             if dbname == "openmolar_demo":
                 self.advise("creating demo user and granting permissions")
@@ -263,10 +273,11 @@ class ProxyManager(object):
         this is for test purposes eg. demo database or import only
         '''
         if dbname == "openmolar_demo":
-            payload = self.selected_client.call("truncate_demo")
+            payload = self.selected_client.run_job("truncate_demo",
+                callback=self.job_progress)
         else:
-            payload = self.selected_client.call("truncate_all_tables",
-                str(dbname))
+            payload = self.selected_client.run_job("truncate_all_tables",
+                str(dbname), callback=self.job_progress)
 
         if payload.payload:
             self.advise(u"%s %s"%(
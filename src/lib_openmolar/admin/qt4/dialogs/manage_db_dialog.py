@@ -48,7 +48,15 @@ class ManageDatabaseDialog(ServerFunctionDialog):
         self.insertWidget(label)
 
 
-        for func, desc in self.proxy_client.get_management_functions():
+        functions = self.proxy_client.get_management_functions()
+
+        # get all the warnings now, rather than a round trip per click
+        self.warnings = {}
+        with self.proxy_client.batch() as batch:
+            for func, desc in functions:
+                self.warnings[func] = batch.call("pre_execution_warning", func)
+
+        for func, desc in functions:
             but = QtGui.QPushButton(desc)
             but.func_name = func
             self.insertWidget(but)
@@ -67,7 +75,7 @@ class ManageDatabaseDialog(ServerFunctionDialog):
     def but_clicked(self):
         but = self.sender()
 
-        warning = self.proxy_client.pre_execution_warning(but.func_name)
+        warning = self.warnings[but.func_name].payload
         if warning and not self.get_confirm(warning):
             return
         attempting = True
@@ -75,7 +83,8 @@ class ManageDatabaseDialog(ServerFunctionDialog):
         while attempting:
             try:
                 self.waiting.emit(True)
-                result = self.proxy_client.call(but.func_name, self.dbname)
+                result = self.proxy_client.run_job(but.func_name,
+                    self.dbname, callback=self.job_progress)
                 attempting = False
             except ProxyClient.PermissionError:
                 LOGGER.info("user '%s' can not perform function '%s'"% (
@@ -91,6 +100,14 @@ class ManageDatabaseDialog(ServerFunctionDialog):
         self.accept()
         self.function_completed.emit()
 
+    def job_progress(self, status):
+        '''
+        called whilst a server job is running
+        '''
+        for line in status["log"]:
+            LOGGER.info(line)
+        QtGui.QApplication.instance().processEvents()
+
 def _test():
     app = QtGui.QApplication([])
     from lib_openmolar.common.connect.proxy_client import _test_instance
@@ -79,6 +79,15 @@ class ManagePGUsersDialog(ServerFunctionDialog):
 
 
         self.users = self.proxy_client.get_pg_user_list()
+
+        # get the permissions for all users in one round trip
+        user_perms = {}
+        with self.proxy_client.batch() as batch:
+            for user in self.users:
+                if user not in SUPERUSERS:
+                    user_perms[user] = batch.call(
+                        "get_user_permissions", user, self.dbname)
+
         for i, user in enumerate(self.users):
             row = i+2
 
@@ -94,7 +103,7 @@ class ManagePGUsersDialog(ServerFunctionDialog):
                 layout.addWidget(su_label, row, 1, 1, 2)
                 continue
 
-            perms = self.proxy_client.get_pg_user_perms(user, self.dbname)
+            perms = user_perms[user].payload
 
             cb1 = QtGui.QCheckBox()
             cb1.setLayoutDirection(QtCore.Qt.RightToLeft)
@@ -140,13 +149,19 @@ class ManagePGUsersDialog(ServerFunctionDialog):
         self.function_completed.emit()
 
     def apply_changes(self):
-        for user in self.users:
-            if user in SUPERUSERS:
-                continue
-            admin = self.privileged_cbs[user].isChecked()
-            client = self.standard_cbs[user].isChecked()
-            self.proxy_client.grant_pg_user_perms(
-                user, self.dbname, admin, client)
+        results = []
+        with self.proxy_client.batch() as batch:
+            for user in self.users:
+                if user in SUPERUSERS:
+                    continue
+                admin = self.privileged_cbs[user].isChecked()
+                client = self.standard_cbs[user].isChecked()
+                results.append(batch.call("grant_user_permissions",
+                    user, self.dbname, admin, client))
+
+        # raises ProxyClient.PermissionError if appropriate
+        for result in results:
+            result.payload
 
         return True
 
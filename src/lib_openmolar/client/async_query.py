@@ -0,0 +1,329 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+provides AsyncQueryExecutor, which runs database queries in a worker thread
+(with a connection of its own) so that the gui does not freeze whilst
+waiting for the database, and QueryFuture, the pending result of such a
+query.
+
+usage::
+
+    def get_names(database, patient_id):
+        q_query = QtSql.QSqlQuery(database)
+        ...
+        return names
+
+    future = SETTINGS.psql_conn.query_executor.submit(get_names, 1)
+    future.add_callback(show_names, show_error)
+
+the function is called in the worker thread, with the worker's connection
+as the first argument. It must not touch the gui, or SETTINGS.psql_conn.
+callbacks are called in the gui thread.
+'''
+
+from PyQt4 import QtCore, QtSql
+
+class ConnectionError(Exception):
+    '''
+    raised (in the errback) if the worker cannot connect to the database
+    '''
+    pass
+
+class QueryError(Exception):
+    '''
+    raised by :func:`execute_query` if the database returns an error
+    '''
+    pass
+
+class QueryFuture(QtCore.QObject):
+    '''
+    the result of a function submitted to an :doc:`AsyncQueryExecutor`
+    '''
+    #: emitted (in the gui thread) with the result
+    finished = QtCore.pyqtSignal(object)
+
+    #: emitted (in the gui thread) with the exception, if the function raised
+    failed = QtCore.pyqtSignal(object)
+
+    def __init__(self, func, args):
+        QtCore.QObject.__init__(self)
+        self.func = func
+        self.args = args
+        self._done = False
+        self._cancelled = False
+        self._result = None
+        self._exception = None
+
+    def __repr__(self):
+        return "QueryFuture %s%s"% (self.func.__name__, self.args)
+
+    def cancel(self):
+        '''
+        don't run the function (if it hasn't started),
+        and don't call the callbacks.
+        '''
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        '''
+        the value returned by the function.
+        raises the function's exception if it failed.
+        '''
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    @property
+    def exception(self):
+        return self._exception
+
+    def add_callback(self, callback, errback=None):
+        '''
+        callback(result) is called when the function has returned,
+        errback(exception) if it raised.
+        (immediately, if the future is already done)
+        '''
+        if self._done:
+            if self._exception is None:
+                callback(self._result)
+            elif errback is not None:
+                errback(self._exception)
+            return
+        self.finished.connect(callback)
+        if errback is not None:
+            self.failed.connect(errback)
+
+    def _run(self, database):
+        '''
+        called in the worker thread
+        '''
+        try:
+            if database is None:
+                raise ConnectionError("worker connection is not open")
+            self._result = self.func(database, *self.args)
+        except Exception as exc:
+            LOGGER.exception("%s failed"% self)
+            self._exception = exc
+
+    def _emit(self):
+        '''
+        called in the gui thread
+        '''
+        self._done = True
+        if self._cancelled:
+            return
+        if self._exception is None:
+            self.finished.emit(self._result)
+        else:
+            self.failed.emit(self._exception)
+
+class _QueryWorker(QtCore.QObject):
+    '''
+    lives in the executor's thread, with its own database connection.
+    '''
+    job_done = QtCore.pyqtSignal(object)
+
+    def __init__(self, params, connection_name):
+        QtCore.QObject.__init__(self)
+        self.params = params
+        self.connection_name = connection_name
+        self.database = None
+
+    def _open(self):
+        if self.database is None:
+            database = QtSql.QSqlDatabase.addDatabase("QPSQL",
+                self.connection_name)
+            database.setHostName(self.params["host"])
+            database.setPort(self.params["port"])
+            database.setUserName(self.params["user"])
+            database.setPassword(self.params["password"])
+            database.setDatabaseName(self.params["db_name"])
+            database.setConnectOptions(self.params["options"])
+            if not database.open():
+                LOGGER.warning("%s connection failed - %s"% (
+                    self.connection_name, database.lastError().text()))
+                del database
+                QtSql.QSqlDatabase.removeDatabase(self.connection_name)
+                return None
+            self.database = database
+        return self.database
+
+    @QtCore.pyqtSlot(object)
+    def run(self, future):
+        if not future.cancelled:
+            future._run(self._open())
+        self.job_done.emit(future)
+
+    @QtCore.pyqtSlot()
+    def close(self):
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+            QtSql.QSqlDatabase.removeDatabase(self.connection_name)
+
+class AsyncQueryExecutor(QtCore.QObject):
+    '''
+    runs functions (which query the database) one at a time, in order,
+    in a worker thread with its own copy of connection.
+    the thread is started when the first function is submitted.
+    '''
+    _submit = QtCore.pyqtSignal(object)
+
+    def __init__(self, connection, connection_name="openmolar_async",
+    priority=QtCore.QThread.InheritPriority):
+        QtCore.QObject.__init__(self)
+        #: the :doc:`ClientConnection` whose parameters are copied
+        self.connection = connection
+        #: the name of the worker's QSqlDatabase connection (must be unique)
+        self.connection_name = connection_name
+        self.priority = priority
+        self._thread = None
+        self._worker = None
+        self._pending = set()
+
+    @property
+    def is_running(self):
+        return self._thread is not None
+
+    @property
+    def pending(self):
+        '''
+        the number of functions submitted but not yet returned
+        '''
+        return len(self._pending)
+
+    def _connection_params(self):
+        return {
+            "host": self.connection.hostName(),
+            "port": self.connection.port(),
+            "user": self.connection.userName(),
+            "password": self.connection.password(),
+            "db_name": self.connection.databaseName(),
+            "options": self.connection.connectOptions(),
+            }
+
+    def start(self):
+        '''
+        start the worker thread
+        '''
+        if self.is_running:
+            return
+        self._thread = QtCore.QThread()
+        self._worker = _QueryWorker(self._connection_params(),
+            self.connection_name)
+        self._worker.moveToThread(self._thread)
+        self._submit.connect(self._worker.run)
+        self._worker.job_done.connect(self._job_done)
+        self._thread.start(self.priority)
+        LOGGER.debug("%s worker started"% self.connection_name)
+
+    def stop(self):
+        '''
+        cancel any pending functions, close the worker's connection
+        and stop the thread
+        '''
+        if not self.is_running:
+            return
+        for future in self._pending:
+            future.cancel()
+        QtCore.QMetaObject.invokeMethod(self._worker, "close",
+            QtCore.Qt.BlockingQueuedConnection)
+        self._thread.quit()
+        self._thread.wait()
+        self._thread, self._worker = None, None
+        self._pending.clear()
+        LOGGER.debug("%s worker stopped"% self.connection_name)
+
+    def submit(self, func, *args):
+        '''
+        call func(database, \*args) in the worker thread.
+        returns a :doc:`QueryFuture`
+        '''
+        self.start()
+        future = QueryFuture(func, args)
+        self._pending.add(future)
+        self._submit.emit(future)
+        return future
+
+    def execute(self, query, values=()):
+        '''
+        a convenience function.
+        run query (binding values) in the worker thread.
+        the future's result is a list of QSqlRecords
+        '''
+        return self.submit(execute_query, query, tuple(values))
+
+    @QtCore.pyqtSlot(object)
+    def _job_done(self, future):
+        self._pending.discard(future)
+        future._emit()
+
+def execute_query(database, query, values=()):
+    '''
+    prepare query, bind values, execute and return a list of QSqlRecords.
+    raises a QueryError if the query fails.
+    '''
+    q_query = QtSql.QSqlQuery(database)
+    q_query.prepare(query)
+    for value in values:
+        q_query.addBindValue(value)
+    if not q_query.exec_():
+        raise QueryError(u"%s"% q_query.lastError().text())
+    records = []
+    while q_query.next():
+        records.append(q_query.record())
+    return records
+
+def _test():
+    from lib_openmolar.client.connect import DemoClientConnection
+    app = QtCore.QCoreApplication([])
+    cc = DemoClientConnection()
+    cc.connect()
+    executor = AsyncQueryExecutor(cc)
+
+    def show(records):
+        LOGGER.debug("%d patients"% len(records))
+        app.quit()
+
+    def show_error(exc):
+        LOGGER.error(exc)
+        app.quit()
+
+    future = executor.execute("select ix from patients where ix > ?", [0])
+    future.add_callback(show, show_error)
+    app.exec_()
+    executor.stop()
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level = logging.DEBUG)
+    LOGGER = logging.getLogger("test")
+    import lib_openmolar.client
+    _test()
@@ -30,6 +30,7 @@ from lib_openmolar.common.datatypes import ConnectionData
 from lib_openmolar.common.qt4.postgres.openmolar_database import \
     OpenmolarDatabase
 
+from lib_openmolar.client.async_query import AsyncQueryExecutor, QueryError
 from lib_openmolar.client.db_orm.client_patient import DuckPatient
 
 class ClientConnection(OpenmolarDatabase):
@@ -37,10 +38,14 @@ class ClientConnection(OpenmolarDatabase):
     inherits from lib_openmolar.common.connect.OpenmolarDatabase,
     which in turn inherits from PyQt4.QSql.QSqlDatabase
     '''
-    _blank_address_record = None
+    _patient_loader = None
+    _patient_prefetcher = None
+    _query_executor = None
 
     def connect(self):
         SETTINGS.psql_conn = None
+        self._patient_loader = None
+        self._stop_workers()
         self.setConnectOptions("%sapplication_name=openmolar-client;"%
             self.connectOptions())
         OpenmolarDatabase.connect(self)
@@ -53,13 +58,54 @@ class ClientConnection(OpenmolarDatabase):
 
     @property
     def blank_address_record(self):
-        if self._blank_address_record is None:
-            query = QtSql.QSqlQuery("select * from addresses limit 1", self)
-            #note - not positioned on a valid record
-            record = query.record()
-            #record.clear()
-            self._blank_address_record = record
-        return self._blank_address_record
+        return self.schema_cache.record("addresses")
+
+    @property
+    def patient_loader(self):
+        '''
+        a :doc:`PatientLoader` for this connection
+        '''
+        if self._patient_loader is None:
+            from lib_openmolar.client.db_orm.patient_loader import \
+                PatientLoader
+            self._patient_loader = PatientLoader(self)
+        return self._patient_loader
+
+    @property
+    def patient_prefetcher(self):
+        '''
+        a :doc:`PatientPrefetcher` for this connection
+        '''
+        if self._patient_prefetcher is None:
+            from lib_openmolar.client.db_orm.patient_prefetcher import \
+                PatientPrefetcher
+            self._patient_prefetcher = PatientPrefetcher(self)
+        return self._patient_prefetcher
+
+    @property
+    def query_executor(self):
+        '''
+        an :doc:`AsyncQueryExecutor` for this connection.
+        use this for queries which would otherwise block the gui.
+        '''
+        if self._query_executor is None:
+            self._query_executor = AsyncQueryExecutor(self)
+        return self._query_executor
+
+    def _stop_workers(self):
+        if self._patient_prefetcher is not None:
+            self._patient_prefetcher.stop()
+            self._patient_prefetcher = None
+        if self._query_executor is not None:
+            self._query_executor.stop()
+            self._query_executor = None
+
+    def close(self):
+        '''
+        re-implement QSqlDatabase.close, stopping any worker threads
+        '''
+        self._stop_workers()
+        OpenmolarDatabase.close(self)
 
     def fname_completer(self, sname):
         query = 'SELECT DISTINCT(first_name) from patients where last_name=?'
@@ -89,96 +135,21 @@ class ClientConnection(OpenmolarDatabase):
         NOTE - also called when a new patient is being added, in which case
         search values is a dictionary)
         '''
+        try:
+            return find_matches(self, search_values)
+        except QueryError as exc:
+            self.emit_error_message(unicode(exc))
+            return []
 
-        query = '''SELECT DISTINCT ON (patients.ix)
-        patients.ix, title, last_name, first_name,
-        preferred_name, dob, addr1, addr2, postal_cd, number
-        from (patients left outer join
-        (addresses join address_link on addresses.ix = address_link.address_id)
-        on patients.ix = address_link.patient_id)
-        left outer join
-        (telephone join telephone_link on telephone.ix = telephone_link.tel_id)
-        on telephone_link.patient_id = patients.ix
-        WHERE '''
-
-        conds, values = '', []
-
-        sname = search_values.get("sname", "")
-        soundex = search_values.get("soundex_sname", False)
-        if sname != "":
-            sub_cond = 'last_name ilike ? and '
-            values.append(sname + "%")
-            if soundex:
-                sub_cond = '(%s or difference(last_name, ?) > 2) and '% (
-                            sub_cond.rstrip("and "))
-                values.append(sname)
-            conds += sub_cond
-
-        fname = search_values.get("fname", "")
-        soundex = search_values.get("soundex_fname", False)
-        if fname != "":
-            sub_cond = '(first_name ilike ? or preferred_name ilike ?) and '
-            values.append(fname + "%")
-            values.append(fname + "%")
-            if soundex:
-                sub_cond = '''(%s or
-                (difference(first_name, ?)>2 or
-                difference(preferred_name, ?)>2))
-                and '''% sub_cond.rstrip("and ")
-                values.append(fname)
-                values.append(fname)
-            conds += sub_cond
-
-        dob = search_values.get("dob", QtCore.QDate(1900,1,1))
-        if dob != QtCore.QDate(1900,1,1):
-            conds += 'dob = ? and '
-            values.append(dob)
-
-        addr = search_values.get("addr")
-        if addr:
-            conds += '(addr1 ilike ? or addr2 ilike ?) and '
-            values.append("%"+addr+"%")
-            values.append("%"+addr+"%")
-
-        pcde = search_values.get("pcde")
-        if pcde:
-            conds += 'postal_cd ilike ? and '
-            values.append("%"+pcde+"%")
-
-        tel = search_values.get("tel")
-        if tel:
-            conds += 'number ilike ? and '
-            values.append("%"+tel+"%")
-
-        query = query + conds.rstrip('and ')
-        q_query = QtSql.QSqlQuery(self)
-        q_query.prepare(query)
-        for value in values:
-            q_query.addBindValue(value)
-
-        if not q_query.exec_():
-            print "BAD QUERY?"
-            print query
-            self.emit_caught_error(q_query.lastError())
-        matches = []
-        while q_query.next():
-            patient = DuckPatient()
-            patient.patient_id = q_query.value(0).toInt()[0]
-            patient.title = unicode(q_query.value(1).toString())
-            patient.last_name = unicode(q_query.value(2).toString())
-            patient.first_name = unicode(q_query.value(3).toString())
-            patient.preferred_name = unicode(q_query.value(4).toString())
-            patient.dob = q_query.value(5).toDate()
-
-            ## attribute for search only
-            patient.addr1 = q_query.value(6).toString()
-            patient.addr2 = q_query.value(7).toString()
-            patient.pcde = q_query.value(8).toString()
-            patient.number = q_query.value(9).toString()
-
-            matches.append(patient)
-
-        return matches
+    def get_matchlist_async(self, search_values):
+        '''
+        as get_matchlist, but the query is run in the worker thread.
+        returns a :doc:`QueryFuture`, whose result is the list of patients
+        '''
+        future = self.query_executor.submit(find_matches, dict(search_values))
+        future.failed.connect(
+            lambda exc: self.emit_error_message(unicode(exc)))
+        return future
 
     def get_address_matchmodel(self, search_values):
         '''
@@ -248,15 +219,123 @@ class ClientConnection(OpenmolarDatabase):
         '''
         LOGGER.debug("adding new_appointment notification")
         self.driver().subscribeToNotification("appointments_changed")
+        LOGGER.debug("adding patient_changed notification")
+        self.driver().subscribeToNotification("patient_changed")
+        LOGGER.debug("adding diary_changed notification")
+        self.driver().subscribeToNotification("diary_changed")
 
     def emit_caught_error(self, error):
         '''
         emits a signal with signature "db error" hopefully someone will see it!
         '''
         if error.isValid():
-            print "emiting error", error.text()
-            QtCore.QCoreApplication.instance().emit(
-                QtCore.SIGNAL("db error"), error.text())
+            self.emit_error_message(error.text())
+
+    def emit_error_message(self, message):
+        '''
+        emits a signal with signature "db error" and the message
+        '''
+        print "emiting error", message
+        QtCore.QCoreApplication.instance().emit(
+            QtCore.SIGNAL("db error"), message)
+
+def find_matches(database, search_values):
+    '''
+    get's a list of patients who's criteria match a user search
+    return a list of DuckPatient objects (with address details appended)
+    raises a QueryError if the query fails.
+    (called by ClientConnection.get_matchlist, or in the worker thread of
+    an :doc:`AsyncQueryExecutor`)
+    '''
+
+    query = '''SELECT DISTINCT ON (patients.ix)
+    patients.ix, title, last_name, first_name,
+    preferred_name, dob, addr1, addr2, postal_cd, number
+    from (patients left outer join
+    (addresses join address_link on addresses.ix = address_link.address_id)
+    on patients.ix = address_link.patient_id)
+    left outer join
+    (telephone join telephone_link on telephone.ix = telephone_link.tel_id)
+    on telephone_link.patient_id = patients.ix
+    WHERE '''
+
+    conds, values = '', []
+
+    sname = search_values.get("sname", "")
+    soundex = search_values.get("soundex_sname", False)
+    if sname != "":
+        sub_cond = 'last_name ilike ? and '
+        values.append(sname + "%")
+        if soundex:
+            sub_cond = '(%s or difference(last_name, ?) > 2) and '% (
+                        sub_cond.rstrip("and "))
+            values.append(sname)
+        conds += sub_cond
+
+    fname = search_values.get("fname", "")
+    soundex = search_values.get("soundex_fname", False)
+    if fname != "":
+        sub_cond = '(first_name ilike ? or preferred_name ilike ?) and '
+        values.append(fname + "%")
+        values.append(fname + "%")
+        if soundex:
+            sub_cond = '''(%s or
+            (difference(first_name, ?)>2 or
+            difference(preferred_name, ?)>2))
+            and '''% sub_cond.rstrip("and ")
+            values.append(fname)
+            values.append(fname)
+        conds += sub_cond
+
+    dob = search_values.get("dob", QtCore.QDate(1900,1,1))
+    if dob != QtCore.QDate(1900,1,1):
+        conds += 'dob = ? and '
+        values.append(dob)
+
+    addr = search_values.get("addr")
+    if addr:
+        conds += '(addr1 ilike ? or addr2 ilike ?) and '
+        values.append("%"+addr+"%")
+        values.append("%"+addr+"%")
+
+    pcde = search_values.get("pcde")
+    if pcde:
+        conds += 'postal_cd ilike ? and '
+        values.append("%"+pcde+"%")
+
+    tel = search_values.get("tel")
+    if tel:
+        conds += 'number ilike ? and '
+        values.append("%"+tel+"%")
+
+    query = query + conds.rstrip('and ')
+    q_query = QtSql.QSqlQuery(database)
+    q_query.prepare(query)
+    for value in values:
+        q_query.addBindValue(value)
+
+    if not q_query.exec_():
+        LOGGER.error("BAD QUERY? %s"% query)
+        raise QueryError(u"%s"% q_query.lastError().text())
+    matches = []
+    while q_query.next():
+        patient = DuckPatient()
+        patient.patient_id = q_query.value(0).toInt()[0]
+        patient.title = unicode(q_query.value(1).toString())
+        patient.last_name = unicode(q_query.value(2).toString())
+        patient.first_name = unicode(q_query.value(3).toString())
+        patient.preferred_name = unicode(q_query.value(4).toString())
+        patient.dob = q_query.value(5).toDate()
+
+        ## attribute for search only
+        patient.addr1 = q_query.value(6).toString()
+        patient.addr2 = q_query.value(7).toString()
+        patient.pcde = q_query.value(8).toString()
+        patient.number = q_query.value(9).toString()
+
+        matches.append(patient)
+
+    return matches
 
 class DemoClientConnection(ClientConnection):
     '''
@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+This module provides the ChangeFeed Class, which reads the rows added to a
+change log table (eg. diary_changes or patient_changes) since it last
+looked.
+
+The triggers in the schema record each change in such a table, then send
+a notification (eg. diary_changed) without a payload.
+The payload of a notification is not passed on by the PyQt4 driver, so
+listeners read the feed to find out what has changed.
+'''
+
+import time
+
+from PyQt4 import QtSql
+
+#: transactions may commit in a different order to that in which they
+#: took their ix, so rows this far behind the last row read are read again
+#: (those already seen are ignored)
+OVERLAP = 50
+
+#: rows older than this are removed from the table
+KEEP = "1 day"
+
+#: minimum seconds between removals of old rows
+PRUNE_INTERVAL = 3600
+
+class ChangeFeed(object):
+    '''
+    the rows of table tablename (which has columns ix and changed),
+    read in order of ix.
+    '''
+    def __init__(self, connection, tablename, columns):
+        #: the QSqlDatabase the table is read from
+        self.connection = connection
+        #:
+        self.tablename = tablename
+        self._query = "select ix, %s from %s where ix > ? order by ix"% (
+            ", ".join(columns), tablename)
+        self._last = None
+        self._seen = set()
+        self._last_prune = 0
+
+    def __repr__(self):
+        return "ChangeFeed %s (last row %s)"% (self.tablename, self._last)
+
+    @property
+    def is_started(self):
+        return self._last is not None
+
+    def start(self):
+        '''
+        read changes from now on.
+        returns False if the table can't be read.
+        '''
+        self.stop()
+        q_query = QtSql.QSqlQuery(self.connection)
+        if (q_query.exec_("select coalesce(max(ix), 0) from %s"%
+        self.tablename) and q_query.next()):
+            self._last = q_query.value(0).toInt()[0]
+            self.prune()
+            return True
+        LOGGER.warning("unable to read %s - %s"% (
+            self.tablename, q_query.lastError().text()))
+        return False
+
+    def stop(self):
+        '''
+        forget the position in the feed
+        '''
+        self._last = None
+        self._seen = set()
+
+    def read(self):
+        '''
+        the rows (QSqlRecords) added since the last call,
+        or None if the feed isn't started or can't be read,
+        in which case anything may have changed.
+        '''
+        if self._last is None:
+            return None
+        q_query = QtSql.QSqlQuery(self.connection)
+        q_query.prepare(self._query)
+        q_query.addBindValue(self._last - OVERLAP)
+        if not q_query.exec_():
+            LOGGER.warning("unable to read %s - %s"% (
+                self.tablename, q_query.lastError().text()))
+            return None
+        records = []
+        while q_query.next():
+            record = q_query.record()
+            ix = record.value("ix").toInt()[0]
+            if ix in self._seen:
+                continue
+            self._seen.add(ix)
+            self._last = max(self._last, ix)
+            records.append(record)
+        oldest = self._last - OVERLAP
+        self._seen = set([ix for ix in self._seen if ix > oldest])
+        if time.time() - self._last_prune > PRUNE_INTERVAL:
+            self.prune()
+        return records
+
+    def prune(self):
+        '''
+        remove rows older than KEEP
+        (done by the readers, so the triggers only ever insert)
+        '''
+        self._last_prune = time.time()
+        q_query = QtSql.QSqlQuery(self.connection)
+        if not q_query.exec_(
+        "delete from %s where changed < now() - interval '%s'"% (
+        self.tablename, KEEP)):
+            LOGGER.warning("unable to prune %s - %s"% (
+                self.tablename, q_query.lastError().text()))
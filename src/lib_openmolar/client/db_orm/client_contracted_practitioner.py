@@ -29,6 +29,11 @@ from lib_openmolar.common.db_orm import InsertableRecord
 
 TABLENAME = "contracted_practitioners"
 
+QUERY = '''select ix, practitioner_id,
+    contract_type, start_date, end_date, comments
+    from %s where patient_id=? and
+    (end_date is NULL or end_date <= current_date)  '''% TABLENAME
+
 
 class NewContractedPractitionerRecord(InsertableRecord):
     def __init__(self):
@@ -55,21 +60,19 @@ class ContractedPractitionerDB(object):
     '''
     class to get contracted practitioner info
     '''
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
         self.record_list = []
 
-        query = '''select ix, practitioner_id,
-        contract_type, start_date, end_date, comments
-        from %s where patient_id=? and
-        (end_date is NULL or end_date <= current_date)  '''% TABLENAME
-
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
-            self.record_list.append(record)
+        if records is not None:
+            self.record_list.extend(records)
+        else:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+            while q_query.next():
+                record = q_query.record()
+                self.record_list.append(record)
 
     @property
     def records(self):
@@ -31,8 +31,11 @@ from lib_openmolar.common.db_orm import InsertableRecord
 
 TABLENAME = "clinical_memos"
 
+QUERY = '''SELECT * from %s
+    WHERE patient_id = ? order by ix desc limit 1'''% TABLENAME
+
 class MemoClinicalDB(InsertableRecord):
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
 
         self.tablename = TABLENAME
         #:
@@ -41,17 +44,20 @@ class MemoClinicalDB(InsertableRecord):
         #:
         self.exists_in_db = True
 
-        query = '''SELECT * from %s
-        WHERE patient_id = ? order by ix desc limit 1'''% TABLENAME
-
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-
-        if not q_query.next(): # no memos exist.
+        if records is None:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+
+            if not q_query.next(): # no memos exist.
+                self.exists_in_db = False
+            record = q_query.record()
+        elif records:
+            record = records[0]
+        else: # no memos exist.
             self.exists_in_db = False
-        record = q_query.record()
+            record = SETTINGS.psql_conn.schema_cache.record(TABLENAME)
         QtSql.QSqlQuery.__init__(self, record)
 
         ## make a copy (a marker of database state)
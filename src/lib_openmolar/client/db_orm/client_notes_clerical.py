@@ -27,13 +27,21 @@ This module provides the NotesClericalDB Class
 '''
 
 from PyQt4 import QtCore, QtSql
+from lib_openmolar.common.db_orm import InsertableRecord
+
+TABLENAME = "notes_clerical"
+
+QUERY = '''SELECT * from %s WHERE patient_id = ?
+    ORDER BY open_time'''% TABLENAME
 
 class NotesClericalDB(object):
     _new_note = None
     _records = None
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
         #:
         self.patient_id = patient_id
+        if records is not None:
+            self.get_records(records)
 
     def has_new_note(self):
         return self._new_note is not None
@@ -68,23 +76,26 @@ class NotesClericalDB(object):
             return False
         return self._new_note.value("line").toString() != ""
 
-    def get_records(self):
+    def get_records(self, records=None):
         '''
-        get the records from the database.
+        get the records from the database
+        (unless the result of :attr:`QUERY` is passed as records).
 
         .. note:
             A property of is_clinical is added to each record, and set as False
         '''
         self._records = []
 
-        query = '''SELECT * from notes_clerical WHERE patient_id = ?
-        ORDER BY open_time'''
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(self.patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
+        if records is None:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(self.patient_id)
+            q_query.exec_()
+            records = []
+            while q_query.next():
+                records.append(q_query.record())
+
+        for record in records:
             record.is_clinical = False
             self._records.append(record)
 
@@ -27,15 +27,19 @@ This module provides the ClinicalNotesDB Class
 
 TABLENAME = "notes_clinical"
 
+QUERY = 'SELECT * from %s WHERE patient_id = ? order by open_time'% TABLENAME
+
 from PyQt4 import QtCore, QtSql
 from lib_openmolar.common.db_orm import InsertableRecord
 
 class NotesClinicalDB(object):
     _new_note = None
     _records = None
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
         #:
         self.patient_id = patient_id
+        if records is not None:
+            self.get_records(records)
 
     @property
     def is_dirty(self):
@@ -71,22 +75,25 @@ class NotesClinicalDB(object):
             self._records.append(self._new_note)
         return True
 
-    def get_records(self):
+    def get_records(self, records=None):
         '''
         get the records from the database
+        (unless the result of :attr:`QUERY` is passed as records)
 
         .. note:
             A property of is_clinical is added to each record, and set as True
         '''
         self._records = []
-        query = 'SELECT * from %s WHERE patient_id = ? order by open_time'% (
-            TABLENAME)
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(self.patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
+        if records is None:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(self.patient_id)
+            q_query.exec_()
+            records = []
+            while q_query.next():
+                records.append(q_query.record())
+
+        for record in records:
             record.is_clinical = True
             self._records.append(record)
 
@@ -33,6 +33,8 @@ from lib_openmolar.common.db_orm import InsertableRecord
 
 TABLENAME = "patients"
 
+QUERY = 'SELECT * from %s WHERE ix = ?'% TABLENAME
+
 class PatientNotFoundError(Exception):
     pass
 
@@ -96,20 +98,25 @@ class DuckPatient(object):
         return u"patient - %s"% self.full_name
 
 class PatientDB(QtSql.QSqlRecord):
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
+        '''
+        records (optional) is the result of :attr:`QUERY`
+        (already fetched by :doc:`PatientLoader`)
+        '''
 
         #:
         self.patient_id = patient_id
 
-        query = 'SELECT * from %s WHERE ix = ?'% TABLENAME
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-        if not q_query.next():
+        if records is None:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+            records = [q_query.record()] if q_query.next() else []
+        if not records:
             raise PatientNotFoundError
         else:
-            record = q_query.record()
+            record = records[0]
             QtSql.QSqlQuery.__init__(self, record)
 
             ## make a copy (a marker of database state)
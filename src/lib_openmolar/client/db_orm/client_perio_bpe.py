@@ -29,6 +29,9 @@ from lib_openmolar.common.db_orm import InsertableRecord
 
 TABLENAME = "perio_bpe"
 
+QUERY = '''select checked_date, values, comment, checked_by from %s
+    where patient_id=? order by checked_date desc, ix desc'''% TABLENAME
+
 class NewPerioBPERecord(InsertableRecord):
     def __init__(self):
         InsertableRecord.__init__(
@@ -55,20 +58,20 @@ class PerioBpeDB(object):
     '''
     class to get BPE information
     '''
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
         #: the underlying list of QSqlRecords
         self.record_list = []
 
-        query = '''select checked_date, values, comment, checked_by from %s
-        where patient_id=? order by checked_date desc, ix desc'''% TABLENAME
-
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
-            self.record_list.append(record)
+        if records is not None:
+            self.record_list.extend(records)
+        else:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+            while q_query.next():
+                record = q_query.record()
+                self.record_list.append(record)
 
     @property
     def records(self):
@@ -29,6 +29,9 @@ from lib_openmolar.common.db_orm import InsertableRecord
 
 TABLENAME = "perio_pocketing"
 
+QUERY = '''select checked_date, tooth, values, comment, checked_by
+    from %s where patient_id=? order by checked_date'''% TABLENAME
+
 class NewPerioPocketingRecord(InsertableRecord):
     def __init__(self):
         InsertableRecord.__init__(self, SETTINGS.psql_conn, TABLENAME)
@@ -54,20 +57,20 @@ class PerioPocketingDB(object):
     '''
     class to get static chart information about perio pocketing
     '''
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
         #: the underlying list of QSqlRecords
         self.record_list = []
 
-        query = '''select checked_date, tooth, values, comment, checked_by
-        from %s where patient_id=? order by checked_date'''% TABLENAME
-
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
-            self.record_list.append(record)
+        if records is not None:
+            self.record_list.extend(records)
+        else:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+            while q_query.next():
+                record = q_query.record()
+                self.record_list.append(record)
         self._records = None
 
 
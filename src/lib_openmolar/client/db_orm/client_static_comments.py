@@ -30,6 +30,8 @@ from lib_openmolar.common.db_orm import InsertableRecord
 
 TABLENAME = "static_comments"
 
+QUERY = 'select tooth, comment from %s where patient_id=?'% TABLENAME
+
 class CommentRecord(InsertableRecord):
     def __init__(self):
         InsertableRecord.__init__(self, SETTINGS.psql_conn, TABLENAME)
@@ -47,22 +49,23 @@ class StaticCommentsDB(object):
     '''
     class to get static chart information
     '''
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
         #:
         self.patient_id = patient_id
         #:
         self.record_list = []
         self._orig_record_list = []
 
-        query = 'select tooth, comment from %s where patient_id=?'% TABLENAME
-
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
+        if records is None:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+            records = []
+            while q_query.next():
+                records.append(q_query.record())
 
+        for record in records:
             new = CommentRecord()
             QtSql.QSqlQuery.__init__(new, record)
 
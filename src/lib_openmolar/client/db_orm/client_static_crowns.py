@@ -30,6 +30,9 @@ from lib_openmolar.common.db_orm import InsertableRecord
 
 TABLENAME = "static_crowns"
 
+QUERY = '''select tooth, type, technition, comment
+    from %s where patient_id=?'''% TABLENAME
+
 class CrownRecord(InsertableRecord):
     def __init__(self):
         InsertableRecord.__init__(self, SETTINGS.psql_conn, TABLENAME)
@@ -55,23 +58,23 @@ class StaticCrownsDB(object):
     '''
     class to get static chart information
     '''
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
         #:
         self.patient_id = patient_id
         #:
         self.record_list = []
         self._orig_record_list = []
 
-        query = '''select tooth, type, technition, comment
-        from %s where patient_id=?'''% TABLENAME
-
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
+        if records is None:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+            records = []
+            while q_query.next():
+                records.append(q_query.record())
 
+        for record in records:
             new = CrownRecord()
             QtSql.QSqlQuery.__init__(new, record)
 
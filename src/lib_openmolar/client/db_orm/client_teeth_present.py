@@ -31,21 +31,27 @@ from lib_openmolar.common.db_orm import InsertableRecord
 
 TABLENAME = "teeth_present"
 
+QUERY = '''SELECT * from %s WHERE patient_id = ?
+        order by ix desc limit 1'''% TABLENAME
+
 class TeethPresentDB(InsertableRecord):
-    def __init__(self, patient_id):
+    def __init__(self, patient_id, records=None):
         InsertableRecord.__init__(self, SETTINGS.psql_conn,
             TABLENAME)
 
         #:
         self.patient_id = patient_id
-        query = '''SELECT * from %s WHERE patient_id = ?
-        order by ix desc limit 1'''% TABLENAME
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-        q_query.next()
-        record = q_query.record()
+        if records is None:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+            q_query.next()
+            record = q_query.record()
+        elif records:
+            record = records[0]
+        else:
+            record = QtSql.QSqlRecord(self)
         QtSql.QSqlQuery.__init__(self, record)
 
         ## make a copy (a marker of database state)
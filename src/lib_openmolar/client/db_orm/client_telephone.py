@@ -32,19 +32,23 @@ align='right' src='qrc:/icons/phone.png' />'''
 
 TABLENAME = "telephone"
 
-class TelephoneDB(object):
-    def __init__(self, patient_id):
-        self.record_list = []
-        query = '''SELECT number, sms_capable, checked_date, tel_cat
+QUERY = '''SELECT number, sms_capable, checked_date, tel_cat
 from %s join telephone_link on telephone.ix = telephone_link.tel_id
 WHERE patient_id = ? order by checked_date desc'''% TABLENAME
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
-            self.record_list.append(record)
+
+class TelephoneDB(object):
+    def __init__(self, patient_id, records=None):
+        self.record_list = []
+        if records is not None:
+            self.record_list.extend(records)
+        else:
+            q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+            q_query.prepare(QUERY)
+            q_query.addBindValue(patient_id)
+            q_query.exec_()
+            while q_query.next():
+                record = q_query.record()
+                self.record_list.append(record)
 
     @property
     def records(self):
@@ -1,2 +1,3 @@
 from diary_model import _DiarySettings
 from diary_model import DiaryDataModel
+from free_slots import FreeSlot, find_free_slots, find_joint_slots
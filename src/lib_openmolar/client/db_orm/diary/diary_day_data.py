@@ -26,6 +26,70 @@ provides one 'private' class DiaryDayData
 from PyQt4 import QtCore, QtSql
 from diary_appointment import DiaryAppointment
 
+## start >= ? and start < ? (rather than date(start) between ? and ?)
+## so that postgres can use the indexes on start.
+
+SESSIONS_QUERY = '''select diary_id, start, finish
+from diary_in_office where start >= ? and start < ?'''
+
+ENTRIES_QUERY = '''select diary_id, start, finish, etype, comment
+from diary_entries where start >= ? and start < ?
+order by start'''
+
+def _bind_date_range(q_query, first, last):
+    '''
+    bind the timestamps bounding dates first to last (inclusive)
+    '''
+    q_query.addBindValue(QtCore.QDateTime(first))
+    q_query.addBindValue(QtCore.QDateTime(last.addDays(1)))
+
+def query_sessions(database, first, last):
+    '''
+    the sessions (from diary_in_office) between dates first and last
+    (inclusive) as a dictionary {py_date: [(diary_id, start, finish), ...]}
+    can be called from a worker thread, with that thread's database.
+    '''
+    q_query = QtSql.QSqlQuery(database)
+    q_query.prepare(SESSIONS_QUERY)
+    _bind_date_range(q_query, first, last)
+
+    q_query.exec_()
+    if q_query.lastError().isValid():
+        LOGGER.error("%s"% q_query.lastError().text())
+        LOGGER.debug("query was %s"% q_query.lastQuery())
+    sessions = {}
+    while q_query.next():
+        record = q_query.record()
+        diary_id = record.value("diary_id").toInt()[0]
+        start = record.value("start").toDateTime()
+        finish =  record.value("finish").toDateTime()
+        sessions.setdefault(start.date().toPyDate(), []).append(
+            (diary_id, start, finish))
+    q_query.finish()
+    return sessions
+
+def query_entries(database, first, last):
+    '''
+    the diary entries between dates first and last (inclusive)
+    as a dictionary {py_date: [QSqlRecord, ...]}
+    can be called from a worker thread, with that thread's database.
+    '''
+    q_query = QtSql.QSqlQuery(database)
+    q_query.prepare(ENTRIES_QUERY)
+    _bind_date_range(q_query, first, last)
+
+    q_query.exec_()
+    if q_query.lastError().isValid():
+        LOGGER.error("%s"% q_query.lastError().text())
+        LOGGER.debug("query was %s"% q_query.lastQuery())
+    entries = {}
+    while q_query.next():
+        record = q_query.record()
+        date = record.value("start").toDateTime().date().toPyDate()
+        entries.setdefault(date, []).append(record)
+    q_query.finish()
+    return entries
+
 class DiaryDayData(object):
     '''
     this object stores information gleaned from the diary of the database.
@@ -42,6 +106,10 @@ class DiaryDayData(object):
         self.in_bookable_range = False
         self._sessions = {}
 
+        #: True whilst the data for this day is being fetched in the
+        #: background (see DiaryDataModel)
+        self.loading = False
+
     def __repr__(self):
         return "DiaryDayData %s (%d Diaries), %s, %s" % (
         self.date.toString("yyyy-MM-dd"), len(self._diaries),
@@ -54,6 +122,8 @@ class DiaryDayData(object):
     @property
     def entries(self):
         if self._entries is None:
+            if self.loading:
+                return []
             self.load_entries()
         return self._entries
 
@@ -124,59 +194,37 @@ class DiaryDayData(object):
             dtime = dtime.time()
         return dtime.hour() * 60 + dtime.minute()
 
-    def load_sessions(self):
+    def set_sessions(self, sessions):
         '''
-        loads all appointments of type "session" for this day
+        sessions is a list of (diary_id, start, finish)
         '''
-        LOGGER.debug("%s load_sessions"% self)
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-
-        query = '''select diary_id, start, finish
-        from  diary_in_office where date(start) = ?'''
-        q_query.prepare(query)
-        q_query.addBindValue(self.date)
-
-        q_query.exec_()
-        if q_query.lastError().isValid():
-            LOGGER.error("%s"% q_query.lastError().text())
-            LOGGER.debug("query was %s"% q_query.lastQuery())
-        while q_query.next():
-            record = q_query.record()
-            diary_id = record.value("diary_id").toInt()[0]
-            start = record.value("start").toDateTime()
-            finish =  record.value("finish").toDateTime()
-
+        for diary_id, start, finish in sessions:
             self.set_session_start(diary_id, start)
             self.set_session_finish(diary_id, finish)
+        self._diary_list = None
+        self.sessions_loaded = True
 
-        q_query.finish()
+    def set_entries(self, records):
+        '''
+        records are QSqlRecords from the diary_entries table
+        '''
+        self._entries = [DiaryAppointment(record) for record in records]
 
-        self.sessions_loaded = True
+    def load_sessions(self):
+        '''
+        loads all appointments of type "session" for this day
+        '''
+        LOGGER.debug("%s load_sessions"% self)
+        sessions = query_sessions(SETTINGS.psql_conn, self.date, self.date)
+        self.set_sessions(sessions.get(self.date.toPyDate(), []))
 
     def load_entries(self):
         '''
-        loads all appointments of type "session" for this day
+        loads all diary entries for this day
         '''
         LOGGER.debug("load_entries for date %s"% self.date)
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-
-        query = '''select diary_id, start, finish, etype, comment
-        from diary_entries where date(start) = ?
-        order by start'''
-
-        q_query.prepare(query)
-        q_query.addBindValue(self.date)
-
-        self._entries = []
-        q_query.exec_()
-        if q_query.lastError().isValid():
-            LOGGER.error("%s"% q_query.lastError().text())
-            LOGGER.debug("query was %s"% q_query.lastQuery())
-        while q_query.next():
-            record = q_query.record()
-            entry = DiaryAppointment(record)
-            self._entries.append(entry)
-        q_query.finish()
+        entries = query_entries(SETTINGS.psql_conn, self.date, self.date)
+        self.set_entries(entries.get(self.date.toPyDate(), []))
 
 if __name__ == "__main__":
     import logging
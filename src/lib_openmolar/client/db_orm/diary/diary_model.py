@@ -20,9 +20,35 @@
 ##                                                                           ##
 ###############################################################################
 
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
 from PyQt4 import QtCore, QtSql
+from lib_openmolar.client.db_orm.change_feed import ChangeFeed
 from diary_settings import _DiarySettings
-from diary_day_data import DiaryDayData
+from diary_day_data import DiaryDayData, query_sessions, query_entries
+
+#: the maximum number of DiaryDayData objects kept by the model
+#: (enough for a year view, and the weeks either side of it)
+MAX_DAYS = 800
+
+#: milliseconds to wait for further diary_changed notifications before
+#: reloading (a single change to the diary often notifies several times)
+NOTIFICATION_DELAY = 250
+
+HOLIDAYS_QUERY = '''select date_id, event from calendar
+where date_id >= ? and date_id <= ? order by date_id'''
+
+def fetch_days(database, first, last, entries=False):
+    '''
+    the sessions (and, optionally, the entries) for dates first to last.
+    runs in the query executor's thread.
+    '''
+    if entries:
+        return (query_sessions(database, first, last),
+            query_entries(database, first, last))
+    return query_sessions(database, first, last), None
 
 class DiaryDataModel(_DiarySettings):
     '''
@@ -30,7 +56,12 @@ class DiaryDataModel(_DiarySettings):
     and the database
     '''
     def __init__(self):
-        self._data = {}
+        #: DiaryDayData objects, least recently used first
+        self._data = OrderedDict()
+        #: julian days of the public holidays, sorted
+        self._holiday_days = array("l")
+        #: the text for each of _holiday_days
+        self._holiday_texts = []
         self._active_diaries = None
         #default values in case db isn't open
         self.start_date = QtCore.QDate.currentDate().addYears(-2)
@@ -39,6 +70,18 @@ class DiaryDataModel(_DiarySettings):
         ##TODO this should be user settable.
         self.last_day = QtCore.QDate.currentDate().addMonths(6)
 
+        #: views with a method "model_updated", called when data
+        #: arrives from the background
+        self.views = set([])
+        #: False if days should be loaded in the gui thread
+        self.load_in_background = True
+        self._pending = {}
+        self._load_scheduled = False
+        #: the :doc:`ChangeFeed` of diary_changes
+        self._changes = None
+        self._changes_scheduled = False
+        self._listening = False
+
     def __repr__(self):
         data_repr = ""
         #for key in self._data:
@@ -57,10 +100,90 @@ class DiaryDataModel(_DiarySettings):
             len(self.active_diaries),
             data_repr)
 
+    def add_view(self, view):
+        '''
+        make the model aware of the view so that it can be alerted when
+        data is loaded in the background.
+        such views require a method "model_updated"
+        '''
+        self.views.add(view)
+
+    def update_views(self):
+        for view in self.views:
+            view.model_updated()
+
     def load(self):
-        self._data = {}
+        self._data = OrderedDict()
+        self._pending = {}
         self.get_bounds()
+        self._changes = ChangeFeed(SETTINGS.psql_conn, "diary_changes",
+            ("first_date", "last_date"))
+        self._changes.start()
         self.init_data()
+        self.listen()
+
+    def listen(self):
+        '''
+        reload days when the database notifies that they have changed
+        '''
+        if self._listening:
+            return
+        signaller = getattr(SETTINGS.psql_conn, "signaller", None)
+        if signaller:
+            signaller.connect(self.receive_db_notification)
+            self._listening = True
+
+    def receive_db_notification(self, notification, payload=None):
+        if notification != "diary_changed":
+            return
+        if not self._changes_scheduled:
+            self._changes_scheduled = True
+            QtCore.QTimer.singleShot(NOTIFICATION_DELAY, self._apply_changes)
+
+    def _query_changes(self):
+        '''
+        the (first, last) python dates changed since the last call.
+        None in the list means the whole diary may have changed.
+        '''
+        if self._changes is None:
+            return [None]
+        records = self._changes.read()
+        if records is None:
+            # read from now on, if the table can be read
+            self._changes.start()
+            return [None]
+        changes = []
+        for record in records:
+            first = record.value("first_date").toDate()
+            last = record.value("last_date").toDate()
+            if not first.isValid():
+                changes.append(None)
+                continue
+            if not last.isValid() or last < first:
+                last = first
+            changes.append((first.toPyDate(), last.toPyDate()))
+        return changes
+
+    def _apply_changes(self):
+        '''
+        forget the days changed since the last call, and let the views
+        ask for them again.
+        '''
+        self._changes_scheduled = False
+        changes = self._query_changes()
+        if not changes:
+            return
+        if None in changes:
+            stale = self._data.keys()
+        else:
+            stale = [date for date in self._data
+                if any(first <= date <= last for first, last in changes)]
+        LOGGER.debug("diary changed - forgetting %d days"% len(stale))
+        for date in stale:
+            del self._data[date]
+            self._pending.pop(date, None)
+        if stale:
+            self.update_views()
 
     def get_bounds(self):
         '''
@@ -80,35 +203,40 @@ class DiaryDataModel(_DiarySettings):
 
     def init_data(self):
         '''
-        when called this initiates a dictionary of key value pairs
-        where keys are all dates between the start and end values
-        and the values are DayDataObjects with only public holiday data loaded
+        get the public holidays between the start and end dates.
+        DiaryDayData objects are only created when a date is asked for
+        (see :func:`data`)
         '''
         q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-
-        #due to database constraints, this list will be a
-        #set of key value pairs.
-        query = '''select dt, event
-        from (SELECT dt FROM generate_dates(?, ?, 1) dt) as gen
-        left join calendar on dt = date_id'''
-
-        q_query.prepare(query)
+        q_query.prepare(HOLIDAYS_QUERY)
         q_query.addBindValue(self.start_date)
         q_query.addBindValue(self.end_date)
         q_query.exec_()
+        if q_query.lastError().isValid():
+            LOGGER.error("%s"% q_query.lastError().text())
+
+        self._holiday_days = array("l")
+        self._holiday_texts = []
         while q_query.next():
             record = q_query.record()
-            day_data = DiaryDayData(record.value("dt").toDate())
-            day_data.set_public_hol_text(record.value("event").toString())
-            if QtCore.QDate.currentDate() <= day_data.date <= self.last_day:
-                day_data.in_bookable_range = True
-            ##QDate.__hash__ has a bug.. so have to convert here
-            ##this has been fixed in recent PyQt4..
-            ##there may be a perfomance benefit here
-            self._data[day_data.date.toPyDate()] = day_data
-
+            self._holiday_days.append(
+                record.value("date_id").toDate().toJulianDay())
+            self._holiday_texts.append(record.value("event").toString())
         q_query.finish()
 
+    def public_hol_text(self, date):
+        '''
+        the calendar event for date (or "")
+        '''
+        day = date.toJulianDay()
+        i = bisect_left(self._holiday_days, day)
+        if i < len(self._holiday_days) and self._holiday_days[i] == day:
+            return self._holiday_texts[i]
+        return ""
+
+    def in_bookable_range(self, date):
+        return QtCore.QDate.currentDate() <= date <= self.last_day
+
     @property
     def active_diaries(self):
         '''
@@ -128,76 +256,191 @@ class DiaryDataModel(_DiarySettings):
             self._active_diaries = tuple(active_diaries)
         return self._active_diaries
 
-    def rowCount(self, style):
-        if style in (self.DAY, self.WEEK, self.FOUR_DAY):
-            return 24
-        if style in (self.MONTH, self.FORTNIGHT): #1 week per row
-            i =0
-            start = self.start_date
-            while start < self.end_date:
-                start = start.addDays(7)
-                i += 1
-            return i
+    @property
+    def start_date(self):
+        return self._start_date
 
-        if style == self.YEAR: #return the number of months.
-            i = 0
-            start = self.start_date
-            while (
-                (start.year(), start.month()) <
-                (self.end_date.year(), self.end_date.month())
-            ):
-                i += 1
-                start = start.addMonths(1)
-            return i
+    @start_date.setter
+    def start_date(self, date):
+        self._start_date = date
+        self._start_day = date.toJulianDay()
+        self._row_counts = {}
+
+    @property
+    def end_date(self):
+        return self._end_date
 
-        return 100
+    @end_date.setter
+    def end_date(self, date):
+        self._end_date = date
+        self._row_counts = {}
+
+    def rowCount(self, style):
+        '''
+        the number of rows in the view of style (cached until the
+        start or end date changes)
+        '''
+        try:
+            return self._row_counts[style]
+        except KeyError:
+            pass
+        if style in (self.DAY, self.WEEK, self.FOUR_DAY):
+            count = 24
+        elif style in (self.MONTH, self.FORTNIGHT): #1 week per row
+            days = self.end_date.toJulianDay() - self._start_day
+            count = max(0, (days + 6) // 7)
+        elif style == self.YEAR: #return the number of months.
+            count = max(0,
+                (self.end_date.year() - self.start_date.year()) * 12 +
+                self.end_date.month() - self.start_date.month())
+        else:
+            count = 100
+        self._row_counts[style] = count
+        return count
 
     def row_from_date(self, date, style):
         '''
         returns the relative position of the date in the rows displayed
         '''
-        rowcount = self.rowCount(style)
         if style == self.YEAR:
             past_years = date.year() - self.start_date.year()
             return past_years*12 - self.start_date.month() + date.month()
         if style in (self.MONTH, self.FORTNIGHT):
-            i = 0
-            start = self.start_date
-            while start <= date:
-                start = start.addDays(7)
-                i += 1
-
+            days = date.toJulianDay() - self._start_day
+            i = days // 7 + 1 if days >= 0 else 0
             if style == self.MONTH:
                 i -= date.day()//7
-
             return i
         return 1
 
-    def data(self, date, view_style=_DiarySettings.DAY):
+    def _day_data(self, date):
         '''
-        returns a 'DayData' object for the date requested
+        the DiaryDayData for date, created if need be.
+        the least recently used are discarded when there are more than
+        MAX_DAYS.
         '''
-
         ##QDate.__hash__ has a bug.. so have to convert here
+        key = date.toPyDate()
         try:
-            day_data = self._data[date.toPyDate()]
-
+            day_data = self._data.pop(key)
         except KeyError:
             day_data = DiaryDayData(date)
-            self._data[date.toPyDate()] = day_data
+            day_data.set_public_hol_text(self.public_hol_text(date))
+            day_data.in_bookable_range = self.in_bookable_range(date)
+            if len(self._data) >= MAX_DAYS:
+                self._data.popitem(last=False)
+        self._data[key] = day_data
+        return day_data
+
+    def data(self, date, view_style=_DiarySettings.DAY):
+        '''
+        returns a 'DayData' object for the date requested
+        '''
+
+        day_data = self._day_data(date)
 
         if view_style != self.TASKS:
-            if not day_data.sessions_loaded:
+            if day_data.loading:
+                pass
+            elif self.load_in_background:
+                with_entries = view_style in (self.DAY, self.FOUR_DAY,
+                    self.WEEK) and day_data._entries is None
+                if with_entries or not day_data.sessions_loaded:
+                    self._request(day_data, with_entries)
+            elif not day_data.sessions_loaded:
                 day_data.load_sessions()
 
         return day_data
 
-    def new_data(self, d1t, dt2, diary_ids, view_style=0):
+    def _request(self, day_data, with_entries):
+        '''
+        queue day_data to be loaded in the background.
+        all days requested before control returns to the event loop
+        (ie. during one paint) are loaded by a single query.
+        '''
+        day_data.loading = True
+        self._pending[day_data.date.toPyDate()] = with_entries
+        if not self._load_scheduled:
+            self._load_scheduled = True
+            QtCore.QTimer.singleShot(0, self._load_pending)
+
+    def _load_pending(self):
+        self._load_scheduled = False
+        if not self._pending:
+            return
+        dates = sorted(self._pending.keys())
+        with_entries = True in self._pending.values()
+        self._pending = {}
+        # the objects, rather than the dates, are remembered so that days
+        # discarded (or reloaded) in the meantime are left alone.
+        days = [self._data[date] for date in dates if date in self._data]
+        if not days:
+            return
+        first, last = days[0].date, days[-1].date
+        LOGGER.debug("loading diary %s - %s in background"% (first, last))
+
+        future = SETTINGS.psql_conn.query_executor.submit(
+            fetch_days, first, last, with_entries)
+        future.add_callback(
+            lambda result: self._days_loaded(days, with_entries, result),
+            lambda exc: self._days_failed(days))
+
+    def _days_loaded(self, days, with_entries, result):
+        self._set_days(days, with_entries, *result)
+        self.update_views()
+
+    def _set_days(self, days, with_entries, sessions, entries):
+        '''
+        split the results of fetch_days between the DiaryDayData objects
+        days
+        '''
+        for day_data in days:
+            date = day_data.date.toPyDate()
+            day_data.set_sessions(sessions.get(date, []))
+            if with_entries:
+                day_data.set_entries(entries.get(date, []))
+            day_data.loading = False
+
+    def _days_failed(self, days):
+        LOGGER.warning("background diary load failed - loading in gui thread")
+        self.load_in_background = False
+        for day_data in days:
+            day_data.loading = False
+        self.update_views()
+
+    def load_range(self, first, last, with_entries=True):
+        '''
+        load the sessions (and optionally the entries) for QDates first to
+        last (inclusive) with one query per table.
+        days already loaded are not reloaded.
+        '''
+        days, date = [], first
+        while date <= last:
+            day_data = self._day_data(date)
+            if not (day_data.loading or (day_data.sessions_loaded and
+            (day_data._entries is not None or not with_entries))):
+                days.append(day_data)
+            date = date.addDays(1)
+        if not days:
+            return
+        sessions, entries = fetch_days(SETTINGS.psql_conn,
+            days[0].date, days[-1].date, with_entries)
+        self._set_days(days, with_entries, sessions, entries)
+
+    def new_data(self, d1, d2, diary_ids=None, view_style=0):
         '''
-        returns a 'DayData' objects for the date range requested
-        and specified diary ids
+        returns a list of 'DayData' objects for the date range requested,
+        loaded by a single query (rather than one query per day).
+        each DayData holds every diary, diary_ids is accepted for
+        compatibility only - use DayData.diaries to select.
         '''
-        return "NEW DATA"
+        self.load_range(d1, d2,
+            view_style in (self.DAY, self.FOUR_DAY, self.WEEK))
+        days, date = [], d1
+        while date <= d2:
+            days.append(self._day_data(date))
+            date = date.addDays(1)
+        return days
 
     def header_data(self, row, style=0):
         if style == self.YEAR:
@@ -222,10 +465,11 @@ if __name__ == "__main__":
     cc.connect()
 
     model = DiaryDataModel()
+    model.load_in_background = False
     model.load()
 
     today = QtCore.QDate.currentDate()
-    for i in range(7):
-        print model.data(today.addDays(i))
+    for day_data in model.new_data(today, today.addDays(6)):
+        print day_data
 
     #print (model)
@@ -0,0 +1,223 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2010-2012, Neil Wallace <neil@openmolar.com>                   ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+provides FreeSlot, a period of free time in a diary, and find_free_slots
+which gets them from the database (see get_free_slots in the schema) for
+a date range and set of diaries, in one query.
+find_joint_slots also gets the hygienists' slots on the same days.
+'''
+import datetime
+
+from PyQt4 import QtCore, QtSql
+
+#: the number of slots returned by a call to find_free_slots
+PAGE_SIZE = 50
+
+#: the wait returned by FreeSlot.best_joint if there is no joint slot
+#: (larger than any wait within a day)
+NO_JOINT_WAIT = 24 * 60
+
+SLOTS_QUERY = '''select diary_id, start, length
+from get_free_slots(?, ?, cast(? as integer[]), ?,
+    cast(? as integer[]), ?)
+order by start, diary_id limit ? offset ?'''
+
+HYGIENIST_DIARIES_QUERY = '''select diaries.ix from diaries
+join practitioners on diaries.user_id = practitioners.user_id
+where diaries.active and practitioners.type = 'hygienist'
+order by diaries.ix'''
+
+def _array(values):
+    '''
+    a postgres array literal for a sequence of integers
+    '''
+    return "{%s}"% ",".join([str(int(value)) for value in values])
+
+class FreeSlot(object):
+    '''
+    a period of free time in a diary.
+    slots sort by start, then diary.
+    '''
+    def __init__(self, date_time, diary_id, length):
+        #: a python datetime
+        self.date_time = date_time
+        #: the diary with the free time
+        self.diary_id = diary_id
+        #: length in minutes
+        self.length = length
+
+    def __repr__(self):
+        return "FreeSlot %s diary %s %d minutes"% (
+            self.date_time, self.diary_id, self.length)
+
+    def __cmp__(self, other):
+        return cmp((self.date_time, self.diary_id),
+            (other.date_time, other.diary_id))
+
+    @property
+    def dent(self):
+        '''
+        the clinician (diary) - the name used by DiaryScheduleController
+        '''
+        return self.diary_id
+
+    @property
+    def date(self):
+        return self.date_time.date()
+
+    @property
+    def day_no(self):
+        '''
+        day of the week, monday = 1
+        '''
+        return self.date_time.isoweekday()
+
+    @property
+    def mpm(self):
+        '''
+        minutes past midnight of the start
+        '''
+        return self.date_time.hour * 60 + self.date_time.minute
+
+    @property
+    def finish(self):
+        return self.date_time + datetime.timedelta(minutes=self.length)
+
+    def best_joint(self, length, hyg_length, hyg_slots):
+        '''
+        for an appointment of length minutes at the start of this slot,
+        find the slot in hyg_slots on the same day which allows an
+        appointment of hyg_length minutes to be closest to it
+        (immediately before or after is best).
+        returns (slot, wait in minutes), or (None, NO_JOINT_WAIT)
+        '''
+        hyg_length = hyg_length or 0
+        start = self.mpm
+        finish = start + length
+        best_slot, best_wait = None, NO_JOINT_WAIT
+        for slot in hyg_slots:
+            if slot.date != self.date or slot.length < hyg_length:
+                continue
+            slot_start = slot.mpm
+            slot_finish = slot_start + slot.length
+            # afterwards, as soon as possible
+            hyg_start = max(slot_start, finish)
+            if hyg_start + hyg_length <= slot_finish:
+                wait = hyg_start - finish
+                if wait < best_wait:
+                    best_slot, best_wait = slot, wait
+            # beforehand, as late as possible
+            hyg_start = min(slot_finish, start) - hyg_length
+            if hyg_start >= slot_start:
+                wait = start - (hyg_start + hyg_length)
+                if wait < best_wait:
+                    best_slot, best_wait = slot, wait
+        return best_slot, best_wait
+
+def find_free_slots(database, first, last, diary_ids, min_length=0,
+excluded_days=(), emergencies_free=False, page=0, page_size=PAGE_SIZE):
+    '''
+    the free slots (in office, without entries) of at least min_length
+    minutes for diary_ids between QDates first and last (inclusive),
+    omitting days of the week (monday = 1) in excluded_days.
+    returns page (counting from zero) of the slots, in order.
+
+    can be called from a worker thread, with that thread's database, eg.
+    SETTINGS.psql_conn.query_executor.submit(find_free_slots, first, ...)
+    '''
+    q_query = QtSql.QSqlQuery(database)
+    q_query.prepare(SLOTS_QUERY)
+    q_query.addBindValue(QtCore.QDateTime(first))
+    q_query.addBindValue(QtCore.QDateTime(last.addDays(1)))
+    q_query.addBindValue(_array(diary_ids))
+    q_query.addBindValue(min_length)
+    q_query.addBindValue(_array(excluded_days))
+    q_query.addBindValue(emergencies_free)
+    q_query.addBindValue(page_size)
+    q_query.addBindValue(page * page_size)
+
+    q_query.exec_()
+    if q_query.lastError().isValid():
+        LOGGER.error("%s"% q_query.lastError().text())
+        LOGGER.debug("query was %s"% q_query.lastQuery())
+    slots = []
+    while q_query.next():
+        slots.append(FreeSlot(q_query.value(1).toDateTime().toPyDateTime(),
+            q_query.value(0).toInt()[0], q_query.value(2).toInt()[0]))
+    q_query.finish()
+    return slots
+
+def hygienist_diaries(database):
+    '''
+    the ids of the active hygienists' diaries
+    '''
+    q_query = QtSql.QSqlQuery(database)
+    q_query.exec_(HYGIENIST_DIARIES_QUERY)
+    if q_query.lastError().isValid():
+        LOGGER.error("%s"% q_query.lastError().text())
+    diary_ids = []
+    while q_query.next():
+        diary_ids.append(q_query.value(0).toInt()[0])
+    return diary_ids
+
+def find_joint_slots(database, first, last, diary_ids, min_length=0,
+hyg_length=0, excluded_days=(), emergencies_free=False, page=0,
+page_size=PAGE_SIZE):
+    '''
+    as find_free_slots for diary_ids (the dentists), and every free slot
+    of at least hyg_length minutes in the hygienists' diaries on the days
+    of that page.
+    returns (dentist slots, hygienist slots)
+    (see DiaryScheduleController.set_joint_slots)
+    '''
+    dent_slots = find_free_slots(database, first, last, diary_ids,
+        min_length, excluded_days, emergencies_free, page, page_size)
+    hyg_ids = hygienist_diaries(database)
+    if not (dent_slots and hyg_ids):
+        return dent_slots, []
+
+    first = QtCore.QDate(dent_slots[0].date)
+    last = QtCore.QDate(dent_slots[-1].date)
+    hyg_slots, hyg_page = [], 0
+    while True:
+        slots = find_free_slots(database, first, last, hyg_ids,
+            hyg_length or 0, excluded_days, emergencies_free, hyg_page,
+            page_size)
+        hyg_slots += slots
+        if len(slots) < page_size:
+            break
+        hyg_page += 1
+    return dent_slots, hyg_slots
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level = logging.DEBUG)
+    LOGGER = logging.getLogger("test")
+
+    from lib_openmolar.client.connect import DemoClientConnection
+    cc = DemoClientConnection()
+    cc.connect()
+
+    today = QtCore.QDate.currentDate()
+    for slot in find_free_slots(cc, today, today.addDays(7), [1, 2], 15):
+        LOGGER.debug(slot)
@@ -36,9 +36,10 @@ a view aware editable model of data stored in various notes tables
     views = set([])
     '''The model keeps a note of what is watching it.'''
 
-    def __init__(self, patient_id):
-        self.clinical = NotesClinicalDB(patient_id)
-        self.clerical = NotesClericalDB(patient_id)
+    def __init__(self, patient_id, clinical_records=None,
+    clerical_records=None):
+        self.clinical = NotesClinicalDB(patient_id, clinical_records)
+        self.clerical = NotesClericalDB(patient_id, clerical_records)
 
         self.patient_id = patient_id
 
@@ -0,0 +1,292 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+This module provides the PatientLoader Class, which gets all the data
+needed by :doc:`PatientModel` in a single query.
+
+Each section of the record (patient, addresses, static_fills etc.) is the
+query used by the corresponding orm class, aggregated into a json array
+(requires postgres 9.3 or later).
+The json is converted back into QSqlRecords, so the orm classes can be
+filled exactly as if they had made the query themselves.
+'''
+
+import json
+import time
+
+from PyQt4 import QtCore, QtSql
+
+from lib_openmolar.client.async_query import QueryError
+from lib_openmolar.client.db_orm import (client_address,
+    client_contracted_practitioner, client_memo_clerical,
+    client_memo_clinical, client_notes_clerical, client_notes_clinical,
+    client_patient, client_perio_bpe, client_perio_pocketing,
+    client_static_comments, client_static_crowns, client_static_fills,
+    client_static_roots, client_teeth_present, client_telephone,
+    treatment_model)
+
+def _columns(tablename, *columns):
+    return tuple([(tablename, column) for column in columns])
+
+## (section, query, fields)
+## query has one placeholder (the patient id)
+## fields is either a tablename (for "select *" queries)
+## or a tuple of (tablename, column) in the order of the selected columns
+
+SECTIONS = (
+    ("patient", client_patient.QUERY, client_patient.TABLENAME),
+    ("addresses", client_address.QUERY, "view_addresses"),
+    ("telephone", client_telephone.QUERY,
+        _columns("telephone", "number", "sms_capable", "checked_date") +
+        _columns("telephone_link", "tel_cat")),
+    ("teeth_present", client_teeth_present.QUERY,
+        client_teeth_present.TABLENAME),
+    ("static_fills", client_static_fills.QUERY,
+        _columns(client_static_fills.TABLENAME,
+        "tooth", "surfaces", "material", "comment")),
+    ("static_crowns", client_static_crowns.QUERY,
+        _columns(client_static_crowns.TABLENAME,
+        "tooth", "type", "technition", "comment")),
+    ("static_roots", client_static_roots.QUERY,
+        _columns(client_static_roots.TABLENAME,
+        "tooth", "description", "comment")),
+    ("static_comments", client_static_comments.QUERY,
+        _columns(client_static_comments.TABLENAME, "tooth", "comment")),
+    ("memo_clinical", client_memo_clinical.QUERY,
+        client_memo_clinical.TABLENAME),
+    ("memo_clerical", client_memo_clerical.QUERY,
+        client_memo_clerical.TABLENAME),
+    ("treatments", treatment_model.QUERY,
+        _columns("treatments", "ix", "patient_id", "om_code") +
+        _columns("procedure_codes", "description") +
+        _columns("treatments", "completed", "comment", "px_clinician",
+        "tx_clinician", "tx_date", "added_by")),
+    ("treatment_metadata", treatment_model.PATIENT_METADATA_QUERY,
+        _columns("treatment_teeth", "treatment_id", "tooth", "tx_type") +
+        _columns("treatment_fills", "surfaces", "material") +
+        _columns("treatment_crowns", "type", "technition")),
+    ("notes_clinical", client_notes_clinical.QUERY,
+        client_notes_clinical.TABLENAME),
+    ("notes_clerical", client_notes_clerical.QUERY,
+        client_notes_clerical.TABLENAME),
+    ("perio_bpe", client_perio_bpe.QUERY,
+        _columns(client_perio_bpe.TABLENAME,
+        "checked_date", "values", "comment", "checked_by")),
+    ("perio_pocketing", client_perio_pocketing.QUERY,
+        _columns(client_perio_pocketing.TABLENAME,
+        "checked_date", "tooth", "values", "comment", "checked_by")),
+    ("contracted_practitioners", client_contracted_practitioner.QUERY,
+        _columns(client_contracted_practitioner.TABLENAME,
+        "ix", "practitioner_id", "contract_type", "start_date", "end_date",
+        "comments")),
+    )
+
+def _bulk_query():
+    '''
+    one query, returning a row (index, section, json) for each section
+    '''
+    selects = []
+    for i, (section, query, fields) in enumerate(SECTIONS):
+        selects.append(
+        "select %d as n, '%s' as section, "
+        "(select coalesce(json_agg(t), '[]') from (%s) t)::text as data"% (
+            i, section, query))
+    return "select section, data from (\n%s\n) sections order by n"% (
+        "\nunion all\n".join(selects))
+
+BULK_QUERY = _bulk_query()
+
+#: text of postgres errors which mean BULK_QUERY can't be run on this
+#: database at all (eg. json_agg does not exist before postgres 9.3)
+UNSUPPORTED_ERRORS = ("does not exist", "syntax error")
+
+class BulkQueryError(QueryError):
+    '''
+    raised by :func:`fetch` if BULK_QUERY fails.
+    unsupported is True if the database can't run the query
+    (rather than the query having failed this time).
+    '''
+    def __init__(self, message, unsupported=False):
+        QueryError.__init__(self, message)
+        self.unsupported = unsupported
+
+def _to_variant(value, field_type):
+    '''
+    convert a value parsed from json to a QVariant of field_type
+    '''
+    if value is None:
+        return QtCore.QVariant(field_type)
+    if field_type == QtCore.QVariant.Date:
+        return QtCore.QVariant(
+            QtCore.QDate.fromString(value[:10], QtCore.Qt.ISODate))
+    if field_type == QtCore.QVariant.DateTime:
+        return QtCore.QVariant(QtCore.QDateTime.fromString(
+            value.replace(" ", "T")[:19], QtCore.Qt.ISODate))
+    if field_type == QtCore.QVariant.Time:
+        return QtCore.QVariant(
+            QtCore.QTime.fromString(value[:8], QtCore.Qt.ISODate))
+    variant = QtCore.QVariant(value)
+    variant.convert(field_type)
+    return variant
+
+class PatientLoader(object):
+    '''
+    loads every section of a patient record in one round trip.
+    an instance is kept by the connection
+    (see ClientConnection.patient_loader)
+    '''
+    def __init__(self, connection):
+        self.connection = connection
+        self._templates = {}
+        self._generation = None
+
+        #: False if the database can't run the bulk query
+        #: (eg. postgres is too old)
+        self.available = True
+
+        #: a dictionary {section: seconds} for the last load
+        #: "query" is the time for the round trip.
+        self.timings = {}
+
+    def template(self, section, fields):
+        '''
+        a blank QSqlRecord with the fields (and field types) a section's
+        query would return
+        '''
+        cache = self.connection.schema_cache
+        cache.validate()
+        if cache.generation != self._generation:
+            self._templates = {}
+            self._generation = cache.generation
+        try:
+            return self._templates[section]
+        except KeyError:
+            pass
+        if isinstance(fields, str):
+            template = cache.record(fields)
+        else:
+            template = QtSql.QSqlRecord()
+            for tablename, column in fields:
+                template.append(cache.record(tablename).field(column))
+        template.clearValues()
+        self._templates[section] = template
+        return template
+
+    def _records(self, template, rows):
+        records = []
+        for row in rows:
+            record = QtSql.QSqlRecord(template)
+            for i in range(record.count()):
+                field = record.field(i)
+                name = unicode(field.name())
+                record.setValue(i, _to_variant(row.get(name), field.type()))
+            records.append(record)
+        return records
+
+    def load(self, patient_id, data=None):
+        '''
+        returns a dictionary {section: [QSqlRecord, ...]}
+        or None if the query failed (in which case the orm classes should
+        query for themselves).
+
+        data (optional) is the result of :func:`fetch` for this patient,
+        (eg. from the :doc:`PatientPrefetcher`), if given the database is
+        not queried.
+        '''
+        if not self.available:
+            return None
+        self.timings = {}
+        start = time.time()
+        if data is None:
+            try:
+                data = fetch(self.connection, patient_id)
+            except BulkQueryError as exc:
+                self.failed(exc)
+                return None
+            self.timings["query"] = time.time() - start
+        else:
+            self.timings["query"] = 0
+
+        sections = {}
+        for section, query, fields in SECTIONS:
+            section_start = time.time()
+            sections[section] = self._records(
+                self.template(section, fields), json.loads(data[section]))
+            self.timings[section] = time.time() - section_start
+
+        LOGGER.debug("patient %s loaded in %.3f seconds (query %.3f)"% (
+            patient_id, time.time() - start, self.timings["query"]))
+        return sections
+
+    def failed(self, exc):
+        '''
+        fetch raised exc.
+        the orm classes query for themselves this time, and from now on
+        if the database can't run the bulk query.
+        '''
+        if getattr(exc, "unsupported", False):
+            LOGGER.warning("bulk patient query unsupported - "
+                "falling back to a query per table")
+            self.available = False
+        else:
+            LOGGER.warning("falling back to a query per table")
+
+def fetch(connection, patient_id):
+    '''
+    run BULK_QUERY on connection (which must belong to the calling thread).
+    returns a dictionary {section: json text}.
+    raises a BulkQueryError if the query failed.
+    '''
+    q_query = QtSql.QSqlQuery(connection)
+    q_query.prepare(BULK_QUERY)
+    for section in SECTIONS:
+        q_query.addBindValue(patient_id)
+    if not q_query.exec_():
+        message = unicode(q_query.lastError().text())
+        LOGGER.warning("bulk patient query failed - %s"% message)
+        raise BulkQueryError(message, any(
+            [error in message for error in UNSUPPORTED_ERRORS]))
+
+    data = {}
+    while q_query.next():
+        data[unicode(q_query.value(0).toString())] = unicode(
+            q_query.value(1).toString())
+    return data
+
+def _test():
+    from lib_openmolar.client.connect import DemoClientConnection
+    cc = DemoClientConnection()
+    cc.connect()
+    loader = PatientLoader(cc)
+    for i in range(2):
+        sections = loader.load(1)
+    for section, query, fields in SECTIONS:
+        LOGGER.debug("%s - %d records in %.4f seconds"% (
+            section, len(sections[section]), loader.timings[section]))
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level = logging.DEBUG)
+    LOGGER = logging.getLogger("test")
+    import lib_openmolar.client
+    _test()
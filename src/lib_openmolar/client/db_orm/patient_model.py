@@ -40,26 +40,54 @@ The behaviour of this object is very much like a dictionary.
 
     _notes_summary_html = None
 
-    def __init__(self, patient_id):
-        self["patient"] = PatientDB(patient_id)
-        self["addresses"] = AddressObjects(patient_id)
-        self["telephone"] = TelephoneDB(patient_id)
-        self["teeth_present"] = TeethPresentDB(patient_id)
-        self["static_fills"] = StaticFillsDB(patient_id)
-        self["static_crowns"] = StaticCrownsDB(patient_id)
-        self["static_roots"] = StaticRootsDB(patient_id)
-        self["static_comments"] = StaticCommentsDB(patient_id)
-        self["memo_clinical"] = MemoClinicalDB(patient_id)
-        self["memo_clerical"] = MemoClericalDB(patient_id)
+    def __init__(self, patient_id, data=None):
+        '''
+        data (optional) is the result of patient_loader.fetch, already
+        retrieved (eg. in a worker thread) for this patient.
+        '''
+        loader = SETTINGS.psql_conn.patient_loader
+        if data is None:
+            data = SETTINGS.psql_conn.patient_prefetcher.take(patient_id)
+        sections = loader.load(patient_id, data)
+        if sections is None:
+            # each class will query the database for itself
+            sections = {}
+        records = sections.get
+
+        self["patient"] = PatientDB(patient_id, records("patient"))
+        self["addresses"] = AddressObjects(patient_id, records("addresses"))
+        self["telephone"] = TelephoneDB(patient_id, records("telephone"))
+        self["teeth_present"] = TeethPresentDB(patient_id,
+            records("teeth_present"))
+        self["static_fills"] = StaticFillsDB(patient_id,
+            records("static_fills"))
+        self["static_crowns"] = StaticCrownsDB(patient_id,
+            records("static_crowns"))
+        self["static_roots"] = StaticRootsDB(patient_id,
+            records("static_roots"))
+        self["static_comments"] = StaticCommentsDB(patient_id,
+            records("static_comments"))
+        self["memo_clinical"] = MemoClinicalDB(patient_id,
+            records("memo_clinical"))
+        self["memo_clerical"] = MemoClericalDB(patient_id,
+            records("memo_clerical"))
 
         self["treatment_model"] = SETTINGS.treatment_model
-        SETTINGS.treatment_model.load_patient(patient_id)
+        SETTINGS.treatment_model.load_patient(patient_id,
+            records("treatments"), records("treatment_metadata"))
 
-        self["notes_model"] = NotesModel(patient_id)
+        self["notes_model"] = NotesModel(patient_id,
+            records("notes_clinical"), records("notes_clerical"))
 
-        self["perio_bpe"] = PerioBpeDB(patient_id)
-        self["perio_pocketing"] = PerioPocketingDB(patient_id)
-        self["contracted_practitioners"] = ContractedPractitionerDB(patient_id)
+        self["perio_bpe"] = PerioBpeDB(patient_id, records("perio_bpe"))
+        self["perio_pocketing"] = PerioPocketingDB(patient_id,
+            records("perio_pocketing"))
+        self["contracted_practitioners"] = ContractedPractitionerDB(
+            patient_id, records("contracted_practitioners"))
+
+        #: seconds taken for each section of the last bulk load
+        #: (empty if the bulk query was not used)
+        self.load_timings = loader.timings if sections else {}
 
         self.patient_id = patient_id
 
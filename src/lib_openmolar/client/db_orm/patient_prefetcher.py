@@ -0,0 +1,324 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+This module provides the PatientPrefetcher Class, which loads the records
+of the next patients in today's appointment list in a background thread,
+so that :doc:`PatientModel` does not have to wait for the database when
+reception moves on to the next patient.
+'''
+
+from collections import OrderedDict
+
+from PyQt4 import QtCore, QtSql
+
+from lib_openmolar.client.async_query import AsyncQueryExecutor
+from lib_openmolar.client.db_orm.change_feed import ChangeFeed
+from lib_openmolar.client.db_orm import patient_loader
+
+#: the name of the worker thread's QSqlDatabase connection
+CONNECTION_NAME = "openmolar_prefetch"
+
+#: how many of the following patients are prefetched
+DEFAULT_COUNT = 3
+
+#: the maximum number of patients held
+MAX_ENTRIES = 20
+
+#: the maximum size (of json text) held, in bytes
+MAX_BYTES = 4 * 1024 * 1024
+
+DAY_QUERY = '''select start, patient_id from appointments
+join diary_entries on appointments.diary_entry_id = diary_entries.ix
+where start >= ? and start < ? order by start'''
+
+#: milliseconds to wait for further patient_changed notifications before
+#: reading the changes
+NOTIFICATION_DELAY = 250
+
+class PatientPrefetcher(QtCore.QObject):
+    '''
+    keeps the data (see patient_loader.fetch) for the next patients in
+    today's diary, least recently fetched are discarded first when
+    the limits are reached.
+
+    entries are discarded when the database notifies that the patient has
+    changed (the patients are read from table patient_changes),
+    and handed out only once (by :func:`take`), so that a record
+    reloaded later always comes from the database.
+    '''
+    def __init__(self, connection, count=DEFAULT_COUNT,
+    max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        QtCore.QObject.__init__(self)
+        #: the :doc:`ClientConnection` used by the gui
+        self.connection = connection
+        #: how many of the following patients are prefetched
+        self.count = count
+        #:
+        self.max_entries = max_entries
+        #:
+        self.max_bytes = max_bytes
+
+        #: set to False to stop prefetching
+        self.enabled = True
+
+        #: number of patients loaded from the cache
+        self.hits = 0
+        #: number of patients not found in the cache
+        self.misses = 0
+
+        self._cache = OrderedDict()
+        self._size = 0
+        self._pending = set()
+        self._stale = set()
+        self._day = None
+        self._day_patients = []
+        self._running = False
+        #: the :doc:`ChangeFeed` of patient_changes
+        self._changes = ChangeFeed(connection, "patient_changes",
+            ("patient_id",))
+        self._changes_scheduled = False
+        self.executor = AsyncQueryExecutor(connection, CONNECTION_NAME,
+            QtCore.QThread.LowPriority)
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        '''
+        listen for changes to patients
+        (the executor's thread is started by the first fetch)
+        '''
+        if self.is_running:
+            return
+        if self.connection.signaller:
+            self.connection.signaller.connect(self.receive_db_notification)
+        self._running = True
+        LOGGER.debug("patient prefetcher started")
+
+    def stop(self):
+        '''
+        stop the executor's thread, and forget everything
+        '''
+        if not self.is_running:
+            return
+        if self.connection.signaller:
+            try:
+                self.connection.signaller.notification_signal.disconnect(
+                    self.receive_db_notification)
+            except TypeError: # not connected
+                pass
+        self.executor.stop()
+        self._running = False
+        self.evict()
+        self._pending.clear()
+        self._stale.clear()
+        self._changes.stop()
+        LOGGER.debug("patient prefetcher stopped (%d hits, %d misses)"% (
+            self.hits, self.misses))
+
+    def take(self, patient_id):
+        '''
+        the prefetched data for patient_id (which is then forgotten)
+        or None
+        '''
+        if self._changes_scheduled:
+            self._apply_changes()
+        entry = self._cache.pop(patient_id, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        data, size = entry
+        self._size -= size
+        LOGGER.debug("patient %s was prefetched"% patient_id)
+        return data
+
+    def _load_day(self):
+        '''
+        get today's appointments (start time, patient_id) in order
+        '''
+        today = QtCore.QDate.currentDate()
+        if self._day == today:
+            return
+        self._day_patients = []
+        q_query = QtSql.QSqlQuery(self.connection)
+        q_query.prepare(DAY_QUERY)
+        q_query.addBindValue(QtCore.QDateTime(today))
+        q_query.addBindValue(QtCore.QDateTime(today.addDays(1)))
+        if not q_query.exec_():
+            LOGGER.warning("prefetcher couldn't get today's patients - %s"%
+                q_query.lastError().text())
+        while q_query.next():
+            self._day_patients.append((q_query.value(0).toDateTime(),
+                q_query.value(1).toInt()[0]))
+        self._day = today
+
+    def next_patients(self, patient_id):
+        '''
+        the ids of the patients after patient_id in today's appointments
+        (or after the current time, if patient_id has no appointment today)
+        '''
+        self._load_day()
+        ids = [id for start, id in self._day_patients]
+        if patient_id in ids:
+            i = ids.index(patient_id) + 1
+        else:
+            now = QtCore.QDateTime.currentDateTime()
+            i = 0
+            while i < len(ids) and self._day_patients[i][0] < now:
+                i += 1
+        following = []
+        for id in ids[i:]:
+            if id != patient_id and id not in following:
+                following.append(id)
+            if len(following) == self.count:
+                break
+        return following
+
+    def patient_loaded(self, patient_id):
+        '''
+        patient_id is now the current patient, prefetch those following.
+        '''
+        if not (self.enabled and self.connection.patient_loader.available):
+            return
+        self.start()
+        for id in self.next_patients(patient_id):
+            if id in self._cache or id in self._pending:
+                continue
+            if not self._changes.is_started:
+                self._changes.start()
+            self._pending.add(id)
+            future = self.executor.submit(patient_loader.fetch, id)
+            future.add_callback(
+                lambda data, id=id: self._fetched(id, data),
+                lambda exc, id=id: self._fetch_failed(id, exc))
+
+    def _fetched(self, patient_id, data):
+        self._pending.discard(patient_id)
+        if patient_id in self._stale:
+            # changed whilst being fetched
+            self._stale.discard(patient_id)
+            return
+        size = sum([len(text) for text in data.itervalues()])
+        if size > self.max_bytes:
+            return
+        self._cache[patient_id] = (data, size)
+        self._size += size
+        while (len(self._cache) > self.max_entries or
+        self._size > self.max_bytes):
+            id, (data, size) = self._cache.popitem(last=False)
+            self._size -= size
+
+    def _fetch_failed(self, patient_id, exc):
+        '''
+        the patient is not prefetched (the loader is told, as prefetching
+        stops altogether if the database can't run the bulk query)
+        '''
+        self._pending.discard(patient_id)
+        self._stale.discard(patient_id)
+        LOGGER.warning("prefetching patient %s failed"% patient_id)
+        self.connection.patient_loader.failed(exc)
+
+    def evict(self, patient_id=None):
+        '''
+        forget patient_id (or everything, if None)
+        '''
+        if patient_id is None:
+            self._cache.clear()
+            self._size = 0
+            self._stale.update(self._pending)
+            return
+        entry = self._cache.pop(patient_id, None)
+        if entry is not None:
+            self._size -= entry[1]
+        if patient_id in self._pending:
+            self._stale.add(patient_id)
+
+    def receive_db_notification(self, notification, payload=None):
+        if notification == "patient_changed":
+            if not self._changes_scheduled:
+                self._changes_scheduled = True
+                QtCore.QTimer.singleShot(NOTIFICATION_DELAY,
+                    self._apply_changes)
+        elif notification == "appointments_changed":
+            self._day = None
+
+    def _query_changes(self):
+        '''
+        the ids of the patients changed since the last call.
+        None in the list means any patient may have changed.
+        '''
+        records = self._changes.read()
+        if records is None:
+            return [None]
+        changes = []
+        for record in records:
+            if record.isNull("patient_id"):
+                changes.append(None)
+            else:
+                changes.append(record.value("patient_id").toInt()[0])
+        return changes
+
+    def _apply_changes(self):
+        '''
+        forget the patients changed since the last call.
+        '''
+        if not self._changes_scheduled:
+            return
+        self._changes_scheduled = False
+        if not (self._cache or self._pending):
+            # nothing to forget, start reading afresh at the next fetch.
+            self._changes.stop()
+            return
+        changes = self._query_changes()
+        if None in changes:
+            self.evict()
+            self._changes.stop()
+            return
+        for patient_id in set(changes):
+            self.evict(patient_id)
+
+def _test():
+    from lib_openmolar.client.connect import DemoClientConnection
+    app = QtCore.QCoreApplication([])
+    cc = DemoClientConnection()
+    cc.connect()
+    prefetcher = PatientPrefetcher(cc)
+    prefetcher._day_patients = [(QtCore.QDateTime.currentDateTime(), id)
+        for id in range(1, 6)]
+    prefetcher._day = QtCore.QDate.currentDate()
+    prefetcher.patient_loaded(1)
+    QtCore.QTimer.singleShot(2000, app.quit)
+    app.exec_()
+    for id in range(1, 6):
+        LOGGER.debug("patient %d prefetched - %s"% (
+            id, prefetcher.take(id) is not None))
+    prefetcher.stop()
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level = logging.DEBUG)
+    LOGGER = logging.getLogger("test")
+    import lib_openmolar.client
+    _test()
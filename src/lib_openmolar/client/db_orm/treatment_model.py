@@ -30,11 +30,20 @@ from PyQt4 import QtCore, QtSql
 from lib_openmolar.common.datatypes import OMType
 from lib_openmolar.common.db_orm import InsertableRecord
 from lib_openmolar.common.db_orm import TreatmentItem
+from lib_openmolar.common.db_orm.treatment_item import (
+    PATIENT_METADATA_QUERY, group_metadata_records)
 
 from lib_openmolar.client.qt4.widgets import ChartDataModel
 from lib_openmolar.client.qt4.widgets import ToothData
 from lib_openmolar.client.qt4.widgets import TreatmentTreeModel
 
+## long query - only time will tell if this is a performance hit
+QUERY = '''select
+treatments.ix, patient_id, om_code, description,
+completed, comment, px_clinician, tx_clinician, tx_date, added_by
+from treatments
+left join procedure_codes on procedure_codes.code = treatments.om_code
+where patient_id = ?'''
 
 class TreatmentModel(object):
     class ItemError(Exception):
@@ -55,15 +64,21 @@ class TreatmentModel(object):
         self._treatment_items = []
         self._deleted_items = []
 
-    def load_patient(self, patient_id):
+        # {id(treatment_item): (chartmodel, [ToothData, ...])}
+        self._chart_data = {}
+
+    def load_patient(self, patient_id, records=None, metadata_records=None):
         '''
         :param patient_id: integer
+        :param records: (optional) the result of :attr:`QUERY`
+        :param metadata_records: (optional) the result of
+            PATIENT_METADATA_QUERY
         '''
         #:
         self.patient_id = patient_id
 
         self.clear()
-        self.get_records()
+        self.get_records(records, metadata_records)
 
     def clear(self):
         '''
@@ -72,36 +87,48 @@ class TreatmentModel(object):
         LOGGER.debug("clearing treatment_model")
         self._treatment_items = []
         self._deleted_items = []
+        self._chart_data = {}
         self.plan_tx_chartmodel.clear()
         self.cmp_tx_chartmodel.clear()
         self.tree_model.update_treatments()
 
-    def get_records(self):
+    def _query(self, query):
+        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
+        q_query.prepare(query)
+        q_query.addBindValue(self.patient_id)
+        q_query.exec_()
+        records = []
+        while q_query.next():
+            records.append(q_query.record())
+        return records
+
+    def get_records(self, records=None, metadata_records=None):
         '''
         pulls all treatment items in the database
         (for the patient with the id specified during load_patient function)
-        '''
-        ## long query - only time will tell if this is a performance hit
+        unless the result of :attr:`QUERY` is passed as records
 
+        the metadata for all items is retrieved in one query
+        (rather than one per item), and the chart models are built
+        once all items are added.
+        '''
         if not self.patient_id:
             return
 
-        query =  '''select
-treatments.ix, patient_id, om_code, description,
-completed, comment, px_clinician, tx_clinician, tx_date, added_by
-from treatments
-left join procedure_codes on procedure_codes.code = treatments.om_code
-where patient_id = ?'''
-
-        q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
-        q_query.addBindValue(self.patient_id)
-        q_query.exec_()
-        while q_query.next():
-            record = q_query.record()
+        if records is None:
+            records = self._query(QUERY)
+        if metadata_records is None:
+            metadata_records = self._query(PATIENT_METADATA_QUERY)
+        metadata = group_metadata_records(metadata_records)
 
+        for record in records:
             treatment_item = TreatmentItem(record)
-            self.add_treatment_item(treatment_item)
+            treatment_item.set_metadata_records(
+                metadata.get(treatment_item.id.toInt()[0], []))
+            self.add_treatment_item(treatment_item, update_views=False)
+
+        self.update_chart_models()
+        self.tree_model.update_treatments()
 
     @property
     def treatment_items(self):
@@ -129,19 +156,23 @@ where patient_id = ?'''
             dirty = dirty or not treatment_item.in_database
         return dirty
 
-    def add_treatment_item(self, treatment_item):
+    def add_treatment_item(self, treatment_item, update_views=True):
         '''
         add a :doc:`TreatmentItem` Object
         returns True if the TreatmentItem is valid, else False
+
+        if update_views is False, the chart and tree models are not updated
+        (the caller should call :func:`update_chart_models` when done).
         '''
         LOGGER.debug("adding treatment item to Treatment Model")
         if treatment_item.is_valid:
             self._treatment_items.append(treatment_item)
 
-            if treatment_item.is_chartable:
-                self.add_to_chart_model(treatment_item)
+            if update_views:
+                if treatment_item.is_chartable:
+                    self.add_to_chart_model(treatment_item)
 
-            self.tree_model.update_treatments()
+                self.tree_model.update_treatments()
             return True
 
         LOGGER.error(treatment_item.errors)
@@ -162,12 +193,30 @@ where patient_id = ?'''
         else:
             chartmodel = self.plan_tx_chartmodel
 
+        tooth_data_list = []
+        chartmodel.begin_update()
         for data in treatment_item.metadata:
             tooth_data = ToothData(data.tooth)
             tooth_data.from_treatment_item_metadata(data)
 
             chartmodel.add_property(tooth_data)
-        chartmodel.endResetModel()
+            tooth_data_list.append(tooth_data)
+        chartmodel.end_update()
+        self._chart_data[id(treatment_item)] = (chartmodel, tooth_data_list)
+
+    def remove_from_chart_model(self, treatment_item):
+        '''
+        remove the representation of treatment_item from the charts page.
+        '''
+        try:
+            chartmodel, tooth_data_list = self._chart_data.pop(
+                id(treatment_item))
+        except KeyError:
+            return
+        chartmodel.begin_update()
+        for tooth_data in tooth_data_list:
+            chartmodel.remove_property(tooth_data)
+        chartmodel.end_update()
 
     def remove_treatment_item(self, treatment_item):
         '''
@@ -176,8 +225,7 @@ where patient_id = ?'''
         self._treatment_items.remove(treatment_item)
         self._deleted_items.append(treatment_item)
 
-        if treatment_item.is_chartable:
-            self.update_chart_models()
+        self.remove_from_chart_model(treatment_item)
 
         self.tree_model.update_treatments()
 
@@ -198,7 +246,9 @@ where patient_id = ?'''
             return False
 
         if treatment_item.is_chartable:
-            self.update_chart_models()
+            # move the item's teeth to the other chart
+            self.remove_from_chart_model(treatment_item)
+            self.add_to_chart_model(treatment_item)
 
         self.tree_model.update_treatments()
         return True
@@ -206,24 +256,20 @@ where patient_id = ?'''
     def update_chart_models(self):
         '''
         completely reloads the chart models.
+        views are notified once per model.
         '''
+        self.cmp_tx_chartmodel.begin_update()
+        self.plan_tx_chartmodel.begin_update()
+        self._chart_data = {}
         self.cmp_tx_chartmodel.clear()
         self.plan_tx_chartmodel.clear()
 
         for treatment_item in self.treatment_items:
-            if treatment_item.is_completed:
-                chartmodel = self.cmp_tx_chartmodel
-            else:
-                chartmodel = self.plan_tx_chartmodel
-
-            for data in treatment_item.metadata:
-                tooth_data = ToothData(data.tooth)
-                tooth_data.from_treatment_item_metadata(data)
-
-                chartmodel.add_property(tooth_data)
+            if treatment_item.is_chartable:
+                self.add_to_chart_model(treatment_item)
 
-        self.cmp_tx_chartmodel.endResetModel()
-        self.plan_tx_chartmodel.endResetModel()
+        self.cmp_tx_chartmodel.end_update()
+        self.plan_tx_chartmodel.end_update()
 
     def update_views(self):
         '''
@@ -70,6 +70,8 @@ class FindPatientDialog(ExtendableDialog):
         self.add_advanced_widget(self.enable_soundex_checkbox)
 
         self._has_completers = False
+        #: the QueryFuture of the search in progress (or None)
+        self._search = None
         self._connect_signals()
         self.search_values = {}
 
@@ -128,10 +130,11 @@ class FindPatientDialog(ExtendableDialog):
             self.pcde_le.text() != "" or
             self.telephone_le.text() != "")
 
-        self.enableApply(enable)
+        self.enableApply(enable and self._search is None)
         self.repeat_button.setVisible(self.search_values != {})
 
     def exec_(self):
+        self.cancel_search()
         self.clear()
         if not self._has_completers:
             self.populate_completers()
@@ -152,6 +155,15 @@ class FindPatientDialog(ExtendableDialog):
     def apply(self):
         self._analyse()
 
+    def cancel_search(self):
+        '''
+        forget the search in progress (if any), its results are ignored.
+        '''
+        if self._search is not None:
+            self._search.cancel()
+            self._search = None
+            self._check()
+
     def _emit_result(self, val):
         self.emit(QtCore.SIGNAL("Load Serial Number"), val)
 
@@ -166,21 +178,46 @@ class FindPatientDialog(ExtendableDialog):
         self.search_values["soundex_sname"] = self.sname_le.isChecked()
         self.search_values["soundex_fname"] = self.fname_le.isChecked()
 
+        self.cancel_search()
         patient_id, result = sname.toInt()
         if result and patient_id > 0:
             self._emit_result(patient_id)
         else:
-            matches = SETTINGS.psql_conn.get_matchlist(self.search_values)
+            future = SETTINGS.psql_conn.get_matchlist_async(self.search_values)
+            self._search = future
+            self.enableApply(False)
+            future.add_callback(
+                lambda matches: self._matches_found(future, matches),
+                lambda exc: self._search_failed(future))
+
+    def _search_failed(self, future):
+        '''
+        the search failed (the connection has already reported the error)
+        '''
+        if future is self._search:
+            self._search = None
+            self._check()
 
-            if matches == []:
-                self.Advise(_("no match found"), 1)
+    def _matches_found(self, future, matches):
+        '''
+        the (asynchronous) search has returned
+        results of searches which have been superseded or cancelled
+        are ignored.
+        '''
+        if future is not self._search:
+            LOGGER.debug("ignoring stale patient search results")
+            return
+        self._search = None
+        self._check()
+        if matches == []:
+            self.Advise(_("no match found"), 1)
+        else:
+            if len(matches) > 1:
+                sno = self.final_choice(matches)
+                if sno != None:
+                    self._emit_result(sno)
             else:
-                if len(matches) > 1:
-                    sno = self.final_choice(matches)
-                    if sno != None:
-                        self._emit_result(sno)
-                else:
-                    self._emit_result(matches[0].patient_id)
+                self._emit_result(matches[0].patient_id)
 
     def final_choice(self, matches):
         dl = FinalSelectionDialog(matches, self.parent())
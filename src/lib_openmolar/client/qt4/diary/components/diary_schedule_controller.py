@@ -27,6 +27,9 @@ from openmolar.qt4gui.appointment_gui_modules.draggable_list \
 from openmolar.qt4gui.appointment_gui_modules.list_models \
     import SimpleListModel, BlockListModel
 
+from lib_openmolar.client.db_orm.diary import (find_free_slots,
+    find_joint_slots)
+from lib_openmolar.client.db_orm.diary.free_slots import PAGE_SIZE
 from lib_openmolar.client.qt4.dialogs import FindPatientDialog
 
 from lib_openmolar.client.qt4.pt_diary_widget import PtDiaryWidget
@@ -64,6 +67,20 @@ class DiaryScheduleController(QtGui.QStackedWidget):
 
     use_last_slot = False
 
+    #: the QueryFuture of the slot search in progress (or None)
+    _search = None
+    #: (first, last, page) of the last slot search
+    _search_range = None
+    #: True if the last search filled a page (so there may be more slots)
+    _more_slots = False
+
+    #: the number of days searched at a time
+    search_days = 7
+    #: the search gives up this many days after the first day searched
+    max_search_days = 365
+    #: the first day searched
+    _search_start = None
+
     pt_diary_widget = None
 
     def __init__(self, parent=None):
@@ -257,6 +274,7 @@ class DiaryScheduleController(QtGui.QStackedWidget):
         self.appt_listView.setCurrentIndex(index)
 
     def update_selected_appointment(self, appt):
+        self.cancel_search()
         self.available_slots = []
         self._chosen_slot = None
         self.enable_scheduling_buttons()
@@ -277,6 +295,7 @@ class DiaryScheduleController(QtGui.QStackedWidget):
         self.reset()
 
     def reset(self):
+        self.cancel_search()
         self.available_slots = []
         self.hygienist_slots = []
         self._chosen_slot = None
@@ -284,10 +303,13 @@ class DiaryScheduleController(QtGui.QStackedWidget):
 
     def show_first_appt(self):
         '''
-        resets the chosen slot and emits show_first_appointment signal
+        resets the chosen slot and emits show_first_appointment signal,
+        then searches for slots after the patient's last appointment
         '''
         self._chosen_slot = None
         self.show_first_appointment.emit()
+        first = QtCore.QDate(self.last_appt_date)
+        self.search_slots(first, first.addDays(self.search_days - 1))
 
     @property
     def _chosen_slot_no(self):
@@ -302,7 +324,11 @@ class DiaryScheduleController(QtGui.QStackedWidget):
             self.chosen_slot_changed.emit()
         except IndexError:
             self._chosen_slot = None
-            self.move_on.emit(True)
+            if self._more_slots:
+                first, last, page = self._search_range
+                self._search_slots(first, last, page + 1)
+            else:
+                self.move_on.emit(True)
 
     def show_prev_appt(self):
         try:
@@ -315,6 +341,84 @@ class DiaryScheduleController(QtGui.QStackedWidget):
             self._chosen_slot = None
             self.move_on.emit(False)
 
+    @property
+    def searching(self):
+        '''
+        True whilst a slot search is running
+        '''
+        return self._search is not None
+
+    def search_slots(self, first, last, page=0):
+        '''
+        if an unscheduled appointment is selected (see is_searching),
+        search (in the background) the diaries of the selected clinicians
+        between QDates first and last for slots long enough for it.
+        when finding_joint_appointments, the hygienists' diaries are
+        searched too, and the slots passed to set_joint_slots,
+        otherwise to set_available_slots.
+
+        if none are found (see search_again) the following pages, then
+        periods of search_days are searched, for up to max_search_days.
+        chosen_slot_changed is emitted when slots are found, or move_on(True)
+        if the search gives up.
+        any search still running is abandoned.
+        '''
+        self._search_start = first
+        self._search_slots(first, last, page)
+
+    def _search_slots(self, first, last, page):
+        self.cancel_search()
+        if not (self.is_searching and self.selectedClinicians):
+            return
+        executor = SETTINGS.psql_conn.query_executor
+        if self.finding_joint_appointments:
+            future = executor.submit(find_joint_slots, first, last,
+                self.selectedClinicians, self.min_slot_length,
+                self.min_hyg_slot_length, self.excluded_days,
+                self.ignore_emergency_spaces, page)
+            callback = lambda result: self._slots_found(
+                self.set_joint_slots, *result)
+        else:
+            future = executor.submit(find_free_slots, first, last,
+                self.selectedClinicians, self.min_slot_length,
+                self.excluded_days, self.ignore_emergency_spaces, page)
+            callback = lambda slots: self._slots_found(
+                self.set_available_slots, slots)
+        future.add_callback(callback, self._search_failed)
+        self._search = future
+        self._search_range = (first, last, page)
+
+    def cancel_search(self):
+        '''
+        abandon the slot search in progress (its results are ignored)
+        '''
+        if self._search is not None:
+            self._search.cancel()
+            self._search = None
+
+    def _slots_found(self, set_slots, slots, *hyg_slots):
+        self._search = None
+        self._more_slots = len(slots) == PAGE_SIZE
+        self._chosen_slot = None
+        set_slots(slots, *hyg_slots)
+        if not self.search_again:
+            self.chosen_slot_changed.emit()
+            return
+        first, last, page = self._search_range
+        if self._more_slots:
+            self._search_slots(first, last, page + 1)
+            return
+        if self._search_start.daysTo(last) < self.max_search_days:
+            first = last.addDays(1)
+            self._search_slots(first, first.addDays(self.search_days - 1), 0)
+            return
+        self.move_on.emit(True)
+
+    def _search_failed(self, exc):
+        LOGGER.warning("slot search failed - %s"% exc)
+        self._search = None
+        self._more_slots = False
+
     def set_available_slots(self, slots):
         self.available_slots = []
         self.hygienist_slots = []
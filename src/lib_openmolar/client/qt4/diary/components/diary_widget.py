@@ -62,8 +62,15 @@ class DiaryWidget(QtGui.QWidget, _DiarySettings):
 
     def setModel(self, model):
         self.model =  model
+        self.model.add_view(self)
         self.canvas.setModel(model)
 
+    def model_updated(self):
+        '''
+        called by the model when data has been loaded in the background
+        '''
+        self.canvas.update()
+
     def connect_scrollbars(self, connect=True):
         if connect:
             self.vscroll_bar.valueChanged.connect(self.vscroll)
@@ -33,6 +33,7 @@ from pages import *
 from lib_openmolar.client.qt4 import dialogs
 
 from lib_openmolar.client import db_orm
+from lib_openmolar.client.db_orm import patient_loader
 
 class PatientInterface(QtGui.QWidget):
     '''
@@ -44,6 +45,9 @@ class PatientInterface(QtGui.QWidget):
 
         self._proc_code_dock_widget = None #initialise if needed.
 
+        #: the id of the patient being fetched in the background (if any)
+        self._loading_id = None
+
         self.control_panel = ControlPanel(self)
         '''a pointer to the :doc:`ControlPanel`'''
 
@@ -402,6 +406,7 @@ class PatientInterface(QtGui.QWidget):
         if not self.ok_to_leave_record():
             return
 
+        self._loading_id = None
         self.clear()
 
     def reload_patient(self):
@@ -443,12 +448,55 @@ class PatientInterface(QtGui.QWidget):
         '''
         load patient with id patient_id
         if optional 2nd arg is passed, this means don't alter the history list
+
+        unless the record has been prefetched, it is fetched in a worker
+        thread, and the gui updated when the data arrives.
         '''
         if not self.ok_to_leave_record():
             return
+        if self._find_dialog is not None:
+            # the user has moved on from any search still running
+            self._find_dialog.cancel_search()
         self.clear()
 
         self.Advise(u"%s<br />%d"% (_("Loading Record Number"), patient_id))
+
+        connection = SETTINGS.psql_conn
+        data = connection.patient_prefetcher.take(patient_id)
+        if data is not None or not connection.patient_loader.available:
+            self._patient_fetched(patient_id, called_via_history, data)
+            return
+
+        QtGui.QApplication.instance().setOverrideCursor(QtCore.Qt.BusyCursor)
+        self._loading_id = patient_id
+        future = connection.query_executor.submit(
+            patient_loader.fetch, patient_id)
+        future.add_callback(
+            lambda data: self._patient_fetched(
+                patient_id, called_via_history, data, True),
+            lambda exc: self._patient_fetch_failed(
+                patient_id, called_via_history, exc))
+
+    def _patient_fetch_failed(self, patient_id, called_via_history, exc):
+        '''
+        the background fetch failed, the record is loaded in the gui thread
+        '''
+        SETTINGS.psql_conn.patient_loader.failed(exc)
+        self._patient_fetched(patient_id, called_via_history, None, True)
+
+    def _patient_fetched(self, patient_id, called_via_history, data,
+    in_background=False):
+        '''
+        the data for patient_id is available (or None, in which case
+        the orm classes query for themselves)
+        '''
+        if in_background:
+            QtGui.QApplication.instance().restoreOverrideCursor()
+            if patient_id != self._loading_id:
+                LOGGER.debug("ignoring stale data for patient %s"% patient_id)
+                return
+            self._loading_id = None
+
         QtGui.QApplication.instance().setOverrideCursor(QtCore.Qt.WaitCursor)
 
         if __name__ == "__main__":
@@ -457,9 +505,10 @@ class PatientInterface(QtGui.QWidget):
             exception_ = Exception
 
         try:
-            self.pt = db_orm.PatientModel(patient_id)
+            self.pt = db_orm.PatientModel(patient_id, data)
             self._load_patient()
             self.emit(QtCore.SIGNAL("Patient Loaded"), self.pt)
+            SETTINGS.psql_conn.patient_prefetcher.patient_loaded(patient_id)
             if not called_via_history:
                 self.load_history.append(patient_id)
                 self.history_pos = len(self.load_history) - 1
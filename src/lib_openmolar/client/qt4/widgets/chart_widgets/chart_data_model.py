@@ -49,6 +49,19 @@ class ChartDataModel(object):
         this model changes
         '''
 
+        # the objects in self.data, indexed by tooth_id
+        self._teeth = {}
+        # {tooth_id: {type: [ToothData, ...]}}
+        self._types = {}
+        # {tooth_id: [fillings and crowns in the order added]}
+        self._restorations = {}
+        # the objects in self.perio_data, indexed by tooth_id
+        self._perio = {}
+
+        self._update_depth = 0
+        self._changed_teeth = set()
+        self._reset_pending = False
+
     def register_view(self, widget):
         '''
         register all widgets which are attached to this model, so that
@@ -56,17 +69,51 @@ class ChartDataModel(object):
 
         .. note::
             widgets registered this way must have a method model_changed()
+            and may have a method teeth_changed(tooth_ids), which is called
+            (instead of model_changed) when only some teeth have altered.
 
         '''
         self.views.append(widget)
 
+    def begin_update(self):
+        '''
+        start a batch of changes.
+        views are notified once, when the matching :func:`end_update` is
+        called. (calls may be nested)
+        '''
+        self._update_depth += 1
+
+    def end_update(self):
+        '''
+        end a batch of changes started by :func:`begin_update`
+        '''
+        self._update_depth -= 1
+        self._notify()
+
+    def _notify(self):
+        if self._update_depth > 0:
+            return
+        if self._reset_pending:
+            self._reset_pending = False
+            self._changed_teeth = set()
+            for view in self.views:
+                view.model_changed()
+        elif self._changed_teeth:
+            tooth_ids, self._changed_teeth = self._changed_teeth, set()
+            for view in self.views:
+                teeth_changed = getattr(view, "teeth_changed", None)
+                if teeth_changed is None:
+                    view.model_changed()
+                else:
+                    teeth_changed(tooth_ids)
+
     def endResetModel(self):
         '''
         call this function after altering the data if you need to inform
         registered views of the change
         '''
-        for view in self.views:
-            view.model_changed()
+        self._reset_pending = True
+        self._notify()
 
     def has_properties(self, tooth_id):
         '''
@@ -74,17 +121,55 @@ class ChartDataModel(object):
 
         returns True if this model has data for tooth with this id
         '''
-        try:
-            self.get_properties(tooth_id).next()
-        except StopIteration:
-            return False
-        return True
+        return tooth_id in self._teeth
+
+    def _index_tooth(self, tooth_id):
+        '''
+        rebuild the indexes for a tooth after its properties have altered.
+        '''
+        props = self._teeth.get(tooth_id)
+        if not props:
+            self._teeth.pop(tooth_id, None)
+            self._types.pop(tooth_id, None)
+            self._restorations.pop(tooth_id, None)
+            return
+        types = {}
+        restorations = []
+        for prop in props:
+            types.setdefault(prop.type, []).append(prop)
+            if prop.type in (prop.FILLING, prop.CROWN):
+                restorations.append(prop)
+        self._types[tooth_id] = types
+        self._restorations[tooth_id] = restorations
 
     def add_property(self, tooth_data):
         '''
         add a :doc:`ToothData` object to this model
         '''
         self.data.append(tooth_data)
+        self._teeth.setdefault(tooth_data.tooth_id, []).append(tooth_data)
+        self.property_changed(tooth_data)
+
+    def remove_property(self, tooth_data):
+        '''
+        remove a :doc:`ToothData` object from this model
+        '''
+        for props in (self.data, self._teeth.get(tooth_data.tooth_id, [])):
+            for i, prop in enumerate(props):
+                if prop is tooth_data:
+                    props.pop(i)
+                    break
+        self.property_changed(tooth_data)
+
+    def property_changed(self, tooth_data):
+        '''
+        call this when a :doc:`ToothData` object in the model has altered.
+        views showing the tooth are refreshed (at once, or at the end of the
+        current batch, see :func:`begin_update`).
+        '''
+        self._index_tooth(tooth_data.tooth_id)
+        self._changed_teeth.add(tooth_data.tooth_id)
+        self._notify()
 
     def clear(self):
         '''
@@ -92,6 +177,10 @@ class ChartDataModel(object):
         '''
         self.perio_data = []
         self.data = []
+        self._teeth = {}
+        self._types = {}
+        self._restorations = {}
+        self._perio = {}
         self.endResetModel()
 
     def get_properties(self, tooth_id):
@@ -100,9 +189,19 @@ class ChartDataModel(object):
 
         a generator returning all :doc:`ToothData` objects for this tooth
         '''
-        for prop in self.data:
-            if prop.tooth_id == tooth_id:
-                yield prop
+        for prop in self._teeth.get(tooth_id, ()):
+            yield prop
+
+    def get_properties_of_type(self, tooth_id, type_):
+        '''
+        :param: tooth_id (int)
+        :param: type_ (ToothData.FILLING, CROWN, ROOT or COMMENT)
+
+        a generator returning the :doc:`ToothData` objects of type_
+        for this tooth
+        '''
+        for prop in self._types.get(tooth_id, {}).get(type_, ()):
+            yield prop
 
     def get_restorations(self, tooth_id):
         '''
@@ -111,9 +210,8 @@ class ChartDataModel(object):
         a generator returning all :doc:`ToothData` objects of
         type Filling or Crown for this tooth
         '''
-        for prop in self.get_properties(tooth_id):
-            if prop.type in (prop.FILLING, prop.CROWN):
-                yield prop
+        for prop in self._restorations.get(tooth_id, ()):
+            yield prop
 
     def get_root_info(self, tooth_id):
         '''
@@ -122,9 +220,7 @@ class ChartDataModel(object):
         a generator returning all :doc:`ToothData` objects of
         type Root for this tooth
         '''
-        for prop in self.get_properties(tooth_id):
-            if prop.type == prop.ROOT:
-                yield prop
+        return self.get_properties_of_type(tooth_id, tooth_data.ToothData.ROOT)
 
     def get_new_fillings(self):
         '''
@@ -168,9 +264,8 @@ class ChartDataModel(object):
 
         a generator returning all :doc:`PerioData` for this tooth
         '''
-        for prop in self.perio_data:
-            if prop.tooth_id == tooth_id:
-                yield prop
+        for prop in self._perio.get(tooth_id, ()):
+            yield prop
 
     def add_perio_property(self, prop):
         '''
@@ -179,6 +274,7 @@ class ChartDataModel(object):
         add a perio data object to the model
         '''
         self.perio_data.append(prop)
+        self._perio.setdefault(prop.tooth_id, []).append(prop)
 
 
 
@@ -258,6 +354,7 @@ class ChartDataModel(object):
             self.add_property(prop)
 
     def add_data(self, data_list):
+        self.begin_update()
         for record, data_type in data_list:
             if data_type == 'fill':
                 self.add_fill(record)
@@ -269,6 +366,7 @@ class ChartDataModel(object):
                 self.add_comment(record)
             else:
                 print "chart - add_data - unknown data type", record
+        self.end_update()
 
     def add_perio_records(self, records):
         '''
@@ -288,6 +386,7 @@ class ChartDataModel(object):
 
     def load_test_data(self):
         from random import randint
+        self.begin_update()
         #- two ways to add a filling
         self.add_fill_from_string(5, "MO,AM")
 
@@ -304,6 +403,7 @@ class ChartDataModel(object):
         self.add_perio_data(20, perio_data.PerioData.POCKETING, (5,8,6,4,5,6))
         self.add_perio_data(21, perio_data.PerioData.POCKETING, (3,6,4,4,5,6))
         self.add_perio_data(22, perio_data.PerioData.POCKETING, (1,4,2,4,5,6))
+        self.end_update()
 
     def __repr__(self):
         message = "ChartDataModel for views %s"%self.views
@@ -121,6 +121,19 @@ class ChartWidgetBase(QtGui.QWidget):
         self.resizeEvent() # <- faciliates the graphics loading of fillings.
         self.update()
 
+    def teeth_changed(self, tooth_ids):
+        '''
+        called when the model's data for some teeth only has altered.
+        only those teeth are redrawn.
+        '''
+        for tooth_id in tooth_ids:
+            tooth = self.teeth.get(tooth_id)
+            if tooth is None:
+                continue
+            tooth.fill_shapes_current = False
+            self.update(
+                tooth.select_rect(True).toAlignedRect().adjusted(-2,-2,2,2))
+
     def setStyle(self, enum):
         if enum == self.CHART_STYLE_DECIDUOUS:
             self.deciduous_style()
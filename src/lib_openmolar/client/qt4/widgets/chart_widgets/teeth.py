@@ -101,7 +101,6 @@ class ChartTooth(Tooth):
         convience method to add data to the underlying model
         '''
         self.data_model.add_property(prop)
-        self.data_model.endResetModel()
 
     def set_rect(self, rect):
         '''
@@ -295,8 +294,10 @@ class ChartTooth(Tooth):
 
     def init_restoration_shapes(self):
         # check to see whether this LONG procedure is necessary
+        # (set_rect, and changes to the model's data for this tooth,
+        # mark the shapes as out of date)
         if self.fill_shapes_current:
-            pass
+            return
         self.fill_shapes = []
         self.crowns = []
         for prop in self.restorations:
@@ -21,14 +21,48 @@
 ###############################################################################
 
 
+from contextlib import contextmanager
+import errno
+import httplib
 import os
 import pickle
+import select
 import socket
+import ssl
+import time
 import xmlrpclib
 
 from lib_openmolar.common.datatypes import Connection230Data
 from lib_openmolar.common.connect import ProxyUser
 
+# note - unpickling payloads has always required lib_openmolar.server
+from lib_openmolar.server.misc import payload_codec
+
+#: seconds allowed for the server to answer the ping made on connecting
+CONNECT_TIMEOUT = 1
+
+#: seconds allowed for the server to answer any other call
+CALL_TIMEOUT = 100
+
+#: errors meaning that the server closed an idle connection before
+#: reading the request (which can safely be sent again)
+IDLE_CLOSED_ERRNOS = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+
+def _idle_closed(exc):
+    '''
+    True if exc (raised by a request on a reused connection) means that the
+    server had closed the connection before the request was sent.
+    '''
+    if isinstance(exc, httplib.BadStatusLine):
+        return True
+    if isinstance(exc, ssl.SSLError):
+        # the server closed the socket without a tls shutdown
+        return (exc.errno in (ssl.SSL_ERROR_EOF, ssl.SSL_ERROR_ZERO_RETURN)
+            or "unexpected eof" in str(exc).lower())
+    if isinstance(exc, socket.timeout):
+        return False
+    return getattr(exc, "errno", None) in IDLE_CLOSED_ERRNOS
+
 class _ConnectionError(Exception):
     '''
     a custom Exception - becomes a property of :doc:`ProxyClient`
@@ -51,6 +85,117 @@ class DuckPayload(object):
     payload = None
     error_message = "No connection"
 
+class BatchResult(object):
+    '''
+    a placeholder for the result of a call made within
+    :doc:`ProxyClient` .batch().
+    the result is available once the batch has been sent.
+    '''
+    _payload = None
+
+    def __init__(self, proxy_client, func, args):
+        self.proxy_client = proxy_client
+        self.func = func
+        self.args = args
+
+    def __repr__(self):
+        return "BatchResult for %s%s"% (self.func, self.args)
+
+    def _set_payload(self, payload):
+        self._payload = payload
+
+    @property
+    def result(self):
+        '''
+        the :doc:`PayLoad` returned by the server
+        (raises the same errors as ProxyClient.call would)
+        '''
+        if self._payload is None:
+            raise ValueError("%s has not been sent"% self)
+        return self.proxy_client._check_payload(self._payload)
+
+    @property
+    def payload(self):
+        '''
+        equivalent to result.payload
+        '''
+        return self.result.payload
+
+class Batch(object):
+    '''
+    collects calls made within :doc:`ProxyClient` .batch()
+    '''
+    def __init__(self, proxy_client):
+        self.proxy_client = proxy_client
+        self.results = []
+
+    def call(self, func, *args):
+        '''
+        queue a call to a server function.
+        returns a :doc:`BatchResult`
+        '''
+        result = BatchResult(self.proxy_client, func, args)
+        self.results.append(result)
+        return result
+
+class CodecTransport(xmlrpclib.SafeTransport):
+    '''
+    an xmlrpclib.SafeTransport which tells the server that this client
+    understands the binary payload_codec.
+
+    The transport holds a single https connection, which is reused for all
+    requests as long as the server keeps it alive (HTTP/1.1).
+    Its socket has an explicit timeout (not the global default).
+    '''
+    def __init__(self, timeout=CALL_TIMEOUT, *args, **kwargs):
+        xmlrpclib.SafeTransport.__init__(self, *args, **kwargs)
+        self.timeout = timeout
+
+    def set_timeout(self, timeout):
+        '''
+        change the timeout, for the open connection too.
+        '''
+        self.timeout = timeout
+        connection = self._connection[1]
+        if connection is not None:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+
+    def make_connection(self, host):
+        connection = xmlrpclib.SafeTransport.make_connection(self, host)
+        connection.timeout = self.timeout
+        return connection
+
+    def request(self, host, handler, request_body, verbose=0):
+        '''
+        as xmlrpclib.Transport.request, but the request is sent again only
+        if a connection which has been used before turns out to have been
+        closed by the server whilst idle.
+        never after a timeout, or on a new connection, as the server may
+        have acted on the request.
+        '''
+        connection = self._connection[1]
+        reused = (connection is not None and self._connection[0] == host
+            and connection.sock is not None)
+        if reused and select.select([connection.sock], [], [], 0)[0]:
+            # an idle connection has nothing to read unless the server
+            # has closed it.
+            self.close()
+            reused = False
+        try:
+            return self.single_request(host, handler, request_body, verbose)
+        except (socket.error, httplib.HTTPException) as exc:
+            if not (reused and _idle_closed(exc)):
+                raise
+        LOGGER.debug("idle connection closed by OMServer - sending again")
+        return self.single_request(host, handler, request_body, verbose)
+
+    def send_user_agent(self, connection):
+        xmlrpclib.SafeTransport.send_user_agent(self, connection)
+        connection.putheader(payload_codec.CODEC_HEADER,
+            payload_codec.CODEC_NAME)
+
 class ProxyClient(object):
     '''
     This class provides functionality for communicating with the 230 server.
@@ -58,6 +203,11 @@ class ProxyClient(object):
     '''
     _server = None
     _is_connecting = False
+    _last_success = 0
+
+    #: after a successful call, the connection is assumed to be alive
+    #: for this many seconds (so no ping is needed)
+    liveness_interval = 10
     #:
     PermissionError = _PermissionError
 
@@ -89,7 +239,7 @@ class ProxyClient(object):
             "user must be of type ProxyUser"
         #LOGGER.debug("setting proxyclient user to %s"% user)
         self.user = user
-        self._server = None
+        self.disconnect()
         self._is_connecting = False
 
     def use_default_user(self):
@@ -101,7 +251,7 @@ class ProxyClient(object):
         attempt to connect to xmlrpc_server, and return this object
         raise a ConnectionError if no success.
         '''
-        self._server = None
+        self.disconnect()
         if not self.connection230_data.is_valid:
             raise self.ConnectionError(
             "connection data is invalid - check your conf files")
@@ -126,11 +276,14 @@ class ProxyClient(object):
 
         self._is_connecting = True
         try:
-            _server = xmlrpclib.ServerProxy(location)
-            socket.setdefaulttimeout(1)
+            transport = CodecTransport(CONNECT_TIMEOUT)
+            _server = xmlrpclib.ServerProxy(location, transport=transport)
             _server.ping()
+            # the connection is kept for later calls, which may be slow
+            transport.set_timeout(CALL_TIMEOUT)
             LOGGER.debug("connected to OMServer as user '%s'"% self.user.name)
             self._server = _server
+            self._last_success = time.time()
         except xmlrpclib.ProtocolError:
             message = u"%s '%s'"% (_("connection refused for user"),
                 self.user.name)
@@ -151,7 +304,6 @@ class ProxyClient(object):
             raise self.ConnectionError(message)
 
         finally:
-            socket.setdefaulttimeout(100)
             self._is_connecting = False
 
     @property
@@ -165,17 +317,38 @@ class ProxyClient(object):
             self.connect()
         return self._server
 
+    def disconnect(self):
+        '''
+        close the (persistent) connection to the server, if any.
+        '''
+        if self._server is not None:
+            try:
+                self._server("close")()
+            except Exception:
+                pass
+        self._server = None
+        self._last_success = 0
+
     @property
     def is_connected(self):
         '''
         A boolean value stating whether the client is connected
         (to a proxy server)
+        the server is only pinged if there has been no successful call
+        in the last liveness_interval seconds.
         '''
+        if self._server is None:
+            return False
+        if time.time() - self._last_success < self.liveness_interval:
+            return True
         try:
-            return (self._server is not None and self.server.ping())
+            if self._server.ping():
+                self._last_success = time.time()
+                return True
         except Exception:
-            self._server = None
-            return False
+            pass
+        self.disconnect()
+        return False
     @property
     def is_connecting(self):
         '''
@@ -234,6 +407,14 @@ class ProxyClient(object):
         payload = self.call("pre_execution_warning", func_name)
         return payload.payload
 
+    def _no_connection_payload(self):
+        duck_payload = DuckPayload()
+        duck_payload.error_message = "%s '%s':'%d'?"% (
+            _("Unable to connect to"),
+            self.connection230_data.host,
+            self.connection230_data.port)
+        return duck_payload
+
     def call(self, func, *args):
         '''
         a wrapper to call server functions.
@@ -244,28 +425,121 @@ class ProxyClient(object):
         :doc:`PayLoad`
         (or a DuckType thereof)
         '''
+        return self._check_payload(self._call(func, *args))
+
+    def _call(self, func, *args):
+        '''
+        call the server function, and return the decoded payload
+        (without checking permission or exceptions)
+        '''
         if not self.is_connected:
-            duck_payload = DuckPayload()
-            duck_payload.error_message = "%s '%s':'%d'?"% (
-                _("Unable to connect to"),
-                self.connection230_data.host,
-                self.connection230_data.port)
-            return duck_payload
+            return self._no_connection_payload()
 
+        # a request is never sent again here (CodecTransport resends only
+        # when that is safe), as the server may already have acted on it.
         try:
-            pickled_payload = getattr(self.server, func).__call__(*args)
-            return self._unpickle(pickled_payload)
+            pickled_payload = getattr(self._server, func).__call__(*args)
+            self._last_success = time.time()
         except xmlrpclib.Fault:
             LOGGER.exception("xmlrpc error")
             return DuckPayload()
+        except (socket.error, httplib.HTTPException):
+            LOGGER.exception("connection to OMServer lost")
+            # the next call pings (on a new connection) before it is sent
+            self._last_success = 0
+            return self._no_connection_payload()
+
+        return self._decode(pickled_payload)
 
-    def _unpickle(self, pickled_payload):
+    @contextmanager
+    def batch(self):
         '''
-        XMLRPC can not pass python objects, so they are pickled by the server
-        and unpickled here.
+        a context manager which collects calls, and sends them to the server
+        in one request.
+
+        usage
+        with proxy_client.batch() as batch:
+            roles = batch.call("login_roles")
+            functions = batch.call("management_functions")
+        print roles.payload, functions.payload
         '''
-        payload = pickle.loads(pickled_payload)
+        batch = Batch(self)
+        yield batch
+        self.send_batch(batch)
 
+    def send_batch(self, batch):
+        '''
+        send the calls collected by a :doc:`Batch`
+        if the server does not provide multicall, calls are made one by one.
+        '''
+        if not batch.results:
+            return
+        calls = [(result.func, result.args) for result in batch.results]
+        outer = self._call("multicall", calls)
+
+        if isinstance(outer, DuckPayload):
+            payloads = [outer] * len(calls)
+        elif isinstance(outer.exception, AttributeError):
+            LOGGER.info("server has no multicall - sending calls one by one")
+            payloads = [self._call(func, *args) for func, args in calls]
+        else:
+            payloads = self._check_payload(outer).payload
+
+        for result, payload in zip(batch.results, payloads):
+            result._set_payload(payload)
+
+    def run_job(self, func, *args, **kwargs):
+        '''
+        run a long server function (eg. backup_db) as a background job,
+        polling the server until it finishes.
+
+        keyword arguments
+            callback - called with the job status dictionary at each poll
+                       (new log lines only are in status["log"])
+            poll_interval - seconds between polls (default 0.5)
+
+        returns an object of type :doc:`PayLoad` (as for call).
+        if the server cannot run func as a job, it is called directly.
+        '''
+        callback = kwargs.get("callback")
+        poll_interval = kwargs.get("poll_interval", 0.5)
+
+        outer = self._call("start_job", func, *args)
+        if isinstance(outer, DuckPayload):
+            return self._check_payload(outer)
+        if isinstance(outer.exception, (AttributeError, ValueError)):
+            # old server, or a function which is not run as a job
+            LOGGER.debug("calling %s directly - %s"% (func, outer.exception))
+            return self.call(func, *args)
+        job_id = self._check_payload(outer).payload
+
+        log_from = 0
+        while True:
+            status = self.call("job_status", job_id, log_from).payload
+            if status is None:
+                return self._no_connection_payload()
+            log_from = status["log_count"]
+            if callback is not None:
+                callback(status)
+            if status["state"] == "finished":
+                return self._check_payload(status["payload"])
+            time.sleep(poll_interval)
+
+    def _decode(self, pickled_payload):
+        '''
+        XMLRPC can not pass python objects, so they are encoded by the server
+        and decoded here.
+        Servers which understand payload_codec return xmlrpclib.Binary,
+        older servers return a pickle.
+        '''
+        if isinstance(pickled_payload, xmlrpclib.Binary):
+            return payload_codec.decode(pickled_payload.data)
+        return pickle.loads(pickled_payload)
+
+    def _check_payload(self, payload):
+        '''
+        raise PermissionError (or the server side exception) if appropriate
+        '''
         if not payload.permission:
             raise self.PermissionError
         if payload.exception:
@@ -33,7 +33,32 @@ specific tooth on a specific patient.
 
 import re
 
+def parse_tooth_range(data):
+    '''
+    returns a list of ints which have been specified in the xml
+    in this way <tooth_range>18..33</tooth_range>
+    '''
+    if data is None:
+        return
+    data = data.strip()
+    m = re.match("(\d+)\.\.(\d+)$", data)
+    if m:
+        start, finish = m.groups()
+        return range(int(start), int(finish)+1)
+
+    m = re.match("(\d+)*", data)
+    if m:
+        range_ = []
+        for tooth in m.groups():
+            range_.append(int(tooth))
+        return range_
+
 class ProcCode(object):
+    '''
+    a procedure code, as parsed from om2_codes.xml.
+    values only, (no reference is kept to the xml) so that these objects
+    can be restored from the cache kept by :doc:`ProcedureCodes`
+    '''
     #:
     SIMPLE = 0
     #:
@@ -53,19 +78,61 @@ class ProcCode(object):
     #:
     OTHER = 8
 
-    def __init__(self, element, category):
+    #: the values of the type attribute in the xml
+    TYPES = {
+        "simple": SIMPLE,
+        "tooth": TOOTH,
+        "teeth": TEETH,
+        "root": ROOT,
+        "fill": FILL,
+        "crown": CROWN,
+        "prosthetics": PROSTHETICS,
+        "bridge": BRIDGE,
+        }
+
+    __slots__ = ("category", "cat_no", "code", "description", "type",
+        "tx_type", "_requirements", "no_surfaces", "no_pontics",
+        "_pontic_range", "_span")
+
+    def __init__(self, category, cat_no, code, description, type_name,
+    tx_type=None, requirements=(), no_surfaces=None, no_pontics=None,
+    pontic_range=None, span=None):
         #:
         self.category = category
+        #: the (1 based) index of the category
+        self.cat_no = cat_no
+        #:
+        self.code = code
+        #:
+        self.description = description
+
+        #: one of SIMPLE, TOOTH etc..
+        self.type = self.TYPES.get(type_name)
+        if self.type is None:
+            print "WARNING - illegal proc-code type", type_name
 
-        self.element = element
+        #:
+        self.tx_type = tx_type
+        self._requirements = tuple(requirements)
+        #: a string, (eg "1", "2+") "0" if surfaces are not required
+        self.no_surfaces = no_surfaces or "0"
+        #: a string, (eg "1+") "0" if pontics are not required
+        self.no_pontics = no_pontics or "0"
+        self._pontic_range = pontic_range
+        self._span = span
+
+    @property
+    def values(self):
         '''
-        A pointer to the minidom element which holds the info about this code
+        the arguments to recreate this object
         '''
-
-        self._category = None
-        self._type = None
-        self._description = None
-        self._code = None
+        type_name = None
+        for key, value in self.TYPES.iteritems():
+            if value == self.type:
+                type_name = key
+        return (self.category, self.cat_no, self.code, self.description,
+            type_name, self.tx_type, list(self._requirements),
+            self.no_surfaces, self.no_pontics, self._pontic_range, self._span)
 
     @property
     def is_chartable(self):
@@ -78,46 +145,6 @@ class ProcCode(object):
         '''
         return self.type in (self.FILL, self.CROWN, self.ROOT)
 
-    @property
-    def type(self):
-        if self._type is None:
-            type = self.element.attributes["type"].value
-            if type == "simple":
-                self._type = self.SIMPLE
-            elif type == "tooth":
-                self._type = self.TOOTH
-            elif type == "teeth":
-                self._type = self.TEETH
-            elif type == "root":
-                self._type = self.ROOT
-            elif type == "fill":
-                self._type = self.FILL
-            elif type == "crown":
-                self._type = self.CROWN
-            elif type == "prosthetics":
-                self._type = self.PROSTHETICS
-            elif type == "bridge":
-                self._type = self.BRIDGE
-            else:
-                print "WARNING - illegal proc-code type", type
-
-        return self._type
-
-    @property
-    def code(self):
-        if self._code is None:
-            self._code = self.element.getElementsByTagName(
-                "id")[0].childNodes[0].data
-        return self._code
-
-    @property
-    def description(self):
-        if self._description is None:
-            self._description = self.element.getElementsByTagName(
-                "description")[0].childNodes[0].data
-
-        return self._description
-
     @property
     def is_fill(self):
         return self.type == self.FILL
@@ -148,13 +175,6 @@ class ProcCode(object):
     def is_prosthetics(self):
         return self.type == self.PROSTHETICS
 
-    @property
-    def tx_type(self):
-        nodes =  self.element.getElementsByTagName("tx_type")
-        if nodes == []:
-            return None
-        return nodes[0].childNodes[0].data.strip()
-
     @property
     def comment_required(self):
         '''
@@ -170,10 +190,7 @@ class ProcCode(object):
         the xml config sheet can speculate what is needed to create a valid
         :doc:`TreatmentItem` from this code
         '''
-        require_nodes = self.element.getElementsByTagName("ti_requires")
-        if require_nodes == []:
-            return []
-        return require_nodes[0].childNodes[0].data.strip().split(",")
+        return list(self._requirements)
 
     @property
     def tooth_required(self):
@@ -189,81 +206,25 @@ class ProcCode(object):
     def multi_tooth(self):
         return self.no_pontics != "0"
 
-    def range_from_node(self, node):
-        '''
-        returns a list of ints which have been specified in the xml
-        in this way <tooth_range>18..33</tooth_range>
-        '''
-        ranges = node.getElementsByTagName("tooth_range")
-        if ranges == []:
-            return
-        data = ranges[0].childNodes[0].data.strip()
-        m = re.match("(\d+)\.\.(\d+)$", data)
-        if m:
-            start, finish = m.groups()
-            return range(int(start), int(finish)+1)
-
-        m = re.match("(\d+)*", data)
-        if m:
-            range_ = []
-            for tooth in m.groups():
-                range_.append(int(tooth))
-            return range_
-
     @property
     def surfaces_required(self):
         return self.no_surfaces != "0"
 
-    @property
-    def _surface_node(self):
-        surface_nodes = self.element.getElementsByTagName("surfaces")
-        if surface_nodes != []:
-            return surface_nodes[0]
-
-    @property
-    def no_surfaces(self):
-        surf_node = self._surface_node
-        if surf_node is None:
-            return "0"
-        return surf_node.attributes["n"].value
-
     @property
     def pontics_required(self):
         return self.no_pontics != "0"
 
-    @property
-    def _pontics_node(self):
-        pontics_nodes = self.element.getElementsByTagName("pontics")
-        if pontics_nodes != []:
-            return pontics_nodes[0]
-
-    @property
-    def no_pontics(self):
-        pontics_node = self._pontics_node
-        if pontics_node is None:
-            return "0"
-        return pontics_node.attributes["n"].value
-
     @property
     def allowed_pontics(self):
         '''
         a list of teeth which can be replaced with this procedure
         (eg upper teeth only for a P/-)
         '''
-        pontics_node = self._pontics_node
-        if pontics_node:
-            range_ =  self.range_from_node(pontics_node)
-            if range_ is not None:
-                return range_
+        if self._pontic_range is not None:
+            return self._pontic_range
 
         return SETTINGS.all_teeth
 
-    @property
-    def _span_node(self):
-        span_nodes = self.element.getElementsByTagName("span")
-        if span_nodes != []:
-            return span_nodes[0]
-
     @property
     def total_span(self):
         '''
@@ -271,10 +232,9 @@ class ProcCode(object):
         this is a string, so as to allow values like "3+"
         '''
         if self.is_bridge:
-            span_node = self._span_node
-            if span_node is None:
+            if self._span is None:
                 return "0"
-            return span_node.attributes["n"].value
+            return self._span
 
     @property
     def material(self):
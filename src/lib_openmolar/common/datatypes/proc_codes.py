@@ -31,12 +31,190 @@ this only becomes a treatment item, when it is planned or performed on a
 specific tooth on a specific patient.
 '''
 
-from xml.dom import minidom
+import hashlib
+import json
+import os
 import re
+from cStringIO import StringIO
+from xml.etree import cElementTree
 
 from lib_openmolar.common.qt4 import qrc_resources
 from PyQt4 import QtCore
-from proc_code import ProcCode
+from proc_code import ProcCode, parse_tooth_range
+
+RESOURCE = ":proc_codes/om2_codes.xml"
+
+#: the parsed codes are kept in this file (in SETTINGS.LOCALFOLDER),
+#: keyed by a hash of the resource
+CACHE_FILENAME = "proc_codes.cache"
+
+#: the folder used if SETTINGS has not been installed
+#: (the default LOCALFOLDER of lib_openmolar.common.settings)
+DEFAULT_CACHE_FOLDER = os.path.join(os.environ.get("HOME", ""), ".openmolar2")
+
+#: increment if the format of the cache (or ProcCode.values) changes
+CACHE_VERSION = 1
+
+#: category numbers (ProcCode.cat_no) used by the dialogs
+EXAM_CATEGORY = 1
+XRAY_CATEGORY = 2
+HYG_CATEGORY = 3
+CROWN_CATEGORY = 6
+
+#: python's re module allows at most 100 groups per pattern
+MAX_GROUPS = 90
+
+def _non_capturing(pattern):
+    '''
+    convert any capturing groups in pattern to non-capturing ones,
+    so that the pattern can be part of a larger alternation.
+    '''
+    result, i, in_class = [], 0, False
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            result.append(pattern[i:i+2])
+            i += 2
+            continue
+        if in_class:
+            if char == "]":
+                in_class = False
+        elif char == "[":
+            in_class = True
+        elif char == "(" and not pattern.startswith("?", i+1):
+            char = "(?:"
+        result.append(char)
+        i += 1
+    return "".join(result)
+
+def _combined_regexes(shortcuts):
+    '''
+    shortcuts is a list of (regex pattern, code).
+    returns a list of (compiled regex, codes), where each regex is an
+    alternation of (at most MAX_GROUPS) patterns, each in a group, so
+    that match.lastindex identifies the pattern which matched.
+    the patterns are tried in the order given.
+    '''
+    combined = []
+    for start in range(0, len(shortcuts), MAX_GROUPS):
+        chunk = shortcuts[start:start + MAX_GROUPS]
+        regex = re.compile("|".join(["(%s)"% _non_capturing(pattern)
+            for pattern, code in chunk]))
+        combined.append((regex, tuple([code for pattern, code in chunk])))
+    return combined
+
+def _child_text(element, tag):
+    node = element.find(tag)
+    if node is None:
+        return None
+    return node.text
+
+def _child_attribute(element, tag, attribute="n"):
+    node = element.find(tag)
+    if node is None:
+        return None
+    return node.get(attribute)
+
+def parse_codes(xml_string):
+    '''
+    parse the procedure codes xml (in a single pass, without building
+    a document tree).
+    returns (categories, codes, shortcuts) where codes is a list of
+    ProcCode.values and shortcuts a list of (regex pattern, code)
+    '''
+    categories, codes, shortcuts = [], [], []
+    cat, cat_no = None, 0
+    for event, element in cElementTree.iterparse(StringIO(xml_string),
+    events=("start", "end")):
+        if event == "start":
+            if element.tag == "Category":
+                cat = element.get("name").strip()
+                if cat not in categories:
+                    categories.append(cat)
+                cat_no = categories.index(cat) + 1
+            continue
+        if element.tag != "Code":
+            continue
+        code = _child_text(element, "id")
+        requirements = _child_text(element, "ti_requires")
+        tx_type = _child_text(element, "tx_type")
+        codes.append((cat, cat_no, code,
+            _child_text(element, "description"),
+            element.get("type"),
+            tx_type.strip() if tx_type else None,
+            requirements.strip().split(",") if requirements else [],
+            _child_attribute(element, "surfaces"),
+            _child_attribute(element, "pontics"),
+            parse_tooth_range(_child_text(element, "pontics/tooth_range")),
+            _child_attribute(element, "span")))
+        for shortcut in element.findall("shortcut"):
+            shortcuts.append((shortcut.text, code))
+        element.clear()
+    return categories, codes, shortcuts
+
+def cache_file():
+    '''
+    the path of the cache, in SETTINGS.LOCALFOLDER
+    (or DEFAULT_CACHE_FOLDER if SETTINGS is not installed yet)
+    '''
+    try:
+        folder = SETTINGS.LOCALFOLDER
+    except NameError:
+        folder = DEFAULT_CACHE_FOLDER
+    return os.path.join(folder, CACHE_FILENAME)
+
+def _read_cache(digest):
+    try:
+        f = open(cache_file())
+        try:
+            cache = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return None
+    if (cache.get("version") != CACHE_VERSION or
+    cache.get("hash") != digest):
+        return None
+    return cache["categories"], cache["codes"], cache["shortcuts"]
+
+def _write_cache(digest, parsed):
+    categories, codes, shortcuts = parsed
+    path = cache_file()
+    temp_file = "%s.%d"% (path, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        f = open(temp_file, "w")
+        try:
+            json.dump({"version": CACHE_VERSION, "hash": digest,
+                "categories": categories, "codes": codes,
+                "shortcuts": shortcuts}, f)
+        finally:
+            f.close()
+        os.rename(temp_file, path)
+    except (IOError, OSError) as exc:
+        LOGGER.warning("unable to write %s - %s"% (path, exc))
+
+def load_codes(use_cache=True):
+    '''
+    the (categories, codes, shortcuts) from the procedure codes resource,
+    from the cache if the resource has not changed since it was written.
+    '''
+    f = QtCore.QFile(RESOURCE)
+    f.open(QtCore.QIODevice.ReadOnly)
+    xml_string = str(f.readAll().data())
+    f.close()
+
+    digest = hashlib.sha1(xml_string).hexdigest()
+    if use_cache:
+        parsed = _read_cache(digest)
+        if parsed is not None:
+            return parsed
+
+    parsed = parse_codes(xml_string)
+    if use_cache:
+        _write_cache(digest, parsed)
+    return parsed
 
 class ProcedureCodes(object):
     '''
@@ -44,59 +222,49 @@ class ProcedureCodes(object):
     note - this is wrapped in a decorator to ensure only one instance of
     this class exists
     '''
-    def __init__(self):
-        self._list = []
-        self._cats = []
-        self._regex_dict = {}
-
-        f = QtCore.QFile(":proc_codes/om2_codes.xml")
-        f.open(QtCore.QIODevice.ReadOnly)
-        xml_string = str(f.readAll().data())
-        f.close()
-        dom = minidom.parseString(xml_string)
-
-        cat_no = 0
-        for category in dom.getElementsByTagName("Category"):
-            cat = category.attributes["name"].value.strip()
-            try:
-                cat_no = self._cats.index(cat)
-            except ValueError:
-                self._cats.append(cat)
-                cat_no = self._cats.index(cat)
-
-            for element in category.getElementsByTagName("Code"):
-                proc_code = ProcCode(element, cat)
-                proc_code.cat_no = cat_no + 1
-                self._list.append(proc_code)
-
-                for shortcuts in element.getElementsByTagName("shortcut"):
-                    shortcut = shortcuts.childNodes[0].data
-                    regex = re.compile(shortcut)
-                    self._regex_dict[regex] = proc_code.code
+    def __init__(self, use_cache=True):
+        categories, codes, shortcuts = load_codes(use_cache)
+        self._cats = categories
+        self._list = [ProcCode(*values) for values in codes]
+        self._build_indexes(shortcuts)
+
+    def _build_indexes(self, shortcuts):
+        '''
+        index the codes (by code and by category), and combine the
+        shortcut regexes (a list of (pattern, code) in order of priority)
+        '''
+        self._codes = {}
+        categories = {}
+        for proc_code in self._list:
+            # as a linear search would, the first code wins
+            self._codes.setdefault(proc_code.code, proc_code)
+            categories.setdefault(proc_code.cat_no, []).append(proc_code)
+        self._categories = dict([(cat_no, tuple(codes))
+            for cat_no, codes in categories.iteritems()])
+
+        self._shortcut_regexes = _combined_regexes(shortcuts)
+
+    def category_codes(self, cat_no):
+        '''
+        a tuple of the codes in category cat_no
+        '''
+        return self._categories.get(cat_no, ())
 
     @property
     def exam_codes(self):
-        for item in self:
-            if item.cat_no == 1:
-                yield item
+        return self.category_codes(EXAM_CATEGORY)
 
     @property
     def xray_codes(self):
-        for item in self:
-            if item.cat_no == 2:
-                yield item
+        return self.category_codes(XRAY_CATEGORY)
 
     @property
     def hyg_codes(self):
-        for item in self:
-            if item.cat_no == 3:
-                yield item
+        return self.category_codes(HYG_CATEGORY)
 
     @property
     def crown_codes(self):
-        for item in self:
-            if item.cat_no == 6:
-                yield item
+        return self.category_codes(CROWN_CATEGORY)
 
     @property
     def CATEGORIES(self):
@@ -105,26 +273,21 @@ class ProcedureCodes(object):
     def convert_user_shortcut(self, user_input):
         '''
         takes a user shortcut eg. MOD,AM.. and finds an OM code (if it exists!)
+        shortcuts are tried in the order they appear in the codes file.
         '''
-        code = None
-        for key in self._regex_dict:  #keys are pre-compiled regexes
-            if key.match(user_input):
-                code = self._regex_dict[key]
-                break
-        if code:
-            for proc_code in self:
-                if proc_code.code == code:
-                    return proc_code
+        for regex, codes in self._shortcut_regexes:
+            match = regex.match(user_input)
+            if match:
+                return self._codes.get(codes[match.lastindex - 1])
 
     def find_code(self, code):
         '''
         searches to find a code - returns "other treatment" if it can't!
         '''
-        for proc_code in self:
-            if proc_code.code == code:
-                return proc_code
-
-        return self.find_code("Z00")
+        try:
+            return self._codes[code]
+        except KeyError:
+            return self._codes.get("Z00")
 
     def __getitem__(self, key):
         '''
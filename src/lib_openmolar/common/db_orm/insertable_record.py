@@ -22,32 +22,43 @@
 
 from PyQt4 import QtSql
 
+from lib_openmolar.common.db_orm.schema_cache import schema_cache
+
 class InsertableRecord(QtSql.QSqlRecord):
     '''
     Inherits from QtSql.QSqlRecord and adds a property insert query
+
+    if the database has a :doc:`SchemaCache`, the blank record and the
+    insert statement are taken from it, rather than the database catalog.
     '''
     #:
     include_ix = False
+    _schema_cache = None
     def __init__(self, database, tablename):
         self.tablename = tablename
-        record = database.record(tablename)
+        self._schema_cache = schema_cache(database)
+        if self._schema_cache is None:
+            record = database.record(tablename)
+        else:
+            record = self._schema_cache.record(tablename)
         QtSql.QSqlRecord.__init__(self, record)
 
     @property
     def insert_query(self):
-        cols, vals = u"", u""
+        cols = []
         values = []
         for i in range(self.count()):
             field = self.field(i)
             if not self.include_ix and field.name() == "ix":
                 continue
-            cols += u"%s, "% field.name()
-            vals += "?, "
+            cols.append(unicode(field.name()))
             values.append(field.value())
-        cols = cols.rstrip(", ")
-        vals = vals.rstrip(", ")
 
-        sql = 'INSERT INTO %s (%s) VALUES (%s)'% (self.tablename, cols, vals)
+        if self._schema_cache is None:
+            sql = u'INSERT INTO %s (%s) VALUES (%s)'% (self.tablename,
+                u", ".join(cols), ", ".join(["?"] * len(cols)))
+        else:
+            sql = self._schema_cache.insert_sql(self.tablename, tuple(cols))
         return (sql, values)
 
 if __name__ == "__main__":
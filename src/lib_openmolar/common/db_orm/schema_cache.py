@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+provides SchemaCache, which remembers the (blank) records of tables
+so that the database catalog is only queried once per table.
+'''
+
+from PyQt4 import QtSql
+
+class SchemaCache(object):
+    '''
+    a cache of blank QSqlRecords (and insert statements) for a database
+    connection.
+
+    QSqlDatabase.record(tablename) queries the postgres catalog every time
+    it is called. This class calls it once per table, and hands out copies
+    (QSqlRecord is implicitly shared, so a copy is cheap until modified).
+
+    The cache is emptied whenever the connection's schema version differs
+    from that seen when the cache was filled.
+    '''
+    def __init__(self, database):
+        self.database = database
+        self._records = {}
+        self._insert_sql = {}
+        self._schema_version = None
+
+        #: incremented each time the cache is emptied, so that anything
+        #: built from cached records can tell when to rebuild.
+        self.generation = 0
+
+    def clear(self):
+        '''
+        forget everything
+        '''
+        self._records = {}
+        self._insert_sql = {}
+        self.generation += 1
+
+    def validate(self):
+        '''
+        empty the cache if the schema version has changed
+        '''
+        schema_version = getattr(self.database, "schema_version", None)
+        if schema_version != self._schema_version:
+            if self._schema_version is not None:
+                LOGGER.info("schema version changed - clearing schema cache")
+            self.clear()
+            self._schema_version = schema_version
+
+    def record(self, tablename):
+        '''
+        a copy of the blank record for tablename
+        '''
+        self.validate()
+        try:
+            record = self._records[tablename]
+        except KeyError:
+            record = self.database.record(tablename)
+            if not record.isEmpty(): # don't remember tables which don't exist
+                self._records[tablename] = record
+        return QtSql.QSqlRecord(record)
+
+    def insert_sql(self, tablename, fieldnames):
+        '''
+        the sql to insert values for fieldnames (a tuple) into tablename
+        '''
+        self.validate()
+        key = (tablename, fieldnames)
+        try:
+            return self._insert_sql[key]
+        except KeyError:
+            sql = u'INSERT INTO %s (%s) VALUES (%s)'% (tablename,
+                u", ".join(fieldnames), ", ".join(["?"] * len(fieldnames)))
+            self._insert_sql[key] = sql
+            return sql
+
+def schema_cache(database):
+    '''
+    the SchemaCache belonging to database
+    (or None, if the connection does not keep one)
+    '''
+    return getattr(database, "schema_cache", None)
@@ -20,41 +20,150 @@
 ##                                                                           ##
 ###############################################################################
 
+'''
+provides TeethPresentDecoder, which converts the dent_key
+(a 64 bit integer stored in the teeth_present table) to and from
+the teeth present.
+
+bit i of the decoded array (most significant bit of the key first)
+corresponds to SETTINGS.TOOTH_GRID[i // 16][i % 16], so each row of the
+grid is one 16 bit word of the key, and each quadrant one byte.
+'''
 
 from PyQt4 import QtCore
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MASK = 2**64 - 1
+
+#: the bit (of the dent key) for each position in the bit array
+BITS = tuple([1 << (63 - i) for i in range(64)])
+
+_WORD_TABLE = None
+_BYTE_COUNTS = bytearray([bin(i).count("1") for i in range(256)])
+
+def _word_table():
+    '''
+    a 16 bit lookup table.
+    16 bytes (each \\x00 or \\x01, most significant bit first)
+    for every possible 16 bit word, in one string.
+    built on first use.
+    '''
+    global _WORD_TABLE
+    if _WORD_TABLE is None:
+        byte_bits = [bytes(bytearray([(b >> (7 - j)) & 1 for j in range(8)]))
+            for b in range(256)]
+        _WORD_TABLE = b"".join([hi + lo for hi in byte_bits
+            for lo in byte_bits])
+    return _WORD_TABLE
+
+def _words(int_val):
+    int_val &= MASK
+    return (int_val >> 48, (int_val >> 32) & 0xFFFF,
+        (int_val >> 16) & 0xFFFF, int_val & 0xFFFF)
+
 class TeethPresentDecoder(object):
-    def __init__(self):
-        key = []
-        for i in xrange(63, -1, -1):
-            key.append(2**i)
+    #: grid positions of the quadrants (upper right, upper left,
+    #: lower left, lower right) as (row, first column)
+    QUADRANTS = (((0, 0), (1, 0)), ((0, 8), (1, 8)),
+        ((2, 8), (3, 8)), ((2, 0), (3, 0)))
 
-        self.DENT_KEY = tuple(key)
+    def __init__(self):
+        self.DENT_KEY = BITS
 
     def encode(self, bit_array):
         int_val = 0
         for i in range(64):
             if bit_array.at(i):
-                int_val += self.DENT_KEY[i]
+                int_val |= BITS[i]
         return int_val
 
+    def decode_bytes(self, int_val):
+        '''
+        a string of 64 bytes, \\x01 where the tooth is present
+        '''
+        table = _word_table()
+        return b"".join([table[word * 16:word * 16 + 16]
+            for word in _words(int_val)])
+
     def decode(self, int_val):
         bit_array = QtCore.QBitArray(64)
-        i = 0
-        for exp in self.DENT_KEY:
-            if exp <= int_val:
-                bit_array.setBit(i)
-                int_val -= exp
-            i += 1
+        present = self.decode_bytes(int_val)
+        i = present.find(b"\x01")
+        while i != -1:
+            bit_array.setBit(i)
+            i = present.find(b"\x01", i + 1)
         return bit_array
 
+    def count(self, int_val):
+        '''
+        the number of teeth present
+        '''
+        return sum([_BYTE_COUNTS[(int_val >> shift) & 0xFF]
+            for shift in range(0, 64, 8)])
+
+    def quadrant_counts(self, int_val):
+        '''
+        the number of teeth (deciduous and permanent) present in each
+        quadrant, as a tuple (upper right, upper left, lower left, lower right)
+        '''
+        int_val &= MASK
+        counts = []
+        for quadrant in self.QUADRANTS:
+            count = 0
+            for row, col in quadrant:
+                count += _BYTE_COUNTS[
+                    (int_val >> (56 - row * 16 - col)) & 0xFF]
+            counts.append(count)
+        return tuple(counts)
+
+    def decode_many(self, int_vals):
+        '''
+        decode a sequence of dent keys (eg. for every patient) at once.
+
+        returns a numpy array of uint8, shape (len(int_vals), 64)
+        or, if numpy is not installed, a bytearray of 64 bytes per key.
+        '''
+        if numpy is not None:
+            keys = numpy.array([int_val & MASK for int_val in int_vals],
+                dtype=numpy.uint64)
+            shifts = numpy.array([48, 32, 16, 0], dtype=numpy.uint64)
+            words = ((keys[:, numpy.newaxis] >> shifts) &
+                numpy.uint64(0xFFFF)).astype(numpy.intp)
+            table = numpy.frombuffer(_word_table(),
+                dtype=numpy.uint8).reshape(65536, 16)
+            return table[words].reshape(len(keys), 64)
+        matrix = bytearray()
+        for int_val in int_vals:
+            matrix.extend(self.decode_bytes(int_val))
+        return matrix
+
+    def quadrant_counts_many(self, int_vals):
+        '''
+        quadrant_counts for a sequence of dent keys.
+        returns a numpy array of shape (len(int_vals), 4)
+        or, if numpy is not installed, a list of tuples.
+        '''
+        if numpy is not None:
+            matrix = self.decode_many(int_vals).reshape(-1, 4, 2, 8)
+            halves = matrix.sum(axis=3, dtype=numpy.uint8)
+            return numpy.column_stack((
+                halves[:, 0, 0] + halves[:, 1, 0],
+                halves[:, 0, 1] + halves[:, 1, 1],
+                halves[:, 2, 1] + halves[:, 3, 1],
+                halves[:, 2, 0] + halves[:, 3, 0]))
+        return [self.quadrant_counts(int_val) for int_val in int_vals]
+
     def to_ascii_art(self, int_val):
         ascii = ""
-        bit_array = self.decode(int_val)
+        present = self.decode_bytes(int_val)
         for row, start in ((0,0),(1,16),(2,32),(3,48)):
             for i in range(16):
                 pos = start + i
-                if bit_array.at(pos):
+                if present[pos] == b"\x01":
                     tooth_id = SETTINGS.TOOTH_GRID[row][i]
                     ascii += " %s "% (
                         SETTINGS.TOOTHGRID_SHORTNAMES.get(tooth_id, "???"))
@@ -35,6 +35,33 @@ from insertable_record import InsertableRecord
 
 PROCEDURE_CODES = proc_codes.ProcedureCodesInstance()
 
+METADATA_QUERY = '''select treatment_teeth.treatment_id,
+tooth, tx_type, surfaces, material, type, technition from treatment_teeth
+left join treatment_fills  on treatment_fills.tooth_tx_id = treatment_teeth.ix
+left join treatment_crowns on treatment_crowns.tooth_tx_id = treatment_teeth.ix
+where treatment_teeth.treatment_id = ?
+order by treatment_teeth.ix'''
+
+#: the metadata of all treatment items for a patient, in one query
+PATIENT_METADATA_QUERY = '''select treatment_teeth.treatment_id,
+tooth, tx_type, surfaces, material, type, technition from treatment_teeth
+join treatments on treatments.ix = treatment_teeth.treatment_id
+left join treatment_fills  on treatment_fills.tooth_tx_id = treatment_teeth.ix
+left join treatment_crowns on treatment_crowns.tooth_tx_id = treatment_teeth.ix
+where treatments.patient_id = ?
+order by treatment_teeth.ix'''
+
+def group_metadata_records(records):
+    '''
+    sort the result of :attr:`PATIENT_METADATA_QUERY` into a dictionary
+    {treatment_id: [QSqlRecord, ...]}
+    '''
+    grouped = {}
+    for record in records:
+        treatment_id = record.value("treatment_id").toInt()[0]
+        grouped.setdefault(treatment_id, []).append(record)
+    return grouped
+
 class TreatmentItemException(Exception):
     '''
     a custom exception raised by treatment item errors
@@ -360,20 +387,23 @@ class TreatmentItem(object):
         '''
         poll the database to get metadata associated with this item
         '''
-        self._metadata = []
-        query = '''select
-tooth, tx_type, surfaces, material, type, technition from treatment_teeth
-left join treatment_fills  on treatment_fills.tooth_tx_id = treatment_teeth.ix
-left join treatment_crowns on treatment_crowns.tooth_tx_id = treatment_teeth.ix
-where treatment_teeth.treatment_id = ?
-'''
         q_query = QtSql.QSqlQuery(SETTINGS.psql_conn)
-        q_query.prepare(query)
+        q_query.prepare(METADATA_QUERY)
         q_query.addBindValue(self.id)
         q_query.exec_()
+        records = []
         while q_query.next():
-            record = q_query.record()
+            records.append(q_query.record())
+        self.set_metadata_records(records)
 
+    def set_metadata_records(self, records):
+        '''
+        set the metadata from QSqlRecords already retrieved from the database
+        (see :attr:`PATIENT_METADATA_QUERY`), so that
+        :func:`_get_metadata` is not needed.
+        '''
+        self._metadata = []
+        for record in records:
             treatment_item_metadata = TreatmentItemMetadata(self, record)
             self._metadata.append(treatment_item_metadata)
 
@@ -31,6 +31,7 @@ import logging
 from PyQt4 import QtSql, QtGui, QtCore
 
 from lib_openmolar.common.datatypes import ConnectionData
+from lib_openmolar.common.db_orm.schema_cache import SchemaCache
 
 class ConnectionError(Exception):
     '''
@@ -47,6 +48,7 @@ class OpenmolarDatabase(QtSql.QSqlDatabase):
     within 10 seconds
     '''
     _schema_version = None
+    _schema_cache = None
 
     class SchemaVersionError(Exception):
         pass
@@ -97,6 +99,7 @@ class OpenmolarDatabase(QtSql.QSqlDatabase):
         optional arguments of (user, password)
         '''
         self._schema_version = None
+        self._schema_cache = None
 
         logging.debug("OpenmolarDatabase connecting")
 
@@ -193,6 +196,24 @@ class OpenmolarDatabase(QtSql.QSqlDatabase):
                 self._schema_version = q_query.value(0).toString()
         return self._schema_version
 
+    def forget_schema_version(self):
+        '''
+        the schema has (or may have) been changed.
+        the version will be polled again when next required,
+        and the schema_cache emptied if it has changed.
+        '''
+        self._schema_version = None
+
+    @property
+    def schema_cache(self):
+        '''
+        a :doc:`SchemaCache` of blank records for this connection
+        (replaced each time the connection is opened)
+        '''
+        if self._schema_cache is None:
+            self._schema_cache = SchemaCache(self)
+        return self._schema_cache
+
 def _test():
     logging.basicConfig(level=logging.DEBUG)
 
@@ -23,13 +23,19 @@
 from datetime import datetime
 import os
 import re
+import shutil
 import subprocess
 import sys
+import tempfile
+import time
 import psycopg2
 
 from lib_openmolar.server.misc.password_generator import new_password
 from lib_openmolar.server.misc.om_server_config import OMServerConfig
 from lib_openmolar.server.misc.backup_config import BackupConfig
+from lib_openmolar.server.misc.connection_pool import ConnectionPools
+from lib_openmolar.server.misc import backup_writer
+from lib_openmolar.server.misc import job_runner
 
 def log_exception(func):
     def db_func(*args, **kwargs):
@@ -46,6 +52,17 @@ class DBFunctions(object):
     '''
     def __init__(self):
         self.config = OMServerConfig()
+        self._pools = ConnectionPools(self.config)
+        # {dbname: (schema_version, time)} see MessageFunctions
+        self._schema_versions = {}
+
+    def forget_schema_version(self, dbname):
+        '''
+        remove dbname from the cache of schema versions.
+        called when a database is created or dropped, and should be
+        called by anything which upgrades a schema.
+        '''
+        self._schema_versions.pop(dbname, None)
 
     @property
     def default_conn_atts(self):
@@ -70,23 +87,14 @@ class DBFunctions(object):
         execute an sql statement with default connection rights.
         '''
         try:
-            conn = psycopg2.connect(self.__conn_atts(dbname))
-            try:
-                # functions such as create and drop do not support transactions
-                conn.autocommit = True
-            except AttributeError:
-                LOGGER.warning(
-                    "no autocommit attribute in pyscopg2 - old version?")
-                conn.set_isolation_level(0)
-
-            cursor = conn.cursor()
-            LOGGER.debug(statement)
-            cursor.execute(statement)
-            conn.close()
+            with self._pools.connection(dbname) as conn:
+                cursor = conn.cursor()
+                LOGGER.debug(statement)
+                cursor.execute(statement)
+                cursor.close()
             return True
         except psycopg2.Warning as warn:
             LOGGER.warning(warn)
-            conn.close()
             return True
         except psycopg2.Error as exc:
             LOGGER.exception("error executing statement")
@@ -164,6 +172,7 @@ class DBFunctions(object):
             LOGGER.info("laying out schema for database '%s'"% dbname)
 
             self._execute(sql, dbname)
+            self.forget_schema_version(dbname)
             return True
         except:
             LOGGER.exception("exeption in %(module)s")
@@ -199,8 +208,11 @@ class DBFunctions(object):
         other roles in these groups haven't been removed first)
         '''
         LOGGER.warning("user '%s' is deleting database %s" %(
-            self._user, dbname))
+            self.user, dbname))
         LOGGER.warning("removing database (if exists) %s"% dbname)
+        # pooled connections to this database would prevent the drop
+        self._pools.close(dbname)
+        self.forget_schema_version(dbname)
         if self._execute('drop database if exists %s;'% dbname):
             LOGGER.info("database '%s' removed"% dbname)
         else:
@@ -280,17 +292,18 @@ class DBFunctions(object):
         '''
         LOGGER.debug(
             "getting priv groups for user '%s' on dbase '%s'"% (user, dbname))
-        conn = psycopg2.connect(self.__conn_atts(dbname))
-        cursor = conn.cursor()
-        cursor.execute('''
-        select rolname from pg_user
-        join pg_auth_members on (pg_user.usesysid=pg_auth_members.member)
-        join pg_roles on (pg_roles.oid=pg_auth_members.roleid)
-        where pg_user.usename=%s'''
-        , (user,))
+        with self._pools.connection(dbname) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            select rolname from pg_user
+            join pg_auth_members on (pg_user.usesysid=pg_auth_members.member)
+            join pg_roles on (pg_roles.oid=pg_auth_members.roleid)
+            where pg_user.usename=%s'''
+            , (user,))
+            rolnames = cursor.fetchall()
         perms = {}
 
-        for rolname in cursor.fetchall():
+        for rolname in rolnames:
             for group in ["admin","client"]:
                 if re.match("om_%s_group_%s"% (group, dbname), rolname[0]):
                     perms[group] = True
@@ -335,11 +348,12 @@ class DBFunctions(object):
         '''
         returns all the table names in schema dbname
         '''
-        conn = psycopg2.connect(self.__conn_atts(dbname))
-        cursor = conn.cursor()
-        cursor.execute(
-        "SELECT tablename FROM pg_tables WHERE schemaname='public'")
-        for tablename in cursor.fetchall():
+        with self._pools.connection(dbname) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+            "SELECT tablename FROM pg_tables WHERE schemaname='public'")
+            tablenames = cursor.fetchall()
+        for tablename in tablenames:
             yield tablename[0]
 
     def _sequences(self, dbname, exceptions):
@@ -347,11 +361,12 @@ class DBFunctions(object):
         returns all the sequences in schema dbname
         exceptions is a list of tables whose sequences are to be ignored.
         '''
-        conn = psycopg2.connect(self.__conn_atts(dbname))
-        cursor = conn.cursor()
-        cursor.execute(
-        "select sequence_name from information_schema.sequences")
-        for sequence_name in cursor.fetchall():
+        with self._pools.connection(dbname) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+            "select sequence_name from information_schema.sequences")
+            sequence_names = cursor.fetchall()
+        for sequence_name in sequence_names:
             for exception in exceptions:
                 if sequence_name[0].startswith(exception):
                     continue
@@ -373,42 +388,55 @@ class DBFunctions(object):
 
         exceptions = ("settings", "procedure_codes", "text_fields")
 
-        for tablename in self._tables(dbname):
-            if tablename not in exceptions:
-                LOGGER.info("... truncating '%s'"% tablename)
-                self._execute("TRUNCATE %s CASCADE"% tablename, dbname)
-        for sequence in self._sequences(dbname, exceptions):
+        tablenames = [tablename for tablename in self._tables(dbname)
+            if tablename not in exceptions]
+        sequences = list(self._sequences(dbname, exceptions))
+        total = len(tablenames) + len(sequences)
+
+        for i, tablename in enumerate(tablenames):
+            LOGGER.info("... truncating '%s'"% tablename)
+            self._execute("TRUNCATE %s CASCADE"% tablename, dbname)
+            job_runner.report_progress(i+1, total)
+        for i, sequence in enumerate(sequences):
             LOGGER.info("... reseting sequence '%s'"% sequence)
             self._execute("select setval('%s', 1, false)"% sequence,
                 dbname)
+            job_runner.report_progress(len(tablenames)+i+1, total)
         return True
 
+    def _remove_partial_backup(self, filepath):
+        '''
+        delete the file (or directory) written by a failed backup
+        '''
+        try:
+            if os.path.isdir(filepath):
+                shutil.rmtree(filepath)
+            elif os.path.exists(filepath):
+                os.remove(filepath)
+            else:
+                return
+            LOGGER.warning("removed partial backup %s"% filepath)
+        except OSError:
+            LOGGER.exception("unable to remove partial backup %s"% filepath)
+
     @log_exception
     def backup_db(self, dbname, schema_only=False):
         '''
-        calls a pg_dump (using db user openmolar)
+        calls pg_dump (using db user openmolar)
         if schema_only is True, then the -s option is passed into pg_dump.
-        '''
-        LOGGER.info("backing up %s"% dbname)
-
-        opts = ["-s", dbname] if schema_only else [dbname]
-
-        proc = subprocess.Popen(
-            ["pg_dump", "-h", "127.0.0.1",
-            "-U", "openmolar", "-W"] + opts,
-            stdin = subprocess.PIPE,
-            stdout=subprocess.PIPE)
 
-        proc.stdin.write(self.MASTER_PWORD)
-        proc.stdin.flush()
+        the format, compression and retention of backups are set in
+        backup.conf (see :doc:`BackupConfig`).
+        plain dumps are streamed to disk a chunk at a time, custom and
+        directory format dumps are written (and compressed) by pg_dump itself.
 
-        stdout, stderr = proc.communicate()
-
-        if stderr:
-            LOGGER.warning("Errors were thrown %s"% stderr)
+        returns a dictionary (filepath, size, raw_size, seconds, throughput)
+        '''
+        LOGGER.info("backing up %s"% dbname)
 
+        backup_config = BackupConfig()
         try:
-            BACKUP_DIR = BackupConfig().backup_dir
+            BACKUP_DIR = backup_config.backup_dir
         except IOError:
             BACKUP_DIR = "/usr/share/openmolar/backups/"
 
@@ -417,17 +445,104 @@ class DBFunctions(object):
         if not os.path.isdir(backup_dir):
             os.makedirs(backup_dir)
 
-        filename = "schema"% now if schema_only else "backup"
-
-        filename += datetime.now().strftime("%Y%m%d_%H%M%S") + ".sql"
+        format_ = backup_config.format
+        compression = backup_config.compression
+        level = backup_config.compression_level
 
+        prefix = "schema" if schema_only else "backup"
+        filename = prefix + datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename += backup_writer.EXTENSIONS[format_]
+        if format_ == "plain":
+            filename += backup_writer.EXTENSIONS[compression]
         filepath = os.path.join(backup_dir, filename)
 
-        f = open(filepath, "w")
-        f.write(stdout)
-        f.close()
-
+        args = ["pg_dump", "-h", self.config.postgres_host,
+            "-p", self.config.postgres_port,
+            "-U", self.config.postgres_user, "-w"]
+        if schema_only:
+            args.append("-s")
+        if format_ != "plain":
+            args += ["-F", format_[0], "-f", filepath]
+            if compression == "none":
+                args += ["-Z", "0"]
+            elif compression == "zstd":
+                # requires pg_dump version 16 or later
+                args += ["-Z", "zstd:%d"% level]
+            else:
+                args += ["-Z", str(level)]
+        if format_ == "directory" and backup_config.jobs > 1:
+            args += ["-j", str(backup_config.jobs)]
+        args.append(dbname)
+
+        # the password is passed in the environment, as pg_dump reads
+        # prompted passwords from the terminal, not stdin.
+        env = dict(os.environ, PGPASSWORD=self.MASTER_PWORD)
+        stderr = tempfile.TemporaryFile()
+        start_time = time.time()
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr,
+            env=env)
+
+        raw_size = None
+        try:
+            if format_ == "plain":
+                estimate = None if schema_only else self._database_size(dbname)
+                def progress(copied):
+                    if estimate:
+                        job_runner.report_progress(
+                            min(copied, estimate), estimate)
+
+                writer = backup_writer.open_writer(filepath, compression,
+                    level)
+                try:
+                    raw_size = backup_writer.copy_stream(proc.stdout, writer,
+                        progress)
+                finally:
+                    writer.close()
+
+            returncode = proc.wait()
+            stderr.seek(0)
+            errors = stderr.read()
+            if errors:
+                LOGGER.warning("Errors were thrown %s"% errors)
+            if returncode != 0:
+                raise IOError("pg_dump failed with exit status %s"% returncode)
+        except:
+            # don't leave pg_dump running, or a partial backup which
+            # prune_backups would count as a good one.
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            self._remove_partial_backup(filepath)
+            raise
+        finally:
+            stderr.close()
+
+        result = backup_writer.summary(filepath, raw_size, start_time)
         LOGGER.info("file saved as %s"% filepath)
+        LOGGER.info("%.1f MB written in %.1f seconds (%.1f MB/s)"% (
+            result["size"] / 1048576.0, result["seconds"],
+            result["throughput"] / 1048576.0))
+
+        backup_writer.prune_backups(backup_dir, prefix,
+            backup_config.keep_count, backup_config.keep_days)
+
+        return result
+
+    def _database_size(self, dbname):
+        '''
+        the size of database dbname on disk (an estimate of the dump size)
+        '''
+        with self._pools.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("select pg_database_size(%s)", (dbname,))
+            return cursor.fetchone()[0]
+
+    def pool_statistics(self):
+        '''
+        returns a dictionary {dbname: statistics} describing the
+        server's pooled connections to each database.
+        '''
+        return self._pools.statistics
 
     @log_exception
     def get_update_script(self, original, current):
@@ -454,7 +569,7 @@ def _test():
     test the DBFunctions class
     '''
     sf = DBFunctions()
-    sf._user = "test_user"
+    sf.user = "test_user"
 
     dbname = "openmolar_demo"
     #LOGGER.debug(sf.newDB_sql(dbname))
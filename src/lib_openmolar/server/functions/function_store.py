@@ -36,7 +36,7 @@ class FunctionStore(DBFunctions, ShellFunctions, MessageFunctions):
     Inherits from many other classes as only one call of
     SimpleXMLServer.register_instance is allowed.
     '''
-    _user = None
+    user = None
 
     def __init__(self):
         self.config = OMServerConfig()
@@ -20,11 +20,13 @@
 ##                                                                           ##
 ###############################################################################
 
-import psycopg2
+import cgi
 import re
 import socket
+import time
 
-from lib_openmolar.server.misc.om_server_config import OMServerConfig
+from lib_openmolar.server.misc.connection_pool import APPLICATION_NAME
+from lib_openmolar.server.misc import log_reader
 
 
 HEADER = '''<!DOCTYPE html>
@@ -38,6 +40,18 @@ HEADER = '''<!DOCTYPE html>
 
 FOOTER = None
 
+SCHEMA_VERSION_ERROR = "UNABLE TO get Version number."
+
+#: cached schema versions are re-read after this many seconds
+SCHEMA_VERSION_TTL = 300
+
+#: the number of log records shown per page by message_link
+LOG_PAGE_LINES = 200
+
+#: the text of links in the server log pages
+LOG_LINK = re.compile(
+    r"(?:show )?server log(?: (before|after)=(\d+))?(?: level=(\w+))?$")
+
 def get_footer():
     global FOOTER
     if FOOTER is None:
@@ -94,23 +108,9 @@ def log_exception(func):
 class MessageFunctions(object):
     '''
     A class whose functions will be inherited by the server
+    (the connection pools and schema version cache are those set up by
+    DBFunctions.__init__)
     '''
-    def __init__(self):
-        self.config = OMServerConfig()
-
-    def __conn_atts(self, dbname="openmolar_master"):
-        '''
-        has to be a private function because of the password!
-        a well set up server will restrict user "openmolar"
-        to a unix socket connection (ie local machine only)
-        or at the very least a TCP/IP connection to only localhost.
-        (function doesn't get picked up by register_instance)
-        '''
-        return "host='%s' user='%s' port='%s' password='%s' dbname='%s'"% (
-            self.config.postgres_host, self.config.postgres_user,
-            self.config.postgres_port,
-            self.config.postgres_pass, dbname)
-
     @property
     def location_header(self):
         '''
@@ -131,20 +131,35 @@ class MessageFunctions(object):
 
     @log_exception
     def get_schema_version(self, dbname):
+        '''
+        the value of schema_version stored in the settings table of dbname.
+        values are cached (see DBFunctions.forget_schema_version)
+        '''
+        try:
+            version, cached_time = self._schema_versions[dbname]
+            if time.time() - cached_time < SCHEMA_VERSION_TTL:
+                return version
+        except KeyError:
+            pass
+        version = self._query_schema_version(dbname)
+        if version != SCHEMA_VERSION_ERROR:
+            self._schema_versions[dbname] = (version, time.time())
+        return version
+
+    def _query_schema_version(self, dbname):
         '''
         issues a query to get the value of schema_version stored in settings.
         '''
         try:
-            conn = psycopg2.connect(self.__conn_atts(dbname))
-            cursor = conn.cursor()
-            cursor.execute(
+            with self._pools.connection(dbname) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
                 "select max(data) from settings where key='schema_version'")
-            version = cursor.fetchone()
-            conn.close()
+                version = cursor.fetchone()
             return version[0]
         except Exception as exc:
             LOGGER.exception("Serious Error")
-            return "UNABLE TO get Version number."
+            return SCHEMA_VERSION_ERROR
 
     @log_exception
     def available_databases(self):
@@ -164,15 +179,15 @@ class MessageFunctions(object):
         LOGGER.debug("polling for available databases")
         databases = []
         try:
-            conn = psycopg2.connect(self.__conn_atts())
-            cursor = conn.cursor()
-            cursor.execute('''SELECT datname FROM pg_database JOIN pg_user
-            ON pg_database.datdba = pg_user.usesysid
-            where usename='openmolar' and datname != 'openmolar_master'
-            order by datname''')
-            for result in cursor.fetchall():
+            with self._pools.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''SELECT datname FROM pg_database JOIN pg_user
+                ON pg_database.datdba = pg_user.usesysid
+                where usename='openmolar' and datname != 'openmolar_master'
+                order by datname''')
+                results = cursor.fetchall()
+            for result in results:
                 databases.append(result[0])
-            conn.close()
         except Exception as exc:
             LOGGER.exception("Serious Error")
             return "EXCEPTION CAUGHT"
@@ -265,15 +280,69 @@ class MessageFunctions(object):
         the "url" here will be text of a link that has been displayed as
         part of the html from the server.
         '''
-
-        if url == "show server log":
-            f = open("/var/log/openmolar/server.log", "r")
-            data = f.read()
-            f.close()
-            return "<html><body><pre>%s</pre></body></html>"% data
+        match = LOG_LINK.match(url)
+        if match:
+            direction, offset, level = match.groups()
+            return self.server_log_html(direction, offset, level or "")
 
         return None
 
+    def server_log(self, lines=LOG_PAGE_LINES, before=-1, level=""):
+        '''
+        the last "lines" records of the server log before byte offset
+        "before" (-1 for the end of the log), optionally only those of
+        level (eg. "WARNING") or above.
+        see lib_openmolar.server.misc.log_reader for the result format.
+        '''
+        return log_reader.tail(lines, before, level)
+
+    def server_log_range(self, offset, max_bytes=65536, level=""):
+        '''
+        records from the server log starting at byte offset.
+        pass the "end" of the previous result to follow the log.
+        '''
+        return log_reader.read_range(offset, max_bytes, level)
+
+    def server_log_html(self, direction=None, offset=None, level=""):
+        '''
+        a page of the server log, with links to earlier and later pages.
+        '''
+        try:
+            if direction == "after":
+                result = log_reader.read_range(int(offset),
+                    level=level)
+            else:
+                before = -1 if offset is None else int(offset)
+                result = log_reader.tail(LOG_PAGE_LINES, before, level)
+        except IOError:
+            LOGGER.exception("unable to read server log")
+            return u"%s<p>%s %s</p>%s"% (HEADER,
+                _("Unable to read the server log"), log_reader.LOCATION,
+                "</body></html>")
+
+        level_text = " level=%s"% level if level else ""
+        links = []
+        if result["start"] > 0:
+            links.append('<a href="server log before=%d%s">%s</a>'% (
+                result["start"], level_text, _("Earlier Entries")))
+        links.append('<a href="server log after=%d%s">%s</a>'% (
+            result["end"], level_text, _("Newer Entries")))
+        links.append('<a href="server log%s">%s</a>'% (
+            level_text, _("Latest Entries")))
+        if level:
+            links.append('<a href="server log">%s</a>'% _("All Levels"))
+        else:
+            links.append('<a href="server log level=WARNING">%s</a>'%
+                _("Warnings and Errors Only"))
+
+        text = "".join([record[2] for record in result["records"]])
+        return u"%s<p>%s %s - %s %d %s %d (%d)</p><p>%s</p><pre>%s</pre>%s"% (
+            HEADER, _("Server Log"), log_reader.LOCATION, _("bytes"),
+            result["start"], _("to"), result["end"], result["size"],
+            " | ".join(links),
+            cgi.escape(text.decode("utf8", "replace")),
+            "</body></html>")
+
     @log_exception
     def login_roles(self):
         '''
@@ -283,12 +352,11 @@ class MessageFunctions(object):
         '''
         roles = []
         try:
-            conn = psycopg2.connect(self.__conn_atts())
-            cursor = conn.cursor()
-            cursor.execute(
-                'select usename from pg_catalog.pg_user')
-            users = cursor.fetchall()
-            conn.close()
+            with self._pools.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'select usename from pg_catalog.pg_user')
+                users = cursor.fetchall()
             for user in users:
                 roles.append(user[0])
 
@@ -301,21 +369,56 @@ class MessageFunctions(object):
     def list_sessions(self, db_name):
         '''
         list active connections
+        (the server's own pooled connections are not included)
         '''
         try:
-            conn = psycopg2.connect(self.__conn_atts())
-            cursor = conn.cursor()
-            cursor.execute(
-                '''select usename, client_addr, application_name
-                from pg_catalog.pg_stat_activity where datname = '%s'
-                '''% db_name)
-            sessions = cursor.fetchall()
-            conn.close()
+            with self._pools.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    '''select usename, client_addr, application_name
+                    from pg_catalog.pg_stat_activity where datname = %s
+                    and application_name != %s
+                    ''', (db_name, APPLICATION_NAME))
+                sessions = cursor.fetchall()
             for user, address, application in sessions:
                 yield (user, address, application)
         except Exception as exc:
             LOGGER.exception("Serious Error")
 
+    def _all_sessions(self, dbnames):
+        '''
+        active connections to any of dbnames, in one query.
+        returns a dictionary {dbname: [(user, address, application),]}
+        '''
+        sessions = dict([(dbname, []) for dbname in dbnames])
+        with self._pools.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                '''select datname, usename, client_addr, application_name
+                from pg_catalog.pg_stat_activity where datname = any(%s)
+                and application_name != %s
+                order by datname, usename
+                ''', (list(dbnames), APPLICATION_NAME))
+            for dbname, user, address, application in cursor.fetchall():
+                sessions[dbname].append((user, address, application))
+        return sessions
+
+    @log_exception
+    def database_overview(self, dbs=None):
+        '''
+        a list of dictionaries (name, schema_version, sessions)
+        one for each database in dbs (default - all available databases).
+        sessions is a list of (user, address, application)
+        '''
+        if dbs is None:
+            dbs = self.available_databases()
+            if dbs == "EXCEPTION CAUGHT":
+                return []
+        sessions = self._all_sessions(dbs)
+        return [{"name": db,
+                 "schema_version": self.get_schema_version(db),
+                 "sessions": sessions[db]} for db in dbs]
+
     @log_exception
     def pg_server_info(self):
         '''
@@ -325,11 +428,10 @@ class MessageFunctions(object):
         current_setting('listen_addresses') as addresses,
         current_setting('port') as port'''
         try:
-            conn = psycopg2.connect(self.__conn_atts())
-            cursor = conn.cursor()
-            cursor.execute(query)
-            values = cursor.fetchone()
-            conn.close()
+            with self._pools.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                values = cursor.fetchone()
             return values
         except Exception as exc:
             LOGGER.exception("Serious Error")
@@ -410,15 +512,28 @@ class MessageFunctions(object):
                     _("Local Functions")
                     )
 
-            for i, db in enumerate(dbs):
-                s_v = self.get_schema_version(db)
+            for i, overview in enumerate(self.database_overview(dbs)):
+                db = overview["name"]
+                if overview["sessions"]:
+                    ses_html = '                <table class="sessions">'
+                    ses_html += "".join(['''
+                        <tr>
+                            <td>%s</td>
+                            <td>%s</td>
+                            <td>%s</td>
+                        </tr>'''% session
+                        for session in overview["sessions"]])
+                    ses_html += "</table>"
+                else:
+                    ses_html = _("No Sessions")
+
                 if i % 2 == 0:
                     html += '<tr class="even">'
                 else:
                     html += '<tr class="odd">'
                 html += '''
                         <td><b>%s</b></td>
-                        <td class="list">{SESSIONS}</td>
+                        <td class="list">%s</td>
                         <td>%s</td>
                         <td>
                             <form action="manage_%s" method="get">
@@ -439,27 +554,12 @@ class MessageFunctions(object):
                             </form>
                         </td>
                     </tr>
-                '''% (  db, s_v,
+                '''% (  db, ses_html, overview["schema_version"],
                         db, _("Database"),
                         db, _("User Permissions"),
                         db, _("Configure Sessions")
                     )
 
-                ses_html = '                <table class="sessions">'
-                for session in self.list_sessions(db):
-                    ses_html += '''
-                        <tr>
-                            <td>%s</td>
-                            <td>%s</td>
-                            <td>%s</td>
-                        </tr>'''% session
-                ses_html += "</table>"
-
-                if not "<td>" in ses_html:
-                    ses_html = _("No Sessions")
-
-                html = html.replace("{SESSIONS}", ses_html)
-
             return  html + "</table>"
 
         except Exception:
@@ -484,9 +584,10 @@ class MessageFunctions(object):
 
 def _test():
     '''
-    test the ShellFunctions class
+    test the MessageFunctions class
     '''
-    sf = MessageFunctions()
+    from lib_openmolar.server.functions.function_store import FunctionStore
+    sf = FunctionStore()
     LOGGER.debug(sf.admin_welcome())
     LOGGER.debug(sf.no_databases_message())
     LOGGER.debug(sf.postgres_error_message())
@@ -28,7 +28,37 @@ from lib_openmolar.server.misc.om_server_config import SERVER_DIR
 
 BACKUP_FILE = os.path.join(SERVER_DIR, "backup.conf")
 
+#: the formats understood by pg_dump (plain is an sql script)
+FORMATS = ("plain", "custom", "directory")
+
+#: "none" or the name of a compression method
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+# used if backup.conf does not specify these options
+DEFAULT_FORMAT = "plain"
+DEFAULT_COMPRESSION = "none"
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_JOBS = 1
+DEFAULT_KEEP_COUNT = 0
+DEFAULT_KEEP_DAYS = 0
+
 class BackupConfig(ConfigParser.SafeConfigParser):
+    '''
+    the backup options, read from the [backup] section of backup.conf
+
+    [backup]
+    location = /var/backups/openmolar
+    # plain, custom or directory
+    format = plain
+    # none, gzip or zstd
+    compression = none
+    compression_level = 6
+    # parallel pg_dump jobs (directory format only)
+    jobs = 1
+    # retention. 0 means keep all backups
+    keep_count = 0
+    keep_days = 0
+    '''
     def __init__(self):
         ConfigParser.SafeConfigParser.__init__(self)
         try:
@@ -65,10 +95,73 @@ class BackupConfig(ConfigParser.SafeConfigParser):
             LOGGER.info("no backup location found in backup.conf")
             raise IOError("misconfigured or missing backup file")
 
+    def _get(self, option, default, getter=None):
+        '''
+        get an option from the backup section, or default if not set.
+        '''
+        if getter is None:
+            getter = self.get
+        try:
+            return getter("backup", option)
+        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+            return default
+
+    @property
+    def format(self):
+        '''
+        the pg_dump format - one of FORMATS
+        '''
+        format_ = self._get("format", DEFAULT_FORMAT)
+        if format_ not in FORMATS:
+            LOGGER.warning("unknown backup format '%s' - using %s"% (
+                format_, DEFAULT_FORMAT))
+            return DEFAULT_FORMAT
+        return format_
+
+    @property
+    def compression(self):
+        '''
+        how backups are compressed - one of COMPRESSIONS
+        '''
+        compression = self._get("compression", DEFAULT_COMPRESSION)
+        if compression not in COMPRESSIONS:
+            LOGGER.warning("unknown backup compression '%s' - using %s"% (
+                compression, DEFAULT_COMPRESSION))
+            return DEFAULT_COMPRESSION
+        return compression
+
+    @property
+    def compression_level(self):
+        return self._get("compression_level", DEFAULT_COMPRESSION_LEVEL,
+            self.getint)
+
+    @property
+    def jobs(self):
+        '''
+        the number of tables dumped in parallel (directory format only)
+        '''
+        return self._get("jobs", DEFAULT_JOBS, self.getint)
+
+    @property
+    def keep_count(self):
+        '''
+        the number of backups of each database to keep (0 means keep all)
+        '''
+        return self._get("keep_count", DEFAULT_KEEP_COUNT, self.getint)
+
+    @property
+    def keep_days(self):
+        '''
+        backups older than this number of days are removed
+        (0 means keep forever)
+        '''
+        return self._get("keep_days", DEFAULT_KEEP_DAYS, self.getint)
+
 if __name__ == "__main__":
     import logging
     logging.basicConfig(level = logging.DEBUG)
 
     LOGGER = logging.getLogger("test")
     bc = BackupConfig()
-    LOGGER.info(bc.backup_dir)
\ No newline at end of file
+    LOGGER.info(bc.backup_dir)
+    LOGGER.info("%s %s %s"% (bc.format, bc.compression, bc.keep_count))
\ No newline at end of file
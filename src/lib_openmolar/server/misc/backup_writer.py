@@ -0,0 +1,176 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+helpers for DBFunctions.backup_db.
+the output of pg_dump is copied to disk a chunk at a time (optionally
+compressed), so that the dump is never held in memory.
+'''
+
+import gzip
+import os
+import re
+import shutil
+import subprocess
+import time
+
+#: bytes read from pg_dump at a time
+CHUNK_SIZE = 1024 * 1024
+
+#: filename extensions for the formats and compressions in backup_config
+EXTENSIONS = {
+    "plain": ".sql",
+    "custom": ".dump",
+    "directory": "",
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+    }
+
+class _ZstdWriter(object):
+    '''
+    a file like object, which pipes data to the zstd command line tool
+    '''
+    def __init__(self, filepath, level):
+        self.proc = subprocess.Popen(
+            ["zstd", "-q", "-f", "-%d"% level, "-o", filepath],
+            stdin=subprocess.PIPE)
+
+    def write(self, data):
+        self.proc.stdin.write(data)
+
+    def close(self):
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise IOError("zstd exited with status %s"% self.proc.returncode)
+
+def open_writer(filepath, compression="none", level=6):
+    '''
+    returns a file like object (with write and close methods)
+    which writes to filepath, compressing if required.
+    '''
+    if compression == "gzip":
+        return gzip.open(filepath, "wb", level)
+    if compression == "zstd":
+        return _ZstdWriter(filepath, level)
+    return open(filepath, "wb")
+
+def copy_stream(source, writer, progress_callback=None):
+    '''
+    copy file like object source to writer, a chunk at a time.
+    progress_callback (if given) is called with the number of bytes copied
+    so far after each chunk.
+    returns the number of bytes copied.
+    '''
+    copied = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        writer.write(chunk)
+        copied += len(chunk)
+        if progress_callback is not None:
+            progress_callback(copied)
+    return copied
+
+def disk_usage(path):
+    '''
+    the size (in bytes) of a file, or of all files in a directory
+    '''
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(dirpath, filename))
+    return size
+
+def summary(filepath, raw_size, start_time):
+    '''
+    a dictionary describing a finished backup
+    '''
+    seconds = max(time.time() - start_time, 0.001)
+    size = disk_usage(filepath)
+    return {
+        "filepath": filepath,
+        "size": size,
+        "raw_size": raw_size,
+        "seconds": seconds,
+        "throughput": (raw_size or size) / seconds,
+        }
+
+def prune_backups(backup_dir, prefix, keep_count=0, keep_days=0):
+    '''
+    remove old backups (files or directories) in backup_dir whose names
+    start with prefix followed by a timestamp.
+    the newest keep_count are kept (all if 0), and any older than
+    keep_days are removed (unless keep_days is 0).
+    the most recent backup is never removed.
+    returns a list of the paths removed.
+    '''
+    matcher = re.compile(r"%s\d{8}_\d{6}"% re.escape(prefix))
+    backups = sorted([name for name in os.listdir(backup_dir)
+        if matcher.match(name)], reverse=True)
+
+    doomed = set()
+    if keep_count > 0:
+        doomed.update(backups[keep_count:])
+    if keep_days > 0:
+        cutoff = time.time() - keep_days * 86400
+        for name in backups[1:]:
+            if os.path.getmtime(os.path.join(backup_dir, name)) < cutoff:
+                doomed.add(name)
+
+    removed = []
+    for name in sorted(doomed):
+        path = os.path.join(backup_dir, name)
+        LOGGER.info("removing old backup %s"% path)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        removed.append(path)
+    return removed
+
+def _test():
+    import tempfile
+    import StringIO
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for i in range(4):
+            filepath = os.path.join(temp_dir, "backup2012010%d_120000.sql.gz"% i)
+            writer = open_writer(filepath, "gzip")
+            raw_size = copy_stream(StringIO.StringIO("select 1;\n" * 10000),
+                writer)
+            writer.close()
+            LOGGER.debug(summary(filepath, raw_size, time.time()))
+        LOGGER.debug(prune_backups(temp_dir, "backup", keep_count=2))
+        LOGGER.debug(sorted(os.listdir(temp_dir)))
+    finally:
+        shutil.rmtree(temp_dir)
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level = logging.DEBUG)
+
+    LOGGER = logging.getLogger("test")
+    _test()
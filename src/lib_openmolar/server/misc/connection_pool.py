@@ -0,0 +1,344 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+provides ConnectionPools, which keeps psycopg2 connections open
+(one pool per database) so that server functions can reuse them.
+'''
+
+from contextlib import contextmanager
+import threading
+import time
+
+import psycopg2
+
+#: pooled connections identify themselves to postgres with this name
+APPLICATION_NAME = "openmolar_server_pool"
+
+class PoolExhaustedError(Exception):
+    '''
+    raised when no connection becomes available within the wait timeout.
+    '''
+    pass
+
+class _PooledConnection(object):
+    '''
+    a psycopg2 connection, and some housekeeping information
+    '''
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_used = time.time()
+
+    @property
+    def idle_time(self):
+        return time.time() - self.last_used
+
+    def close(self):
+        try:
+            self.conn.close()
+        except psycopg2.Error:
+            pass
+
+class ConnectionPool(object):
+    '''
+    a thread safe pool of connections to a single database.
+    connections are autocommit.
+    '''
+    def __init__(self, conn_atts, max_size=5, idle_timeout=300,
+    check_interval=30, wait_timeout=30):
+        self._conn_atts = conn_atts
+
+        #: the maximum number of connections (idle + in use)
+        self.max_size = max_size
+        #: idle connections older than this (in seconds) are closed
+        self.idle_timeout = idle_timeout
+        #: idle connections older than this are tested before reuse
+        self.check_interval = check_interval
+        #: how long to wait for a connection if max_size is reached
+        self.wait_timeout = wait_timeout
+
+        self._idle = []
+        self._in_use = 0
+        self._closed = False
+        self._lock = threading.Condition()
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.waits = 0
+
+    def _new_connection(self):
+        conn = psycopg2.connect(self._conn_atts)
+        try:
+            # functions such as create and drop do not support transactions
+            conn.autocommit = True
+        except AttributeError:
+            LOGGER.warning(
+                "no autocommit attribute in pyscopg2 - old version?")
+            conn.set_isolation_level(0)
+        self._lock.acquire()
+        self.created += 1
+        self._lock.release()
+        return _PooledConnection(conn)
+
+    def _is_healthy(self, pooled):
+        '''
+        test an idle connection before handing it out again.
+        '''
+        if pooled.conn.closed:
+            return False
+        if pooled.idle_time < self.check_interval:
+            return True
+        try:
+            cursor = pooled.conn.cursor()
+            cursor.execute("select 1")
+            cursor.close()
+            return True
+        except psycopg2.Error:
+            LOGGER.warning("discarding broken pooled connection")
+            return False
+
+    def _reap(self):
+        '''
+        close connections which have been idle too long.
+        caller must hold the lock.
+        '''
+        for pooled in self._idle[:]:
+            if pooled.idle_time > self.idle_timeout:
+                self._idle.remove(pooled)
+                pooled.close()
+                self.discarded += 1
+
+    def _reserve(self):
+        '''
+        wait until a connection may be used, and count it as in use.
+        returns an idle connection (which may be broken)
+        or None if a new connection should be made.
+        '''
+        self._lock.acquire()
+        try:
+            self._reap()
+            start = time.time()
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = self.wait_timeout - (time.time() - start)
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                    "no connection available after %s seconds"% (
+                        self.wait_timeout))
+                self.waits += 1
+                self._lock.wait(remaining)
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop()
+            return None
+        finally:
+            self._lock.release()
+
+    def _unreserve(self, discarded=0):
+        self._lock.acquire()
+        try:
+            self._in_use -= 1
+            self.discarded += discarded
+            self._lock.notify()
+        finally:
+            self._lock.release()
+
+    def acquire(self):
+        '''
+        get a connection from the pool, creating one if none are idle.
+        (idle connections are tested without holding the pool's lock, so
+        other threads are not held up by a slow or broken connection)
+        '''
+        while True:
+            pooled = self._reserve()
+            if pooled is None:
+                break
+            if self._is_healthy(pooled):
+                self._lock.acquire()
+                self.reused += 1
+                self._lock.release()
+                return pooled
+            pooled.close()
+            self._unreserve(discarded=1)
+
+        try:
+            return self._new_connection()
+        except:
+            self._unreserve()
+            raise
+
+    def release(self, pooled, discard=False):
+        '''
+        return a connection to the pool.
+        if discard is True (or the connection is closed) it is thrown away.
+        '''
+        self._lock.acquire()
+        try:
+            self._in_use -= 1
+            if discard or self._closed or pooled.conn.closed:
+                pooled.close()
+                self.discarded += 1
+            else:
+                pooled.last_used = time.time()
+                self._idle.append(pooled)
+            self._reap()
+            self._lock.notify()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        '''
+        close all idle connections. (in use connections are discarded
+        when they are released)
+        '''
+        self._lock.acquire()
+        try:
+            self._closed = True
+            for pooled in self._idle:
+                pooled.close()
+                self.discarded += 1
+            self._idle = []
+        finally:
+            self._lock.release()
+
+    @property
+    def statistics(self):
+        '''
+        a dictionary of information about this pool
+        '''
+        self._lock.acquire()
+        try:
+            return {
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max_size": self.max_size,
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "waits": self.waits,
+                }
+        finally:
+            self._lock.release()
+
+
+class ConnectionPools(object):
+    '''
+    a collection of :doc:`ConnectionPool` objects, keyed by database name.
+    all connections are made as the postgres user given in the server config.
+    '''
+    def __init__(self, config):
+        self.config = config
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def __conn_atts(self, dbname):
+        '''
+        has to be a private function because of the password!
+        '''
+        return ("host='%s' user='%s' port='%s' password='%s' dbname='%s' "
+            "application_name='%s'"% (
+            self.config.postgres_host, self.config.postgres_user,
+            self.config.postgres_port,
+            self.config.postgres_pass, dbname, APPLICATION_NAME))
+
+    def pool(self, dbname):
+        '''
+        the pool for database dbname (created if necessary)
+        '''
+        self._lock.acquire()
+        try:
+            try:
+                return self._pools[dbname]
+            except KeyError:
+                LOGGER.debug("creating connection pool for '%s'"% dbname)
+                pool = ConnectionPool(self.__conn_atts(dbname),
+                    self.config.pool_max_size, self.config.pool_idle_timeout)
+                self._pools[dbname] = pool
+                return pool
+        finally:
+            self._lock.release()
+
+    @contextmanager
+    def connection(self, dbname="openmolar_master"):
+        '''
+        a context manager giving a pooled connection to dbname.
+
+        usage
+        with pools.connection(dbname) as conn:
+            cursor = conn.cursor()
+        '''
+        pool = self.pool(dbname)
+        pooled = pool.acquire()
+        discard = False
+        try:
+            yield pooled.conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            pool.release(pooled, discard)
+
+    def close(self, dbname):
+        '''
+        close the pool of connections to dbname
+        (necessary before the database can be dropped)
+        '''
+        self._lock.acquire()
+        try:
+            pool = self._pools.pop(dbname, None)
+        finally:
+            self._lock.release()
+        if pool is not None:
+            LOGGER.debug("closing connection pool for '%s'"% dbname)
+            pool.close()
+
+    @property
+    def statistics(self):
+        '''
+        a dictionary {dbname: statistics} for all pools
+        '''
+        self._lock.acquire()
+        try:
+            pools = self._pools.items()
+        finally:
+            self._lock.release()
+        stats = {}
+        for dbname, pool in pools:
+            stats[dbname] = pool.statistics
+        return stats
+
+def _test():
+    from lib_openmolar.server.misc.om_server_config import OMServerConfig
+    pools = ConnectionPools(OMServerConfig())
+    for i in range(3):
+        with pools.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("select 1")
+            LOGGER.debug(cursor.fetchone())
+    LOGGER.debug(pools.statistics)
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level = logging.DEBUG)
+
+    LOGGER = logging.getLogger("test")
+    _test()
@@ -0,0 +1,228 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+provides JobRunner, which runs long server functions (backups etc.)
+in background threads, so that the xmlrpc request can return immediately.
+'''
+
+import logging
+import threading
+import time
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+
+# jobs currently running, keyed by thread ident
+_RUNNING = {}
+
+def current_job():
+    '''
+    the job being run by the calling thread (or None)
+    '''
+    return _RUNNING.get(threading.current_thread().ident)
+
+def report_progress(done, total):
+    '''
+    called by server functions to say how far through a job they are.
+    does nothing if the function is not running as a job.
+    '''
+    job = current_job()
+    if job is not None and total:
+        job.progress = float(done) / total
+
+class Job(object):
+    '''
+    a function running (or waiting to run) in a background thread.
+    '''
+    def __init__(self, job_id, method, dbname, user):
+        self.id = job_id
+        self.method = method
+        self.dbname = dbname
+        self.user = user
+        self.state = QUEUED
+        self.progress = None
+        self.log = []
+        self.payload = None
+        self.queued_time = time.time()
+        self.start_time = None
+        self.end_time = None
+
+    def __repr__(self):
+        return "Job %s (%s on %s) - %s"% (
+            self.id, self.method, self.dbname, self.state)
+
+    def status(self, log_from=0):
+        '''
+        a dictionary describing the job.
+        only log lines from index log_from onwards are included, so that
+        clients can poll for new lines.
+        '''
+        return {
+            "id": self.id,
+            "method": self.method,
+            "dbname": self.dbname,
+            "user": self.user,
+            "state": self.state,
+            "progress": self.progress,
+            "log": self.log[log_from:],
+            "log_count": len(self.log),
+            "queued": self.queued_time,
+            "started": self.start_time,
+            "finished": self.end_time,
+            "payload": self.payload,
+            }
+
+class _JobLogHandler(logging.Handler):
+    '''
+    copies log records emitted by a job's thread to the job's log.
+    '''
+    def __init__(self):
+        logging.Handler.__init__(self, logging.INFO)
+        self.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+
+    def emit(self, record):
+        job = current_job()
+        if job is not None:
+            job.log.append(self.format(record))
+
+class JobRunner(object):
+    '''
+    runs functions in background threads.
+    at most jobs_per_database jobs run concurrently on any one database,
+    others wait their turn.
+    finished jobs are kept (for later retrieval of results)
+    until there are more than keep_finished of them.
+    '''
+    def __init__(self, jobs_per_database=1, keep_finished=50):
+        self.jobs_per_database = jobs_per_database
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._semaphores = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._log_handler = _JobLogHandler()
+        LOGGER.addHandler(self._log_handler)
+
+    def _semaphore(self, dbname):
+        '''
+        caller must hold the lock
+        '''
+        try:
+            return self._semaphores[dbname]
+        except KeyError:
+            sem = threading.BoundedSemaphore(self.jobs_per_database)
+            self._semaphores[dbname] = sem
+            return sem
+
+    def start(self, method, dbname, user, func):
+        '''
+        run func (which should take no arguments and return a PayLoad)
+        in a background thread.
+        returns the job id.
+        '''
+        self._lock.acquire()
+        try:
+            job = Job(self._next_id, method, dbname, user)
+            self._next_id += 1
+            self._jobs[job.id] = job
+            semaphore = self._semaphore(dbname)
+        finally:
+            self._lock.release()
+
+        thread = threading.Thread(target=self._run,
+            args=(job, semaphore, func), name="om_job_%d"% job.id)
+        thread.daemon = True
+        thread.start()
+        LOGGER.info("started %s"% job)
+        return job.id
+
+    def _run(self, job, semaphore, func):
+        semaphore.acquire()
+        try:
+            job.state = RUNNING
+            job.start_time = time.time()
+            _RUNNING[threading.current_thread().ident] = job
+            job.payload = func()
+        finally:
+            _RUNNING.pop(threading.current_thread().ident, None)
+            job.end_time = time.time()
+            job.state = FINISHED
+            semaphore.release()
+            LOGGER.info("%s (%.1f seconds)"% (job,
+                job.end_time - job.start_time))
+            self._prune()
+
+    def _prune(self):
+        '''
+        forget the oldest finished jobs
+        '''
+        self._lock.acquire()
+        try:
+            finished = sorted([job for job in self._jobs.itervalues()
+                if job.state == FINISHED], key=lambda job: job.end_time)
+            for job in finished[:-self.keep_finished]:
+                del self._jobs[job.id]
+        finally:
+            self._lock.release()
+
+    def job(self, job_id):
+        '''
+        the job with this id.
+        raises a KeyError if unknown (or forgotten)
+        '''
+        return self._jobs[job_id]
+
+    @property
+    def jobs(self):
+        '''
+        all jobs known to the runner, in order of submission
+        '''
+        self._lock.acquire()
+        try:
+            return sorted(self._jobs.values(), key=lambda job: job.id)
+        finally:
+            self._lock.release()
+
+def _test():
+    runner = JobRunner()
+    def func():
+        for i in range(3):
+            LOGGER.info("step %d"% i)
+            report_progress(i+1, 3)
+            time.sleep(0.1)
+        return "done"
+    job_ids = [runner.start("test", "openmolar_demo", "test_user", func)
+        for i in range(2)]
+    time.sleep(0.05)
+    for job_id in job_ids:
+        LOGGER.debug(runner.job(job_id).status())
+    time.sleep(1)
+    for job_id in job_ids:
+        LOGGER.debug(runner.job(job_id).status())
+
+if __name__ == "__main__":
+    logging.basicConfig(level = logging.DEBUG)
+
+    LOGGER = logging.getLogger("test")
+    _test()
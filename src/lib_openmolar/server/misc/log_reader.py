@@ -0,0 +1,191 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+read parts of the server log without loading the whole file.
+
+records are written by lib_openmolar.server.misc.logger in the format
+"date time,ms LEVEL message". Lines which do not start with a timestamp
+(eg. tracebacks) belong to the record above them.
+
+both functions return a dictionary
+    records - a list of (offset, level, text)
+    start   - the byte offset where the returned section starts
+    end     - the byte offset where the returned section ends
+    size    - the size of the file
+    rotated - True if the file is smaller than the offset asked for
+              (the log has been rotated since the last read)
+
+to page backwards, pass start as "before" to tail.
+to follow the log, pass end as "offset" to read_range.
+'''
+
+import logging
+import os
+import re
+
+from lib_openmolar.server.misc.logger import LOCATION
+
+RECORD_START = re.compile(
+    r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d+ ([A-Z]+) ")
+
+#: the initial number of bytes read back from the end of the file
+BLOCK_SIZE = 8192
+
+#: tail gives up looking for matching records after this many bytes
+MAX_SCAN = 4 * 1024 * 1024
+
+def _level_number(level):
+    '''
+    the numeric value of a level name (eg. "WARNING" -> 30)
+    '''
+    if not level:
+        return 0
+    number = logging.getLevelName(level.upper())
+    if not isinstance(number, int):
+        raise ValueError("unknown log level '%s'"% level)
+    return number
+
+def _records(data, offset):
+    '''
+    split data (which starts at byte offset in the file) into records.
+    returns a list of [offset, level, text]
+    lines before the first timestamp have a level of None.
+    '''
+    records = []
+    for line in data.splitlines(True):
+        match = RECORD_START.match(line)
+        if match or not records:
+            records.append([offset, match.group(1) if match else None, line])
+        else:
+            records[-1][2] += line
+        offset += len(line)
+    return records
+
+def _filter(records, min_level):
+    if not min_level:
+        return records
+    return [record for record in records
+        if record[1] and _level_number(record[1]) >= min_level]
+
+def _result(records, start, end, size, rotated=False):
+    return {
+        "records": [tuple(record) for record in records],
+        "start": start,
+        "end": end,
+        "size": size,
+        "rotated": rotated,
+        }
+
+def tail(lines=200, before=-1, level="", path=LOCATION):
+    '''
+    the last "lines" records before byte offset "before"
+    (-1 means the end of the file).
+    if level is given (eg. "WARNING"), only records of that level or above
+    are returned.
+    '''
+    min_level = _level_number(level)
+    f = open(path, "rb")
+    try:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        end = size if before < 0 else min(before, size)
+        block = BLOCK_SIZE
+        while True:
+            pos = max(0, end - block)
+            f.seek(pos)
+            data = f.read(end - pos)
+            skip = 0
+            if pos > 0:
+                # the first line is (probably) incomplete
+                skip = data.find("\n") + 1
+            records = _records(data[skip:], pos + skip)
+            if pos > 0 and records and records[0][1] is None:
+                # lines belonging to a record which started further back
+                records.pop(0)
+            matching = _filter(records, min_level)
+            if (len(matching) >= lines or pos == 0 or
+            end - pos >= MAX_SCAN):
+                break
+            block *= 2
+    finally:
+        f.close()
+
+    if len(matching) > lines:
+        matching = matching[-lines:]
+        start = matching[0][0]
+    else:
+        start = records[0][0] if records else end
+    return _result(matching, start, end, size)
+
+def read_range(offset=0, max_bytes=65536, level="", path=LOCATION):
+    '''
+    the records in (at most) max_bytes of the file, from byte offset "offset".
+    only complete lines are returned (unless the end of file is reached).
+    '''
+    min_level = _level_number(level)
+    f = open(path, "rb")
+    try:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        rotated = offset > size
+        if rotated:
+            offset = 0
+        f.seek(offset)
+        data = f.read(max_bytes)
+    finally:
+        f.close()
+
+    if offset + len(data) < size:
+        cut = data.rfind("\n") + 1
+        if cut > 0:
+            data = data[:cut]
+    records = _filter(_records(data, offset), min_level)
+    return _result(records, offset, offset + len(data), size, rotated)
+
+def _test():
+    import tempfile
+    fd, path = tempfile.mkstemp()
+    f = os.fdopen(fd, "w")
+    for i in range(1000):
+        f.write("2012-01-01 12:00:00,%03d %s message %d\n"% (
+            i%1000, "WARNING" if i % 100 == 0 else "DEBUG", i))
+        if i % 250 == 0:
+            f.write("Traceback (most recent call last):\n  oops\n")
+    f.close()
+    try:
+        result = tail(5, path=path)
+        LOGGER.debug([record[2] for record in result["records"]])
+        result = tail(3, level="WARNING", path=path)
+        LOGGER.debug([record[2] for record in result["records"]])
+        result = tail(3, before=result["start"], level="WARNING", path=path)
+        LOGGER.debug([record[2] for record in result["records"]])
+        result = read_range(result["end"], 200, path=path)
+        LOGGER.debug([record[2] for record in result["records"]])
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    logging.basicConfig(level = logging.DEBUG)
+
+    LOGGER = logging.getLogger("test")
+    _test()
@@ -25,7 +25,7 @@ import sys
 import ConfigParser
 
 from lib_openmolar.server.misc.password_generator import (
-    new_password, pass_hash)
+    new_password, make_hash)
 
 ROOT_DIR = "/etc/openmolar/"
 PASSWORD_FILE = os.path.join(ROOT_DIR, "manager_password.txt")
@@ -63,11 +63,21 @@ PASSWORD = '''
 # alter this whenever changing the config file format
 CONFIG_VERSION = "1.0"
 
+# used if the config file predates these options
+DEFAULT_POOL_SIZE = 8
+DEFAULT_QUEUE_DEPTH = 32
+DEFAULT_POOL_MAX_SIZE = 5
+DEFAULT_POOL_IDLE_TIMEOUT = 300
+DEFAULT_JOBS_PER_DATABASE = 1
+DEFAULT_AUTH_CACHE_TTL = 300
+
 class OMServerConfig(ConfigParser.SafeConfigParser):
-    def __init__(self):
+    def __init__(self, conf_file=CONF_FILE):
         ConfigParser.SafeConfigParser.__init__(self)
+        #: the path of the config file
+        self.conf_file = conf_file
         try:
-            self.readfp(open(CONF_FILE))
+            self.readfp(open(conf_file))
             self.__good_read = True
         except IOError as exc:
             self.__good_read = False
@@ -123,31 +133,39 @@ class OMServerConfig(ConfigParser.SafeConfigParser):
         self.set("postgresql", "port", "5432")
         self.set("postgresql", "user", "openmolar")
         self.set("postgresql", "password", new_password())
+        self.set("postgresql", "pool_max_size", str(DEFAULT_POOL_MAX_SIZE))
+        self.set("postgresql", "pool_idle_timeout",
+            str(DEFAULT_POOL_IDLE_TIMEOUT))
 
-        plain, hash = pass_hash(8)
+        plain = new_password(8)
         f = open(PASSWORD_FILE, "w")
         f.write(PASSWORD_HEADER)
         f.write(plain+"\n")
         f.close()
 
-        self.add_section("managers-md5")
-        self.set("managers-md5", "admin", hash)
+        self.add_section("managers")
+        self.set("managers", "admin", make_hash(plain))
 
         self.add_section("230server")
         self.set("230server", "listen", "")
         self.set("230server", "port", "1430")
+        self.set("230server", "pool_size", str(DEFAULT_POOL_SIZE))
+        self.set("230server", "queue_depth", str(DEFAULT_QUEUE_DEPTH))
+        self.set("230server", "jobs_per_database",
+            str(DEFAULT_JOBS_PER_DATABASE))
+        self.set("230server", "auth_cache_ttl", str(DEFAULT_AUTH_CACHE_TTL))
 
         self.add_section("ssl")
         self.set("ssl", "cert", os.path.join(KEY_DIR, "cert.pem"))
         self.set("ssl", "key", os.path.join(KEY_DIR, "privatekey.pem"))
 
     def write(self, f=None):
-        LOGGER.warning("writing conf file '%s'"% CONF_FILE)
-        f = open(CONF_FILE, "w")
+        LOGGER.warning("writing conf file '%s'"% self.conf_file)
+        f = open(self.conf_file, "w")
         f.write(HEADER)
         ConfigParser.SafeConfigParser.write(self, f)
         f.close()
-        os.chmod(CONF_FILE, 384)
+        os.chmod(self.conf_file, 384)
 
     @property
     def postgres_host(self):
@@ -177,6 +195,26 @@ class OMServerConfig(ConfigParser.SafeConfigParser):
         '''
         return self.get("postgresql", "password")
 
+    @property
+    def pool_max_size(self):
+        '''
+        the maximum number of connections the server keeps to each database
+        '''
+        try:
+            return self.getint("postgresql", "pool_max_size")
+        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+            return DEFAULT_POOL_MAX_SIZE
+
+    @property
+    def pool_idle_timeout(self):
+        '''
+        the time (in seconds) after which an unused connection is closed
+        '''
+        try:
+            return self.getint("postgresql", "pool_idle_timeout")
+        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+            return DEFAULT_POOL_IDLE_TIMEOUT
+
     @property
     def conf_dir(self):
         return SERVER_DIR
@@ -205,15 +243,62 @@ class OMServerConfig(ConfigParser.SafeConfigParser):
     def port(self):
         return self.getint("230server", "port")
 
+    @property
+    def pool_size(self):
+        '''
+        the number of worker threads handling requests concurrently.
+        if zero, requests are handled one at a time.
+        '''
+        try:
+            return self.getint("230server", "pool_size")
+        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+            return DEFAULT_POOL_SIZE
+
+    @property
+    def queue_depth(self):
+        '''
+        the number of requests allowed to wait for a free worker thread.
+        '''
+        try:
+            return self.getint("230server", "queue_depth")
+        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+            return DEFAULT_QUEUE_DEPTH
+
+    @property
+    def jobs_per_database(self):
+        '''
+        the number of background jobs (backups etc.) allowed to run
+        concurrently on any one database.
+        '''
+        try:
+            return self.getint("230server", "jobs_per_database")
+        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+            return DEFAULT_JOBS_PER_DATABASE
+
+    @property
+    def auth_cache_ttl(self):
+        '''
+        the time (in seconds) for which a verified username/password is
+        remembered, so that repeat requests skip the (slow) password hash.
+        '''
+        try:
+            return self.getint("230server", "auth_cache_ttl")
+        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+            return DEFAULT_AUTH_CACHE_TTL
+
     @property
     def managers(self):
         '''
         a list of user/passwords who authenticate with the server
-        passwords should be md5 hashes.
+        passwords are hashes from password_generator.make_hash
+        (section managers), or unsalted md5 hashes
+        (section managers-md5, used by older config files).
         '''
         managers = []
-        for manager, hash in self.items("managers-md5"):
-            managers.append((manager, hash))
+        for section in ("managers-md5", "managers"):
+            if self.has_section(section):
+                for manager, hash in self.items(section):
+                    managers.append((manager, hash))
         return managers
 
     def update(self):
@@ -240,6 +325,8 @@ def _test():
     conf.update()
     LOGGER.debug("installed = %s"% conf.is_installed)
     LOGGER.debug("managers - %s"% conf.managers)
+    LOGGER.debug("pool size %s queue depth %s"% (
+        conf.pool_size, conf.queue_depth))
     LOGGER.debug("postgres host %s"% conf.postgres_host)
     LOGGER.debug("postgres port %s"% conf.postgres_port)
     LOGGER.debug("postgres user %s"% conf.postgres_user)
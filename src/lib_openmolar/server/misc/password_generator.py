@@ -20,16 +20,92 @@
 ##                                                                           ##
 ###############################################################################
 
+import binascii
+import hashlib
+import hmac
+import os
 import random
 import string
 from hashlib import md5
 
+#: the default scheme used by make_hash
+DEFAULT_SCHEME = "pbkdf2_sha256"
+
+#: pbkdf2 iterations for new hashes
+PBKDF2_ITERATIONS = 100000
+
 def md5hash(str):
     '''
     returns a hash of a string.
     '''
     return md5(str).hexdigest()
 
+def to_bytes(value):
+    '''
+    passwords are hashed as utf8 encoded strings
+    '''
+    if isinstance(value, unicode):
+        return value.encode("utf8")
+    return value
+
+def _pbkdf2(password, salt, iterations):
+    return binascii.hexlify(
+        hashlib.pbkdf2_hmac("sha256", password, salt, iterations))
+
+def _scrypt(password, salt, n, r, p):
+    return binascii.hexlify(hashlib.scrypt(password, salt=salt, n=n, r=r, p=p))
+
+def make_hash(password, scheme=DEFAULT_SCHEME):
+    '''
+    returns a salted hash of password, in the form
+    "pbkdf2_sha256$iterations$salt$hash" or "scrypt$n$r$p$salt$hash"
+    (scrypt is only available if hashlib provides it)
+    '''
+    password = to_bytes(password)
+    salt = binascii.hexlify(os.urandom(16))
+    if scheme == "pbkdf2_sha256":
+        return "pbkdf2_sha256$%d$%s$%s"% (PBKDF2_ITERATIONS, salt,
+            _pbkdf2(password, salt, PBKDF2_ITERATIONS))
+    if scheme == "scrypt":
+        if not hasattr(hashlib, "scrypt"):
+            raise ValueError("scrypt is not available in this python")
+        n, r, p = 16384, 8, 1
+        return "scrypt$%d$%d$%d$%s$%s"% (n, r, p, salt,
+            _scrypt(password, salt, n, r, p))
+    if scheme == "md5":
+        return md5hash(password)
+    raise ValueError("unknown password hash scheme '%s'"% scheme)
+
+def verify_hash(password, stored):
+    '''
+    does password match stored (a hash returned by make_hash)?
+    plain md5 hex digests (as used by older config files) are also accepted.
+    '''
+    password = to_bytes(password)
+    parts = stored.split("$")
+    try:
+        if parts[0] == "pbkdf2_sha256":
+            iterations, salt, digest = parts[1:]
+            computed = _pbkdf2(password, salt, int(iterations))
+        elif parts[0] == "scrypt":
+            n, r, p, salt, digest = parts[1:]
+            computed = _scrypt(password, salt, int(n), int(r), int(p))
+        elif len(parts) == 1:
+            digest = stored
+            computed = md5hash(password)
+        else:
+            return False
+    except (ValueError, AttributeError):
+        # malformed hash, or scrypt unavailable
+        return False
+    return hmac.compare_digest(computed, digest)
+
+def is_legacy_hash(stored):
+    '''
+    True if stored is an unsalted md5 digest
+    '''
+    return "$" not in stored
+
 def new_password(length=20):
     '''
     returns a new password
@@ -0,0 +1,257 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+A compact, versioned binary format for :doc:`PayLoad` objects.
+
+Clients which understand this format say so with an http header
+(CODEC_HEADER), and receive an xmlrpclib.Binary instead of a pickle.
+Clients which do not send the header continue to receive pickles.
+
+The format is a 4 byte header
+
+    "OM" + version (1 byte) + flags (1 byte)
+
+followed by a tagged, length prefixed encoding of the tuple
+(method, permission, payload, exception). If flag FLAG_DEFLATE is set, the
+body is zlib compressed.
+'''
+
+import cPickle
+import struct
+import zlib
+import exceptions
+
+from lib_openmolar.server.misc.payload import PayLoad
+
+#: http header sent by clients to request a codec
+CODEC_HEADER = "X-Openmolar-Codec"
+
+#: the name of this codec (as sent in CODEC_HEADER)
+CODEC_NAME = "om1"
+
+MAGIC = "OM"
+VERSION = 1
+
+FLAG_DEFLATE = 1
+
+#: bodies larger than this (in bytes) are compressed
+COMPRESS_THRESHOLD = 1024
+
+class CodecError(Exception):
+    '''
+    raised when data cannot be decoded.
+    '''
+    pass
+
+_INT = struct.Struct(">q")
+_LEN = struct.Struct(">I")
+_FLOAT = struct.Struct(">d")
+
+_INT_MIN, _INT_MAX = -2**63, 2**63-1
+
+def _encode(obj, out):
+    '''
+    append the encoding of obj to list out
+    '''
+    type_ = type(obj)
+    if obj is None:
+        out.append("N")
+    elif obj is True:
+        out.append("T")
+    elif obj is False:
+        out.append("F")
+    elif type_ is str:
+        out.append("s")
+        out.append(_LEN.pack(len(obj)))
+        out.append(obj)
+    elif type_ is unicode:
+        data = obj.encode("utf8")
+        out.append("u")
+        out.append(_LEN.pack(len(data)))
+        out.append(data)
+    elif type_ in (int, long) and _INT_MIN <= obj <= _INT_MAX:
+        out.append("i")
+        out.append(_INT.pack(obj))
+    elif type_ is float:
+        out.append("d")
+        out.append(_FLOAT.pack(obj))
+    elif type_ in (list, tuple):
+        out.append("L" if type_ is list else "t")
+        out.append(_LEN.pack(len(obj)))
+        for item in obj:
+            _encode(item, out)
+    elif type_ is dict:
+        out.append("D")
+        out.append(_LEN.pack(len(obj)))
+        for key, value in obj.iteritems():
+            _encode(key, out)
+            _encode(value, out)
+    elif isinstance(obj, PayLoad):
+        # payloads are nested in the result of PermissionDispatcher.multicall
+        out.append("Y")
+        _encode(_payload_to_tuple(obj), out)
+    else:
+        # anything else (datetimes, big longs etc.) is pickled.
+        data = cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL)
+        out.append("P")
+        out.append(_LEN.pack(len(data)))
+        out.append(data)
+
+def _decode(data, pos):
+    '''
+    decode the object starting at data[pos]
+    returns (obj, new_pos)
+    '''
+    tag = data[pos]
+    pos += 1
+    if tag == "N":
+        return None, pos
+    if tag == "T":
+        return True, pos
+    if tag == "F":
+        return False, pos
+    if tag == "i":
+        return _INT.unpack_from(data, pos)[0], pos + 8
+    if tag == "d":
+        return _FLOAT.unpack_from(data, pos)[0], pos + 8
+    if tag in "suP":
+        length = _LEN.unpack_from(data, pos)[0]
+        pos += 4
+        chunk = data[pos:pos+length]
+        if len(chunk) != length:
+            raise CodecError("truncated data")
+        if tag == "u":
+            chunk = chunk.decode("utf8")
+        elif tag == "P":
+            chunk = cPickle.loads(chunk)
+        return chunk, pos + length
+    if tag == "Y":
+        value, pos = _decode(data, pos)
+        return _payload_from_tuple(value), pos
+    if tag in "LtD":
+        count = _LEN.unpack_from(data, pos)[0]
+        pos += 4
+        if tag == "D":
+            result = {}
+            for i in xrange(count):
+                key, pos = _decode(data, pos)
+                result[key], pos = _decode(data, pos)
+            return result, pos
+        items = []
+        for i in xrange(count):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        if tag == "t":
+            return tuple(items), pos
+        return items, pos
+    raise CodecError("unknown tag %r at position %d"% (tag, pos-1))
+
+def _exception_to_tuple(exc):
+    if exc is None:
+        return None
+    return (exc.__class__.__name__, str(exc))
+
+def _exception_from_tuple(value):
+    '''
+    recreate an exception.
+    builtin exception types are preserved, others become Exception.
+    '''
+    if value is None:
+        return None
+    name, message = value
+    klass = getattr(exceptions, name, None)
+    if not (isinstance(klass, type) and issubclass(klass, BaseException)):
+        klass = Exception
+        message = "%s: %s"% (name, message)
+    try:
+        return klass(message)
+    except Exception:
+        return Exception("%s: %s"% (name, message))
+
+def _payload_to_tuple(payload):
+    return (payload.method, payload.permission, payload._payload,
+        _exception_to_tuple(payload.exception))
+
+def _payload_from_tuple(value):
+    method, permission, payload_value, exc = value
+    payload = PayLoad(method)
+    payload.permission = permission
+    payload.set_payload(payload_value)
+    payload.set_exception(_exception_from_tuple(exc))
+    return payload
+
+def encode(payload, compress_threshold=COMPRESS_THRESHOLD):
+    '''
+    returns a string of bytes representing :doc:`PayLoad` payload
+    '''
+    out = []
+    _encode(_payload_to_tuple(payload), out)
+    body = "".join(out)
+    flags = 0
+    if compress_threshold is not None and len(body) > compress_threshold:
+        body = zlib.compress(body, 6)
+        flags |= FLAG_DEFLATE
+    return MAGIC + chr(VERSION) + chr(flags) + body
+
+def decode(data):
+    '''
+    returns the :doc:`PayLoad` encoded in data
+    '''
+    if data[:2] != MAGIC:
+        raise CodecError("not an openmolar payload")
+    version, flags = ord(data[2]), ord(data[3])
+    if version != VERSION:
+        raise CodecError("unsupported codec version %d"% version)
+    body = data[4:]
+    if flags & FLAG_DEFLATE:
+        body = zlib.decompress(body)
+    try:
+        value, pos = _decode(body, 0)
+    except (IndexError, struct.error) as error:
+        raise CodecError("corrupt payload - %s"% error)
+    return _payload_from_tuple(value)
+
+def accepts(header_value):
+    '''
+    does the value of a client's CODEC_HEADER include this codec?
+    '''
+    if not header_value:
+        return False
+    return CODEC_NAME in [val.strip() for val in header_value.split(",")]
+
+def _test():
+    payload = PayLoad("test")
+    payload.permission = True
+    payload.set_payload({"list": [1, 2.5, None, u"unicode \xa3"],
+        "tuple": (True, False, "string" * 500)})
+    data = encode(payload)
+    LOGGER.debug("encoded to %d bytes"% len(data))
+    LOGGER.debug("round trip ok? %s"% (
+        decode(data).payload == payload.payload))
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level = logging.DEBUG)
+
+    LOGGER = logging.getLogger("test")
+    _test()
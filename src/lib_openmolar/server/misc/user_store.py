@@ -0,0 +1,198 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+provides UserStore, the users allowed to authenticate with a
+:doc:`VerifyingServer`
+'''
+
+import ConfigParser
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+from lib_openmolar.server.misc import password_generator
+from lib_openmolar.server.misc.om_server_config import (
+    OMServerConfig, CONF_FILE)
+
+#: the user known to all clients (see lib_openmolar.common.connect.ProxyUser)
+DEFAULT_USER = ("default", password_generator.md5hash("eihjfosdhvpwi"))
+
+class UserStore(object):
+    '''
+    usernames and password hashes.
+
+    passwords are checked with password_generator.verify_hash, which is
+    deliberately slow. Once verified, a keyed digest of the credentials is
+    remembered for cache_ttl seconds, so that the many requests a client
+    makes do not each pay for the hash.
+
+    if load_config has been called, the store reloads the managers from
+    the config file whenever that file changes.
+    '''
+    def __init__(self, cache_ttl=300, check_interval=5):
+        #: seconds a verified username/password is remembered
+        self.cache_ttl = cache_ttl
+        #: minimum seconds between checks of the config file
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._users = dict([DEFAULT_USER])
+        self._config_users = set()
+        self._verified = {}
+        self._secret = os.urandom(32)
+
+        self._conf_file = None
+        self._conf_mtime = None
+        self._last_check = 0
+
+    def __contains__(self, username):
+        return username in self._users
+
+    @property
+    def usernames(self):
+        return sorted(self._users.keys())
+
+    def add_user(self, user, hash):
+        '''
+        add a user, with a hash from password_generator.make_hash
+        (or an md5 hex digest)
+        '''
+        LOGGER.debug("adding user %s"% user)
+        self._lock.acquire()
+        try:
+            self._users[user] = hash
+            self._verified.pop(user, None)
+        finally:
+            self._lock.release()
+
+    def load_config(self, config=None, conf_file=CONF_FILE):
+        '''
+        replace the users previously loaded from the config
+        with config.managers.
+        if config is None, it is read from conf_file.
+        either way, the users are reloaded from the same file if it changes.
+        '''
+        if config is None:
+            config = OMServerConfig(conf_file)
+        conf_file = config.conf_file
+        self.cache_ttl = config.auth_cache_ttl
+        managers = dict(config.managers)
+        legacy = [user for user, hash in managers.iteritems()
+            if password_generator.is_legacy_hash(hash)]
+        if legacy:
+            LOGGER.warning("unsalted md5 password hashes for users %s"%
+                sorted(legacy))
+
+        self._lock.acquire()
+        try:
+            for user in self._config_users:
+                self._users.pop(user, None)
+            self._users.update(managers)
+            self._config_users = set(managers.keys())
+            self._verified = {}
+            self._conf_file = conf_file
+            self._conf_mtime = self._mtime(conf_file)
+            self._last_check = time.time()
+        finally:
+            self._lock.release()
+        LOGGER.info("user list is %s"% self.usernames)
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def reload_if_changed(self):
+        '''
+        reload the users if the config file has changed since it was read.
+        '''
+        if self._conf_file is None:
+            return
+        now = time.time()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        mtime = self._mtime(self._conf_file)
+        if mtime != self._conf_mtime:
+            LOGGER.info("%s has changed - reloading users"% self._conf_file)
+            try:
+                self.load_config(conf_file=self._conf_file)
+            except (ConfigParser.Error, IOError):
+                # keep the current users, rather than lock everyone out.
+                LOGGER.exception("unable to reload users from %s"%
+                    self._conf_file)
+                self._conf_mtime = mtime
+
+    def _token(self, username, password):
+        return hmac.new(self._secret, "%s:%s"% (
+            password_generator.to_bytes(username),
+            password_generator.to_bytes(password)), hashlib.sha256).digest()
+
+    def check(self, username, password):
+        '''
+        returns True if password is correct for username
+        '''
+        self.reload_if_changed()
+        token = self._token(username, password)
+        now = time.time()
+
+        cached = self._verified.get(username)
+        if cached is not None:
+            cached_token, expiry = cached
+            if expiry > now and hmac.compare_digest(cached_token, token):
+                return True
+
+        stored = self._users.get(username)
+        if stored is None or not password_generator.verify_hash(
+        password, stored):
+            return False
+
+        self._lock.acquire()
+        try:
+            # don't cache if the user was changed whilst hashing
+            if self._users.get(username) == stored:
+                self._verified[username] = (token, now + self.cache_ttl)
+        finally:
+            self._lock.release()
+        return True
+
+def _test():
+    store = UserStore()
+    store.add_user("admin", password_generator.make_hash("password"))
+    for i in range(3):
+        start = time.time()
+        result = store.check("admin", "password")
+        LOGGER.debug("check %d - %s in %.4f seconds"% (
+            i, result, time.time()-start))
+    LOGGER.debug("wrong password - %s"% store.check("admin", "wrong"))
+    LOGGER.debug("default user - %s"% store.check("default", "eihjfosdhvpwi"))
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level = logging.DEBUG)
+
+    LOGGER = logging.getLogger("test")
+    _test()
@@ -24,9 +24,13 @@ import hashlib
 import random
 import pickle
 import string
+import threading
+import xmlrpclib
 
 from lib_openmolar.server.functions import FunctionStore
 from lib_openmolar.server.misc.payload import PayLoad
+from lib_openmolar.server.misc import payload_codec
+from lib_openmolar.server.misc.job_runner import JobRunner
 
 
 ## if you want a method to be displayed by the admin application's
@@ -39,17 +43,30 @@ MANAGER_METHODS = ( 'drop_db',
                     'truncate_all_tables',
                     )
 
+## methods which may be run as background jobs (see start_job).
+## the value is the index of the dbname parameter, or the name of the
+## database the method always acts upon.
+
+JOB_METHODS = { 'backup_db' : 0,
+                'create_db' : 0,
+                'create_demodb' : 'openmolar_demo',
+                'install_fuzzymatch' : 0,
+                'truncate_all_tables' : 0,
+                'truncate_demo' : 'openmolar_demo',
+                }
+
 
 class PermissionDispatcher(FunctionStore):
     '''
     wraps all the calls and checks if the user has permissions to run
     that method
     '''
-    _user = None
     PERMISSIONS = {}
 
     def __init__(self):
         FunctionStore.__init__(self)
+        self._local = threading.local()
+        self._jobs = JobRunner(self.config.jobs_per_database)
         self._init_permissions()
 
     def _init_permissions(self):
@@ -79,10 +96,26 @@ class PermissionDispatcher(FunctionStore):
         '''
         overwrite the special _dispatch function which is a wrapper
         around all functions.
-        returns a pickled object of type ..doc `Payload`
+        returns an object of type ..doc `Payload`, encoded as
+        xmlrpclib.Binary if the client accepts payload_codec, otherwise
+        pickled.
         '''
 
         LOGGER.debug("_dispatch called for method %s"% method)
+        pl = self._call(method, params)
+
+        if self.codec == payload_codec.CODEC_NAME:
+            LOGGER.debug("returning (encoded) %s"% pl)
+            return xmlrpclib.Binary(payload_codec.encode(pl))
+
+        LOGGER.debug("returning (pickled) %s"% pl)
+        return pickle.dumps(pl)
+
+    def _call(self, method, params):
+        '''
+        call method (if the user has permission)
+        returns a :doc:`PayLoad`
+        '''
         pl = PayLoad(method)
         pl.permission = self._get_permission(method)
         if pl.permission:
@@ -93,19 +126,108 @@ class PermissionDispatcher(FunctionStore):
                 pl.set_payload("openmolar server error - check the server log")
                 pl.set_exception(exc)
                 LOGGER.exception("exception in method %s"% method)
+        return pl
 
-        LOGGER.debug("returning (pickled) %s"% pl)
-        return pickle.dumps(pl)
+    def multicall(self, calls):
+        '''
+        execute several methods in one request.
+        calls is a sequence of (method, params)
+        permissions are checked for each method.
+        returns a list of :doc:`PayLoad`, one for each call.
+        '''
+        LOGGER.debug("multicall of %d methods"% len(calls))
+        payloads = []
+        for method, params in calls:
+            if method == "multicall":
+                raise ValueError("multicall cannot be nested")
+            payloads.append(self._call(method, params))
+        return payloads
+
+    def start_job(self, method, *params):
+        '''
+        run a long method (eg. backup_db) in a background thread.
+        returns a job id immediately, which the client passes to job_status.
+        the :doc:`PayLoad` of the method is in the status of the finished job.
+        '''
+        if method not in JOB_METHODS:
+            raise ValueError("method '%s' cannot be run as a job"% method)
+
+        dbname = JOB_METHODS[method]
+        if isinstance(dbname, int):
+            dbname = params[dbname]
+
+        # permissions are checked (by _call) in the job's thread,
+        # so the user is passed on.
+        user = self.user
+        def func():
+            self._remember_user(user)
+            return self._call(method, params)
+
+        return self._jobs.start(method, dbname, user, func)
+
+    def _may_see_job(self, job):
+        '''
+        users see only the jobs they started, "admin" sees them all.
+        '''
+        return self.user == "admin" or job.user == self.user
+
+    def job_status(self, job_id, log_from=0):
+        '''
+        a dictionary describing job job_id
+        (state, progress, log lines from index log_from onwards, and
+        once finished, the payload of the method).
+        '''
+        try:
+            job = self._jobs.job(job_id)
+        except KeyError:
+            job = None
+        if job is None or not self._may_see_job(job):
+            raise KeyError("no such job %s"% job_id)
+        return job.status(log_from)
+
+    def list_jobs(self):
+        '''
+        the status of the jobs started by the current user
+        (all jobs known to the server for "admin"),
+        without logs or payloads
+        '''
+        statuses = []
+        for job in self._jobs.jobs:
+            if not self._may_see_job(job):
+                continue
+            status = job.status()
+            status["log"] = []
+            status["payload"] = None
+            statuses.append(status)
+        return statuses
 
     @property
     def user(self):
-        return self._user
+        '''
+        the user who authenticated the request being handled by this thread.
+        '''
+        return getattr(self._local, "user", None)
 
     def _remember_user(self, user):
         '''
         remember the current user
+        (stored per thread, as requests may be handled concurrently)
+        '''
+        self._local.user = user
+
+    @property
+    def codec(self):
+        '''
+        the payload codec accepted by the client making the request being
+        handled by this thread (None means the client expects a pickle).
+        '''
+        return getattr(self._local, "codec", None)
+
+    def _remember_codec(self, codec):
+        '''
+        remember the codec the current client has asked for
         '''
-        self._user = user
+        self._local.codec = codec
 
     def management_functions(self):
         '''
@@ -33,7 +33,8 @@ import threading
 from lib_openmolar.server.daemon.service import Service
 from lib_openmolar.server.permission_dispatcher import PermissionDispatcher
 from lib_openmolar.server.misc import logger
-from lib_openmolar.server.servers.verifying_servers import VerifyingServerSSL
+from lib_openmolar.server.servers.verifying_servers import (
+    VerifyingServerSSL, ThreadPoolServerSSL)
 from lib_openmolar.server.misc.om_server_config import OMServerConfig
 
 
@@ -75,7 +76,11 @@ class OMServer(Service):
             raise IOError, "certificate '%s' and/or key '%s' not found"% (
                                                                 cert, key)
         try:
-            self.server = VerifyingServerSSL((loc, port), key, cert)
+            if config.pool_size > 0:
+                self.server = ThreadPoolServerSSL((loc, port), key, cert,
+                    config.pool_size, config.queue_depth)
+            else:
+                self.server = VerifyingServerSSL((loc, port), key, cert)
         except socket.error:
             LOGGER.error('Unable to start the server.' +
                 (' Port %d is in use' % port ) +
@@ -95,8 +100,7 @@ class OMServer(Service):
         self.start_(stderr=logger.LOCATION)
 
         self.server.register_instance(PermissionDispatcher())
-        for manager, hash in config.managers:
-            self.server.add_user(manager, hash)
+        self.server.load_users(config)
 
         server_thread = threading.Thread(target=self.server.serve_forever)
         server_thread.start()
@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+provides ThreadPoolMixIn, a bounded alternative to SocketServer.ThreadingMixIn
+'''
+
+import Queue
+import threading
+from SocketServer import BaseServer
+
+class ThreadPoolMixIn:
+    '''
+    Mix-in class to handle each request with a fixed pool of worker threads.
+
+    Unlike SocketServer.ThreadingMixIn, the number of threads is capped at
+    pool_size, and at most queue_depth accepted connections are allowed to
+    wait for a free worker. Connections arriving when the queue is full
+    are closed immediately.
+    '''
+
+    #: the number of worker threads
+    pool_size = 8
+
+    #: the number of accepted requests which may wait for a worker
+    queue_depth = 32
+
+    _request_queue = None
+    _workers = ()
+
+    def set_pool_size(self, pool_size, queue_depth):
+        '''
+        set the dimensions of the pool.
+        must be called before start_workers.
+        '''
+        self.pool_size = max(1, pool_size)
+        self.queue_depth = max(1, queue_depth)
+
+    def start_workers(self):
+        '''
+        start the worker threads (called by serve_forever if required)
+        '''
+        if self._workers:
+            return
+        LOGGER.info("starting a pool of %d worker threads (queue depth %d)"% (
+            self.pool_size, self.queue_depth))
+        self._request_queue = Queue.Queue(self.queue_depth)
+        workers = []
+        for i in range(self.pool_size):
+            worker = threading.Thread(target=self._work,
+                name="om_worker_%02d"% i)
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        self._workers = tuple(workers)
+
+    def stop_workers(self):
+        '''
+        tell each worker to finish once the queue is drained.
+        '''
+        for worker in self._workers:
+            self._request_queue.put(None)
+        self._workers = ()
+
+    def serve_forever(self, *args, **kwargs):
+        self.start_workers()
+        try:
+            BaseServer.serve_forever(self, *args, **kwargs)
+        finally:
+            self.stop_workers()
+
+    def process_request(self, request, client_address):
+        '''
+        overwrite BaseServer.process_request, so that the request is queued
+        for the next available worker thread.
+        '''
+        try:
+            self._request_queue.put_nowait((request, client_address))
+        except Queue.Full:
+            LOGGER.warning(
+                "request queue full - dropping connection from %s"% (
+                client_address,))
+            self.shutdown_request(request)
+
+    def _work(self):
+        '''
+        the loop run by each worker thread.
+        '''
+        while True:
+            item = self._request_queue.get()
+            if item is None:
+                break
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    @property
+    def pending_requests(self):
+        '''
+        the number of requests waiting for a worker thread
+        '''
+        if self._request_queue is None:
+            return 0
+        return self._request_queue.qsize()
@@ -21,16 +21,21 @@
 ###############################################################################
 
 from base64 import b64decode
-from hashlib import md5
 import pickle
+import select
 import socket
 import ssl
+import time
 from SocketServer import BaseServer
 from SimpleXMLRPCServer import (
     SimpleXMLRPCServer,
     SimpleXMLRPCDispatcher,
     SimpleXMLRPCRequestHandler)
 
+from lib_openmolar.server.servers.thread_pool import ThreadPoolMixIn
+from lib_openmolar.server.misc import payload_codec
+from lib_openmolar.server.misc.user_store import UserStore
+
 
 def ping():
     '''
@@ -45,7 +50,10 @@ class VerifyingServer(SimpleXMLRPCServer):
     which enforces user authentication
     '''
 
-    USERDICT = {"default":md5("eihjfosdhvpwi").hexdigest()}
+    users = None
+    '''
+    the :doc:`UserStore` of users who may authenticate with this server
+    '''
 
     registered_instance = None
     '''
@@ -55,10 +63,13 @@ class VerifyingServer(SimpleXMLRPCServer):
     _remember_user(user)
     '''
 
-    def __init__(self, addr):
+    def __init__(self, addr, requestHandler=None):
+        if requestHandler is None:
+            requestHandler = VerifyingRequestHandler
         SimpleXMLRPCDispatcher.__init__(self)
-        SimpleXMLRPCServer.__init__(self, addr, VerifyingRequestHandler)
+        SimpleXMLRPCServer.__init__(self, addr, requestHandler)
         self.logRequests = False # the request handler logs enough detail
+        self.users = UserStore()
 
         self.register_function(ping, "ping")
 
@@ -80,12 +91,18 @@ class VerifyingServer(SimpleXMLRPCServer):
 
     def add_user(self, user, hash):
         '''
-        add a user to the userdict
-        password should be MD5 hashed.
+        add a user to the user store
+        hash should be from password_generator.make_hash (or an md5 digest)
+        '''
+        self.users.add_user(user, hash)
+        LOGGER.debug("current user list is %s"% self.users.usernames)
+
+    def load_users(self, config=None):
+        '''
+        load the users from OMServerConfig.managers.
+        they are reloaded automatically if the config file changes.
         '''
-        LOGGER.debug("adding user %s with hashed pass %s"% (user, hash))
-        self.USERDICT[user] = hash
-        LOGGER.debug("current user list is %s"% sorted(self.USERDICT.keys()))
+        self.users.load_config(config)
 
 
 class VerifyingServerSSL(VerifyingServer):
@@ -94,10 +111,10 @@ class VerifyingServerSSL(VerifyingServer):
     which enforces ssl connection, and user authentication
     '''
 
-    def __init__(self, addr, KEYFILE, CERTFILE):
+    def __init__(self, addr, KEYFILE, CERTFILE, requestHandler=None):
         SimpleXMLRPCDispatcher.__init__(self)
 
-        VerifyingServer.__init__(self, addr)
+        VerifyingServer.__init__(self, addr, requestHandler)
         self.socket = ssl.wrap_socket(
             socket.socket(self.address_family, self.socket_type),
             server_side=True,
@@ -110,6 +127,18 @@ class VerifyingServerSSL(VerifyingServer):
         self.server_bind()
         self.server_activate()
 
+class ThreadPoolServerSSL(ThreadPoolMixIn, VerifyingServerSSL):
+    '''
+    a :doc:`VerifyingServerSSL` which handles requests concurrently,
+    using a bounded pool of worker threads.
+    As other clients are not blocked, connections are kept alive
+    (see :doc:`KeepAliveRequestHandler`).
+    '''
+    def __init__(self, addr, KEYFILE, CERTFILE, pool_size=8, queue_depth=32):
+        VerifyingServerSSL.__init__(self, addr, KEYFILE, CERTFILE,
+            KeepAliveRequestHandler)
+        self.set_pool_size(pool_size, queue_depth)
+
 class VerifyingRequestHandler(SimpleXMLRPCRequestHandler):
     '''
     Request Handler that verifies username and password passed to
@@ -122,6 +151,7 @@ class VerifyingRequestHandler(SimpleXMLRPCRequestHandler):
         if SimpleXMLRPCRequestHandler.parse_request(self):
             # next we authenticate
             if self.authenticate(self.headers):
+                self.set_codec(self.headers.get(payload_codec.CODEC_HEADER))
                 return True
             else:
                 # if authentication fails, tell the client
@@ -159,11 +189,10 @@ class VerifyingRequestHandler(SimpleXMLRPCRequestHandler):
         '''
         LOGGER.debug("checking_user %s"% username)
         self.set_proxy_user()
-        if username in self.server.USERDICT:
-            if self.server.USERDICT[username] == md5(password).hexdigest():
-                self.set_proxy_user(username)
-                LOGGER.debug("authenticated user '%s'"% username)
-                return True
+        if self.server.users.check(username, password):
+            self.set_proxy_user(username)
+            LOGGER.debug("authenticated user '%s'"% username)
+            return True
         LOGGER.error("authenticate failure for user '%s'"% username)
         return False
 
@@ -171,9 +200,79 @@ class VerifyingRequestHandler(SimpleXMLRPCRequestHandler):
         '''
         when a user authenticates, make the username accessible to the
         registered functions
+        (the registered instance remembers the user for this thread only)
         '''
         self.server.registered_instance._remember_user(user)
 
+    def set_codec(self, header_value):
+        '''
+        tell the registered instance whether the client understands
+        the binary payload codec.
+        '''
+        if not getattr(self.server, "HAS_SMART_INSTANCE", False):
+            return
+        codec = payload_codec.CODEC_NAME if payload_codec.accepts(
+            header_value) else None
+        try:
+            self.server.registered_instance._remember_codec(codec)
+        except AttributeError:
+            pass
+
+class KeepAliveRequestHandler(VerifyingRequestHandler):
+    '''
+    A :doc:`VerifyingRequestHandler` which speaks HTTP/1.1, so that clients
+    can send many requests over one (ssl) connection.
+
+    An open connection occupies a worker thread of the server's pool, so
+    idle connections are closed after idle_timeout seconds, or as soon as
+    other connections are waiting for a worker. Responses sent whilst
+    connections are waiting tell the client to close the connection.
+    '''
+    protocol_version = "HTTP/1.1"
+
+    #: seconds allowed to read a request (once it has started)
+    timeout = 15
+
+    #: seconds an idle connection is kept open
+    idle_timeout = 5
+
+    #: seconds between checks for waiting connections when idle
+    poll_interval = 0.2
+
+    def _others_waiting(self):
+        return getattr(self.server, "pending_requests", 0) > 0
+
+    def handle(self):
+        self.close_connection = 1
+        self.handle_one_request()
+        while not self.close_connection and self._wait_for_request():
+            self.handle_one_request()
+
+    def _wait_for_request(self):
+        '''
+        wait for the client to send another request.
+        returns False if it doesn't within idle_timeout seconds, or if
+        other connections are waiting for a worker.
+        '''
+        deadline = time.time() + self.idle_timeout
+        while time.time() < deadline:
+            if self._others_waiting():
+                return False
+            pending = getattr(self.connection, "pending", None)
+            if pending is not None and pending():
+                return True
+            readable = select.select([self.connection], [], [],
+                self.poll_interval)[0]
+            if readable:
+                return True
+        return False
+
+    def end_headers(self):
+        if self._others_waiting():
+            # send_header sets close_connection
+            self.send_header("Connection", "close")
+        VerifyingRequestHandler.end_headers(self)
+
 def _test():
     s = VerifyingServer(("",1430))
     s.serve_forever()
@@ -182,7 +281,7 @@ def _test_ssl():
     s = VerifyingServerSSL(("",1430),
         '/usr/share/openmolar/privatekey.pem',
         '/usr/share/openmolar/cert.pem')
-    LOGGER.debug(s.USERDICT)
+    LOGGER.debug(s.users.usernames)
 
     s.serve_forever()
 
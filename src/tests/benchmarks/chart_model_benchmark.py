@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+times the lookups a chart widget makes for each tooth when it paints
+(has_properties, get_restorations, get_root_info, get_perio_data)
+for a heavily restored mouth, with the indexed ChartDataModel and with
+the linear scan it replaced.
+
+usage (from this directory)  python chart_model_benchmark.py
+'''
+
+import os, sys
+
+lib_openmolar_path = os.path.abspath("../../")
+if not lib_openmolar_path == sys.path[0]:
+    sys.path.insert(0, lib_openmolar_path)
+
+import random
+import timeit
+
+import lib_openmolar.client
+
+from lib_openmolar.client.qt4.widgets.chart_widgets.chart_data_model import \
+    ChartDataModel
+from lib_openmolar.client.qt4.widgets.chart_widgets.perio_data import \
+    PerioData
+
+REPEATS = 20
+
+FILLS = ("MOD,AM", "O,CO", "B,GL", "DO,AM", "MO,CO", "L,GL", "FS")
+
+class LinearChartDataModel(ChartDataModel):
+    '''
+    the lookups as they were before the model was indexed
+    '''
+    def has_properties(self, tooth_id):
+        try:
+            self.get_properties(tooth_id).next()
+        except StopIteration:
+            return False
+        return True
+
+    def get_properties(self, tooth_id):
+        for prop in self.data:
+            if prop.tooth_id == tooth_id:
+                yield prop
+
+    def get_restorations(self, tooth_id):
+        for prop in self.get_properties(tooth_id):
+            if prop.type in (prop.FILLING, prop.CROWN):
+                yield prop
+
+    def get_root_info(self, tooth_id):
+        for prop in self.get_properties(tooth_id):
+            if prop.type == prop.ROOT:
+                yield prop
+
+    def get_perio_data(self, tooth_id):
+        for prop in self.perio_data:
+            if prop.tooth_id == tooth_id:
+                yield prop
+
+def tooth_ids():
+    ids = []
+    for row in SETTINGS.TOOTH_GRID:
+        ids += [tooth_id for tooth_id in row if tooth_id != 0]
+    return ids
+
+def heavily_restored(model, props_per_tooth=6):
+    '''
+    a full mouth, with several restorations and 6 point pocketing
+    for every permanent tooth
+    '''
+    random.seed(1)
+    model.begin_update()
+    for tooth_id in SETTINGS.TOOTH_GRID[1] + SETTINGS.TOOTH_GRID[2]:
+        for i in range(props_per_tooth):
+            model.add_fill_from_string(tooth_id, random.choice(FILLS))
+        model.add_perio_data(tooth_id, PerioData.POCKETING,
+            tuple([random.randint(1, 8) for i in range(6)]))
+    model.end_update()
+    return model
+
+def paint(model, ids):
+    '''
+    the lookups made by one repaint of a chart
+    '''
+    for tooth_id in ids:
+        if model.has_properties(tooth_id):
+            list(model.get_restorations(tooth_id))
+        list(model.get_root_info(tooth_id))
+        list(model.get_perio_data(tooth_id))
+
+def time_it(model, ids):
+    return min(timeit.repeat(lambda: paint(model, ids), number=REPEATS,
+        repeat=3)) / REPEATS * 1000
+
+def main():
+    ids = tooth_ids()
+    print "%-10s %12s %12s %12s"% (
+        "per tooth", "properties", "linear (ms)", "indexed (ms)")
+    for props_per_tooth in (1, 6, 20):
+        linear = heavily_restored(LinearChartDataModel(), props_per_tooth)
+        indexed = heavily_restored(ChartDataModel(), props_per_tooth)
+        for tooth_id in ids:
+            assert (list(linear.get_restorations(tooth_id)) ==
+                list(indexed.get_restorations(tooth_id)))
+        print "%-10d %12d %12.3f %12.3f"% (props_per_tooth,
+            len(indexed.data), time_it(linear, ids), time_it(indexed, ids))
+
+if __name__ == "__main__":
+    main()
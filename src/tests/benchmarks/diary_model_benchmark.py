@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2012, Neil Wallace <neil@openmolar.com>                        ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+
+'''
+times the row arithmetic a diary widget does when it is scrolled in the
+MONTH, FORTNIGHT and YEAR views (rowCount and row_from_date, see
+DiaryWidget.set_scroll_values) for diaries spanning several years,
+with the closed form DiaryDataModel and with the loops it replaced.
+
+usage (from this directory)  python diary_model_benchmark.py
+'''
+
+import os, sys
+
+lib_openmolar_path = os.path.abspath("../../")
+if not lib_openmolar_path == sys.path[0]:
+    sys.path.insert(0, lib_openmolar_path)
+
+import timeit
+
+import lib_openmolar.client
+
+from PyQt4 import QtCore
+
+from lib_openmolar.client.db_orm.diary import DiaryDataModel
+
+REPEATS = 5
+
+#: the number of scroll steps timed for each view
+SCROLLS = 200
+
+class LoopingDiaryDataModel(DiaryDataModel):
+    '''
+    the arithmetic as it was, stepping a date from start_date
+    '''
+    def rowCount(self, style):
+        if style in (self.MONTH, self.FORTNIGHT):
+            i =0
+            start = self.start_date
+            while start < self.end_date:
+                start = start.addDays(7)
+                i += 1
+            return i
+        if style == self.YEAR:
+            i = 0
+            start = self.start_date
+            while (
+                (start.year(), start.month()) <
+                (self.end_date.year(), self.end_date.month())
+            ):
+                i += 1
+                start = start.addMonths(1)
+            return i
+        return DiaryDataModel.rowCount(self, style)
+
+    def row_from_date(self, date, style):
+        if style in (self.MONTH, self.FORTNIGHT):
+            i = 0
+            start = self.start_date
+            while start <= date:
+                start = start.addDays(7)
+                i += 1
+            if style == self.MONTH:
+                i -= date.day()//7
+            return i
+        return DiaryDataModel.row_from_date(self, date, style)
+
+def model(model_class, years):
+    diary_model = model_class()
+    today = QtCore.QDate.currentDate()
+    diary_model.start_date = today.addYears(-years)
+    diary_model.end_date = today.addYears(years)
+    return diary_model
+
+def scroll(diary_model, style, dates):
+    '''
+    the calls made by set_scroll_values as the view is scrolled
+    '''
+    for date in dates:
+        diary_model.rowCount(style)
+        diary_model.row_from_date(date, style)
+
+def time_it(diary_model, style, dates):
+    return min(timeit.repeat(lambda: scroll(diary_model, style, dates),
+        number=REPEATS, repeat=3)) / REPEATS * 1000
+
+def main():
+    styles = ((DiaryDataModel.FORTNIGHT, "fortnight"),
+        (DiaryDataModel.MONTH, "month"), (DiaryDataModel.YEAR, "year"))
+    print "%-6s %-10s %14s %14s"% (
+        "years", "view", "looping (ms)", "closed (ms)")
+    for years in (1, 2, 5):
+        looping = model(LoopingDiaryDataModel, years)
+        closed = model(DiaryDataModel, years)
+        step = looping.start_date.daysTo(looping.end_date) // SCROLLS
+        dates = [looping.start_date.addDays(i * step)
+            for i in range(SCROLLS)]
+        for style, name in styles:
+            for date in dates:
+                assert (looping.row_from_date(date, style) ==
+                    closed.row_from_date(date, style))
+            assert looping.rowCount(style) == closed.rowCount(style)
+            print "%-6d %-10s %14.3f %14.3f"% (years, name,
+                time_it(looping, style, dates), time_it(closed, style, dates))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2010-2012, Neil Wallace <neil@openmolar.com>                   ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+'''
+compares the pickled and payload_codec transports for typical payloads.
+reports encode/decode times and the size of the xmlrpc response on the wire.
+
+usage (from this directory)  python payload_codec_benchmark.py
+'''
+
+import os, sys
+
+lib_openmolar_path = os.path.abspath("../../")
+if not lib_openmolar_path == sys.path[0]:
+    sys.path.insert(0, lib_openmolar_path)
+
+import pickle
+import timeit
+import xmlrpclib
+
+from lib_openmolar.server.misc.payload import PayLoad
+from lib_openmolar.server.misc import payload_codec
+
+SCHEMA = os.path.join(lib_openmolar_path, "..", "misc", "server", "schemas",
+    "latest_schema.sql")
+
+REPEATS = 50
+
+def admin_welcome_payload(n_databases=20):
+    '''
+    html similar to that returned by MessageFunctions.admin_welcome
+    '''
+    html = u"<html><body><table id='database_table'>"
+    for i in range(n_databases):
+        html += u'''
+            <tr class="even">
+                <td><b>openmolar_practice_%02d</b></td>
+                <td class="list"><table class="sessions"><tr>
+                <td>om_user</td><td>192.168.0.%d</td><td>openmolar</td>
+                </tr></table></td>
+                <td>1.0</td>
+                <td><form action="manage_openmolar_practice_%02d" method="get">
+                <button class="manageDBbut" type="submit">Database</button>
+                </form></td>
+            </tr>'''% (i, i, i)
+    return html + u"</table></body></html>"
+
+def login_roles_payload(n_roles=40):
+    return sorted(["om_user_%02d"% i for i in range(n_roles)] +
+        ["openmolar", "postgres", "om_demo"])
+
+def update_script_payload():
+    f = open(SCHEMA)
+    data = f.read()
+    f.close()
+    return data
+
+def pickle_transport(payload):
+    return xmlrpclib.dumps((pickle.dumps(payload),), methodresponse=True)
+
+def pickle_receive(response):
+    return pickle.loads(xmlrpclib.loads(response)[0][0])
+
+def codec_transport(payload):
+    return xmlrpclib.dumps(
+        (xmlrpclib.Binary(payload_codec.encode(payload)),),
+        methodresponse=True)
+
+def codec_receive(response):
+    return payload_codec.decode(xmlrpclib.loads(response)[0][0].data)
+
+def time_it(func, arg):
+    return min(timeit.repeat(lambda: func(arg), number=REPEATS,
+        repeat=3)) / REPEATS * 1000
+
+def main():
+    print "%-20s %-8s %12s %12s %12s"% (
+        "payload", "format", "encode (ms)", "decode (ms)", "bytes")
+    for method, value in (
+    ("admin_welcome", admin_welcome_payload()),
+    ("login_roles", login_roles_payload()),
+    ("get_update_script", update_script_payload()),
+    ):
+        payload = PayLoad(method)
+        payload.permission = True
+        payload.set_payload(value)
+        for name, send, receive in (
+        ("pickle", pickle_transport, pickle_receive),
+        ("om1", codec_transport, codec_receive),
+        ):
+            response = send(payload)
+            assert receive(response).payload == value
+            print "%-20s %-8s %12.3f %12.3f %12d"% (method, name,
+                time_it(send, payload), time_it(receive, response),
+                len(response))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2010-2012, Neil Wallace <neil@openmolar.com>                   ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+import os, sys
+
+lib_openmolar_path = os.path.abspath("../../")
+if not lib_openmolar_path == sys.path[0]:
+    sys.path.insert(0, lib_openmolar_path)
+
+import lib_openmolar.client
+
+from lib_openmolar.client.db_orm.diary.free_slots import (FreeSlot,
+    NO_JOINT_WAIT)
+
+import datetime
+import unittest
+
+def slot(hour, minute, length, diary_id=1, day=18):
+    return FreeSlot(datetime.datetime(2013, 3, day, hour, minute),
+        diary_id, length)
+
+class TestCase(unittest.TestCase):
+    def test_order(self):
+        slots = [slot(10, 0, 30, 2), slot(9, 0, 30), slot(10, 0, 30, 1),
+            slot(9, 0, 30, day=17)]
+        self.assertEqual([(s.date.day, s.mpm, s.diary_id)
+            for s in sorted(slots)],
+            [(17, 540, 1), (18, 540, 1), (18, 600, 1), (18, 600, 2)])
+
+    def test_properties(self):
+        free = slot(9, 30, 45)
+        self.assertEqual(free.day_no, 1) # a monday
+        self.assertEqual(free.dent, 1)
+        self.assertEqual(free.mpm, 570)
+        self.assertEqual(free.finish, datetime.datetime(2013, 3, 18, 10, 15))
+
+    def test_joint_after(self):
+        dent = slot(9, 0, 60)
+        hyg_slots = [slot(9, 20, 20, 2), slot(9, 40, 60, 2)]
+        best, wait = dent.best_joint(20, 30, hyg_slots)
+        self.assertEqual((best, wait), (hyg_slots[1], 20))
+
+    def test_joint_before(self):
+        dent = slot(10, 0, 60)
+        hyg_slots = [slot(8, 0, 30, 2), slot(9, 0, 50, 2)]
+        best, wait = dent.best_joint(30, 30, hyg_slots)
+        self.assertEqual((best, wait), (hyg_slots[1], 10))
+
+    def test_no_joint(self):
+        dent = slot(10, 0, 60)
+        hyg_slots = [slot(10, 0, 60, 2, day=19), slot(12, 0, 10, 2)]
+        self.assertEqual(dent.best_joint(30, 30, hyg_slots),
+            (None, NO_JOINT_WAIT))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2010-2012, Neil Wallace <neil@openmolar.com>                   ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+import os, sys
+
+lib_openmolar_path = os.path.abspath("../../")
+if not lib_openmolar_path == sys.path[0]:
+    sys.path.insert(0, lib_openmolar_path)
+
+from lib_openmolar.server.misc.payload import PayLoad
+from lib_openmolar.server.misc import payload_codec
+
+import datetime
+import unittest
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.payload = PayLoad("test_method")
+        self.payload.permission = True
+
+    def tearDown(self):
+        pass
+
+    def round_trip(self, value, **kwargs):
+        self.payload.set_payload(value)
+        data = payload_codec.encode(self.payload, **kwargs)
+        return payload_codec.decode(data)
+
+    def test_simple_types(self):
+        for value in (None, True, False, 0, -1, 2**40, 2**70, 1.5, "bytes",
+        u"unicode \xa3", datetime.date(2012, 1, 1)):
+            result = self.round_trip(value)
+            self.assertEqual(result.payload, value)
+            self.assertEqual(type(result.payload), type(value))
+
+    def test_containers(self):
+        value = {"list": [1, "a", None], "tuple": (u"b", (True, 2.0)),
+            3: {"nested": []}}
+        self.assertEqual(self.round_trip(value).payload, value)
+
+    def test_compression(self):
+        value = "<td>some html</td>" * 1000
+        self.payload.set_payload(value)
+        compressed = payload_codec.encode(self.payload)
+        plain = payload_codec.encode(self.payload, compress_threshold=None)
+        self.assertTrue(len(compressed) < len(plain))
+        self.assertEqual(payload_codec.decode(compressed).payload, value)
+
+    def test_nested_payloads(self):
+        inner = PayLoad("login_roles")
+        inner.permission = True
+        inner.set_payload(["om_demo", "openmolar"])
+        denied = PayLoad("drop_db")
+        result = self.round_trip([inner, denied])
+        self.assertEqual(result.payload[0].payload, inner.payload)
+        self.assertEqual(result.payload[0].method, "login_roles")
+        self.assertFalse(result.payload[1].permission)
+
+    def test_permission_and_exception(self):
+        self.payload.permission = False
+        self.payload.set_exception(ValueError("bad value"))
+        result = self.round_trip("secret")
+        self.assertFalse(result.permission)
+        self.assertEqual(result.payload, None)
+        self.assertTrue(isinstance(result.exception, ValueError))
+        self.assertEqual(result.exception_message, "bad value")
+
+    def test_corrupt_data(self):
+        self.assertRaises(payload_codec.CodecError,
+            payload_codec.decode, "XX\x01\x00")
+        data = payload_codec.encode(self.payload, compress_threshold=None)
+        self.assertRaises(payload_codec.CodecError,
+            payload_codec.decode, data[:-3])
+
+    def test_accepts(self):
+        self.assertTrue(payload_codec.accepts("om1"))
+        self.assertTrue(payload_codec.accepts("om2, om1"))
+        self.assertFalse(payload_codec.accepts(None))
+        self.assertFalse(payload_codec.accepts("pickle"))
+
+if __name__ == "__main__":
+    unittest.main()
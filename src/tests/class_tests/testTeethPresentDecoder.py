@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2010-2012, Neil Wallace <neil@openmolar.com>                   ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+import os, sys
+
+lib_openmolar_path = os.path.abspath("../../")
+if not lib_openmolar_path == sys.path[0]:
+    sys.path.insert(0, lib_openmolar_path)
+
+from lib_openmolar.common.db_orm import teeth_present_decoder
+from lib_openmolar.common.db_orm import TeethPresentDecoder
+
+import random
+import unittest
+
+#: all permanent teeth present
+ADULT_KEY = 0xffffffff0000
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.decoder = TeethPresentDecoder()
+        random.seed(1)
+        self.keys = [random.getrandbits(63) for i in range(200)]
+
+    def old_decode(self, int_val):
+        '''
+        the subtraction chain this class used to use
+        '''
+        bits = []
+        for exp in self.decoder.DENT_KEY:
+            bits.append(exp <= int_val)
+            if exp <= int_val:
+                int_val -= exp
+        return bits
+
+    def test_decode(self):
+        for key in self.keys + [0, ADULT_KEY]:
+            bit_array = self.decoder.decode(key)
+            self.assertEqual([bit_array.at(i) for i in range(64)],
+                self.old_decode(key))
+
+    def test_round_trip(self):
+        for key in self.keys:
+            self.assertEqual(
+                self.decoder.encode(self.decoder.decode(key)), key)
+
+    def test_counts(self):
+        self.assertEqual(self.decoder.count(ADULT_KEY), 32)
+        self.assertEqual(self.decoder.quadrant_counts(ADULT_KEY),
+            (8, 8, 8, 8))
+        for key in self.keys:
+            self.assertEqual(self.decoder.count(key), bin(key).count("1"))
+            self.assertEqual(sum(self.decoder.quadrant_counts(key)),
+                bin(key).count("1"))
+
+    def test_decode_many(self):
+        matrix = self.decoder.decode_many(self.keys)
+        for i, key in enumerate(self.keys):
+            row = matrix[i * 64:i * 64 + 64]
+            if teeth_present_decoder.numpy is not None:
+                row = matrix[i]
+            self.assertEqual(list(row), [int(bit) for bit in
+                self.old_decode(key)])
+
+    def test_quadrant_counts_many(self):
+        counts = self.decoder.quadrant_counts_many(self.keys)
+        for i, key in enumerate(self.keys):
+            self.assertEqual(tuple([int(count) for count in counts[i]]),
+                self.decoder.quadrant_counts(key))
+
+if __name__ == "__main__":
+    unittest.main()
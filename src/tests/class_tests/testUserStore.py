@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+##                                                                           ##
+##  Copyright 2010-2012, Neil Wallace <neil@openmolar.com>                   ##
+##                                                                           ##
+##  This program is free software: you can redistribute it and/or modify     ##
+##  it under the terms of the GNU General Public License as published by     ##
+##  the Free Software Foundation, either version 3 of the License, or        ##
+##  (at your option) any later version.                                      ##
+##                                                                           ##
+##  This program is distributed in the hope that it will be useful,          ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of           ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            ##
+##  GNU General Public License for more details.                             ##
+##                                                                           ##
+##  You should have received a copy of the GNU General Public License        ##
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.    ##
+##                                                                           ##
+###############################################################################
+
+
+import os, sys
+
+lib_openmolar_path = os.path.abspath("../../")
+if not lib_openmolar_path == sys.path[0]:
+    sys.path.insert(0, lib_openmolar_path)
+
+import __builtin__
+import logging
+__builtin__.LOGGER = logging.getLogger("test")
+
+from lib_openmolar.server.misc import password_generator
+from lib_openmolar.server.misc.user_store import UserStore
+
+import shutil
+import tempfile
+import time
+import unittest
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        # fewer iterations, to keep the tests quick
+        self.iterations = password_generator.PBKDF2_ITERATIONS
+        password_generator.PBKDF2_ITERATIONS = 1000
+        self.store = UserStore()
+        self.store.add_user("admin", password_generator.make_hash("secret"))
+
+    def tearDown(self):
+        password_generator.PBKDF2_ITERATIONS = self.iterations
+
+    def test_hashes(self):
+        hash_ = password_generator.make_hash("secret")
+        self.assertTrue(hash_.startswith("pbkdf2_sha256$"))
+        self.assertNotEqual(hash_, password_generator.make_hash("secret"))
+        self.assertTrue(password_generator.verify_hash("secret", hash_))
+        self.assertFalse(password_generator.verify_hash("wrong", hash_))
+
+    def test_legacy_md5(self):
+        hash_ = password_generator.md5hash("secret")
+        self.assertTrue(password_generator.is_legacy_hash(hash_))
+        self.assertTrue(password_generator.verify_hash("secret", hash_))
+        self.assertFalse(password_generator.verify_hash("wrong", hash_))
+
+    def test_malformed_hash(self):
+        self.assertFalse(
+            password_generator.verify_hash("secret", "pbkdf2_sha256$x"))
+
+    def test_check(self):
+        self.assertTrue(self.store.check("admin", "secret"))
+        self.assertTrue(self.store.check("admin", "secret")) # cached
+        self.assertFalse(self.store.check("admin", "wrong"))
+        self.assertFalse(self.store.check("nobody", "secret"))
+        self.assertTrue(self.store.check("default", "eihjfosdhvpwi"))
+
+    def test_unicode_credentials(self):
+        # the request handler decodes credentials to unicode
+        self.store.add_user("user", password_generator.make_hash(u"p\xe5ss"))
+        self.assertTrue(self.store.check(u"admin", u"secret"))
+        self.assertTrue(self.store.check(u"user", u"p\xe5ss"))
+        self.assertFalse(self.store.check(u"user", u"pass"))
+
+    def test_cache_expires(self):
+        self.store.cache_ttl = 0
+        self.assertTrue(self.store.check("admin", "secret"))
+        token, expiry = self.store._verified["admin"]
+        self.assertTrue(expiry <= time.time())
+        self.assertTrue(self.store.check("admin", "secret"))
+
+    def test_changed_password(self):
+        self.assertTrue(self.store.check("admin", "secret"))
+        self.store.add_user("admin", password_generator.make_hash("new"))
+        self.assertFalse(self.store.check("admin", "secret"))
+        self.assertTrue(self.store.check("admin", "new"))
+
+    def _write_conf(self, path, hash_):
+        f = open(path, "w")
+        f.write("[managers]\nmanager = %s\n"% hash_)
+        f.close()
+
+    def test_reload_conf_file(self):
+        conf_dir = tempfile.mkdtemp()
+        try:
+            conf_file = os.path.join(conf_dir, "server.conf")
+            self._write_conf(conf_file, password_generator.make_hash("one"))
+            self.store.load_config(conf_file=conf_file)
+            self.store.check_interval = 0
+            self.assertTrue(self.store.check("manager", "one"))
+
+            self._write_conf(conf_file, password_generator.make_hash("two"))
+            mtime = os.stat(conf_file).st_mtime + 10
+            os.utime(conf_file, (mtime, mtime))
+            self.assertTrue(self.store.check("manager", "two"))
+            self.assertFalse(self.store.check("manager", "one"))
+        finally:
+            shutil.rmtree(conf_dir)
+
+    def test_malformed_conf_file(self):
+        conf_dir = tempfile.mkdtemp()
+        try:
+            conf_file = os.path.join(conf_dir, "server.conf")
+            self._write_conf(conf_file, password_generator.make_hash("one"))
+            self.store.load_config(conf_file=conf_file)
+            self.store.check_interval = 0
+
+            f = open(conf_file, "w")
+            f.write("manager = no section header\n")
+            f.close()
+            mtime = os.stat(conf_file).st_mtime + 10
+            os.utime(conf_file, (mtime, mtime))
+            self.assertTrue(self.store.check("default", "eihjfosdhvpwi"))
+            self.assertTrue(self.store.check("manager", "one"))
+            self.assertEqual(self.store._conf_mtime,
+                os.stat(conf_file).st_mtime)
+        finally:
+            shutil.rmtree(conf_dir)
+
+    def test_separate_stores(self):
+        other = UserStore()
+        self.assertFalse("admin" in other)
+        self.assertTrue("admin" in self.store)
+
+if __name__ == "__main__":
+    unittest.main()